@@ -0,0 +1,118 @@
+""" Check that the command line tool starts quickly
+
+Times fresh interpreters importing the CLI and parsing common command lines, and fails if the time spent
+on top of a bare interpreter exceeds a budget, or if modules that should only load when a command runs
+(requests, numpy, sqlite3, ...) were imported:
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --max-overhead 50 -o startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from time import perf_counter
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# package modules the command line tool needs before running a command: its parser, the daemon client and caches
+CLI_MODULES = ('mieaa_cli', 'mieaa_daemon', 'mieaa_cache')
+
+# modules that only the commands themselves may import
+DEFERRED_MODULES = ('requests', 'urllib3', 'numpy', 'aiohttp', 'sqlite3', 'webbrowser', 'datetime',
+                    'concurrent.futures') + tuple(
+    'mieaa.' + name[:-3] for name in sorted(os.listdir(os.path.join(ROOT, 'mieaa')))
+    if name.startswith('mieaa_') and name.endswith('.py') and name[:-3] not in CLI_MODULES)
+
+# statements run by every measured interpreter, labelled for the report
+SCENARIOS = {
+    'package': 'import mieaa',
+    'import': 'import mieaa.mieaa_cli',
+    'version': 'from mieaa.mieaa_cli import parse_args; parse_args(["--version"])',
+    'help': 'from mieaa.mieaa_cli import main; main(["--help"])',
+    'parse_ora': 'from mieaa.mieaa_cli import parse_args; parse_args(["ora", "hsa", "-m", "hsa-mir-1", "-x"])',
+}
+
+PROBE = '''
+import io, json, sys
+sys.stdout = io.StringIO()
+try:
+    exec({statement!r})
+except SystemExit:
+    pass
+sys.stdout = sys.__stdout__
+print(json.dumps(sorted(sys.modules)))
+'''
+
+
+def run_python(code: str) -> tuple:
+    """ Run `code` in a fresh interpreter, returning the wall time and its output """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''), MIEAA_NO_DAEMON='1')
+    started = perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, check=True).stdout
+    return perf_counter() - started, output
+
+
+def measure(repeat: int) -> dict:
+    """ Median startup time of every scenario, the bare interpreter and modules loaded by each scenario """
+    baseline = statistics.median(run_python('pass')[0] for _ in range(repeat))
+    report = {'interpreter_ms': baseline * 1000, 'scenarios': {}}
+    for name, statement in SCENARIOS.items():
+        code = PROBE.format(statement=statement)
+        timings = []
+        for _ in range(repeat):
+            seconds, output = run_python(code)
+            timings.append(seconds)
+        modules = json.loads(output.decode())
+        report['scenarios'][name] = {
+            'ms': statistics.median(timings) * 1000,
+            'overhead_ms': (statistics.median(timings) - baseline) * 1000,
+            'deferred_modules_loaded': [module for module in DEFERRED_MODULES if module in modules],
+        }
+    return report
+
+
+def check(report: dict, max_overhead: float) -> list:
+    """ Failure messages for scenarios over the budget or loading deferred modules """
+    failures = []
+    for name, scenario in report['scenarios'].items():
+        if scenario['overhead_ms'] > max_overhead:
+            failures.append('{}: {:.1f}ms over a bare interpreter, budget is {:.1f}ms'.format(
+                name, scenario['overhead_ms'], max_overhead))
+        if scenario['deferred_modules_loaded']:
+            failures.append('{}: imported {}'.format(name, ', '.join(scenario['deferred_modules_loaded'])))
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-o', '--output', help='Write the JSON report to this file')
+    parser.add_argument('--repeat', type=int, default=10, help='Interpreters started per scenario, the median is used')
+    parser.add_argument('--max-overhead', type=float, default=100., metavar='MS',
+                        help='Milliseconds a scenario may take on top of a bare interpreter (default=100)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = measure(args.repeat)
+    report['max_overhead_ms'] = args.max_overhead
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    print('{:<12} {:>10} {:>12}'.format('scenario', 'ms', 'overhead ms'))
+    print('{:<12} {:>10.1f} {:>12}'.format('python', report['interpreter_ms'], '-'))
+    for name, scenario in report['scenarios'].items():
+        print('{:<12} {:>10.1f} {:>12.1f}'.format(name, scenario['ms'], scenario['overhead_ms']))
+    failures = check(report, args.max_overhead)
+    for failure in failures:
+        print('FAIL ' + failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+""" Local mock of the miEAA API for benchmarks
+
+Implements every endpoint in `API.endpoints` with configurable latency, job duration, throttling and
+payload sizes, so client throughput can be measured without touching the real server.
+"""
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import gzip
+import json
+import random
+from socketserver import ThreadingMixIn
+import sys
+import threading
+from time import monotonic, sleep
+from urllib.parse import parse_qs, urlparse
+import uuid
+
+CSV_HEADER = 'category,subcategory,enrichment,p-value,p-adjusted,q-value,expected,observed,mirnas/precursors'
+
+
+class MockConfig:
+    """ Behaviour of the mock server
+
+    Attributes
+    ----------
+    latency : float
+        Seconds every request is delayed before it is answered
+    job_duration : float
+        Seconds an enrichment job takes until its status reaches 100
+    throttle_rate : float or None
+        Requests per second accepted before answering 429, unlimited if None
+    throttle_burst : int
+        Requests that may exceed `throttle_rate` in a burst
+    result_rows : int
+        Number of rows in the results of every job
+    mirnas_per_row : int
+        Number of miRNAs listed in each result row
+    categories : int
+        Number of categories returned per species and miRNA type
+    fail_rate : float
+        Fraction of jobs that end with status FAILED
+    error_rate : float
+        Fraction of requests answered with 502 Bad Gateway
+    """
+    def __init__(self, latency: float=0., job_duration: float=.5, throttle_rate: float=None, throttle_burst: int=1,
+                 result_rows: int=1000, mirnas_per_row: int=10, categories: int=50, fail_rate: float=0.,
+                 error_rate: float=0.):
+        self.latency = latency
+        self.job_duration = job_duration
+        self.throttle_rate = throttle_rate
+        self.throttle_burst = throttle_burst
+        self.result_rows = result_rows
+        self.mirnas_per_row = mirnas_per_row
+        self.categories = categories
+        self.fail_rate = fail_rate
+        self.error_rate = error_rate
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class MockServer:
+    """ Threaded HTTP server answering miEAA API requests from memory
+
+    Use as a context manager; `url` can be assigned to `API.root_url` while the server runs.
+
+    Attributes
+    ----------
+    config : MockConfig
+        Behaviour of the server, may be changed while it runs
+    counts : Counter
+        Number of requests per endpoint, including throttled ones
+    throttled : int
+        Number of requests answered with 429
+    bytes_sent : int
+        Total size of response bodies
+    """
+    def __init__(self, config: MockConfig=None, host: str='127.0.0.1', port: int=0):
+        self.config = config or MockConfig()
+        self.counts = Counter()
+        self.throttled = 0
+        self.bytes_sent = 0
+        self._jobs = {}
+        self._results = {}
+        self._tokens = 0.
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer((host, port), _Handler)
+        self._server.mock = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/'.format(host, port)
+
+    def start(self) -> 'MockServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def reset_stats(self):
+        with self._lock:
+            self.counts.clear()
+            self.throttled = 0
+            self.bytes_sent = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'requests': dict(self.counts), 'throttled': self.throttled, 'bytes_sent': self.bytes_sent}
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _admit(self, endpoint: str) -> bool:
+        """ Count a request and decide whether it passes the throttle """
+        with self._lock:
+            self.counts[endpoint] += 1
+            rate = self.config.throttle_rate
+            if rate is None:
+                return True
+            now = monotonic()
+            self._tokens = min(self.config.throttle_burst, self._tokens + (now - self._updated) * rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            self.throttled += 1
+            return False
+
+    def _submit(self) -> str:
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._jobs[job_id] = (monotonic(), random.random() < self.config.fail_rate)
+        return job_id
+
+    def _status(self, job_id: str):
+        with self._lock:
+            started, fails = self._jobs.get(job_id, (monotonic() - self.config.job_duration, False))
+        duration = self.config.job_duration
+        progress = 100 if duration <= 0 else min(100, int(100 * (monotonic() - started) / duration))
+        if fails and progress >= 100:
+            return 'FAILED'
+        return progress
+
+    def _results_body(self, results_format: str, compress: bool) -> bytes:
+        """ Serialized results, shared by all jobs as generating them is not what is benchmarked """
+        key = (results_format, self.config.result_rows, self.config.mirnas_per_row, compress)
+        body = self._results.get(key)
+        if body is None and compress:
+            body = gzip.compress(self._results_body(results_format, False), compresslevel=1)
+            self._results[key] = body
+        elif body is None:
+            rows = [['Category {}'.format(row % 7), 'Subcategory {}'.format(row), 'over-represented',
+                     1e-4 * row, 2e-4 * row, 2e-4 * row, 1.5, self.config.mirnas_per_row,
+                     '; '.join('hsa-mir-{}'.format(row + i) for i in range(self.config.mirnas_per_row))]
+                    for row in range(self.config.result_rows)]
+            if results_format == 'json':
+                body = json.dumps(rows).encode()
+            else:
+                lines = [CSV_HEADER] + [','.join(str(field) for field in row) for row in rows]
+                body = '\n'.join(lines).encode()
+            self._results[key] = body
+        return body
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients closing keep-alive connections
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def _dispatch(self, method: str):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part][1:]  # drop the api version
+        form = self._read_form() if method == 'POST' else {}
+        endpoint = self._endpoint(method, parts)
+        if mock.config.latency:
+            sleep(mock.config.latency)
+        if endpoint is None:
+            return self._send(404, b'Not found', 'text/plain')
+        if not mock._admit(endpoint):
+            return self._send(429, b'Request was throttled.', 'text/plain', {'Retry-After': '0'})
+        if mock.config.error_rate and random.random() < mock.config.error_rate:
+            return self._send(502, b'Bad Gateway', 'text/plain')
+
+        if endpoint == 'categories':
+            species, mirna_type = parts[1], parts[2]
+            suffix = '_precursor' if mirna_type == 'precursor' else '_mature'
+            categories = [['Category{}{}'.format(index, suffix), '{} category {}'.format(species, index)]
+                          for index in range(mock.config.categories)]
+            return self._send_json({'categories': categories})
+        if endpoint in ('mirbase_converter', 'mirna_type_converter'):
+            return self._send(200, self._convert(form).encode(), 'text/plain')
+        if endpoint == 'enrichment':
+            return self._send_json({'job_id': mock._submit()})
+        if endpoint == 'status':
+            return self._send_json({'status': mock._status(parts[1])})
+        if endpoint == 'results':
+            results_format = parse_qs(url.query).get('format', ['json'])[0]
+            compress = 'gzip' in self.headers.get('Accept-Encoding', '')
+            body = mock._results_body(results_format, compress)
+            content_type = 'application/json' if results_format == 'json' else 'text/csv'
+            return self._send(200, body, content_type, {'Content-Encoding': 'gzip'} if compress else None,
+                              compressed=compress)
+        job_id = parse_qs(url.query).get('jobid', [''])[0]
+        return self._send_json({page: 'https://mieaa.example/{}/{}'.format(page, job_id)
+                                for page in ('input', 'progress', 'results')})
+
+    @staticmethod
+    def _endpoint(method: str, parts: list):
+        if not parts:
+            return None
+        if method == 'POST':
+            if parts[0] == 'mirbase_converter':
+                return 'mirbase_converter'
+            if parts[0] == 'mirna_precursor_converter':
+                return 'mirna_type_converter'
+            if parts[0] == 'enrichment_analysis' and len(parts) == 4:
+                return 'enrichment'
+            return None
+        if parts[0] == 'enrichment_categories' and len(parts) == 4:
+            return 'categories'
+        if parts[0] == 'enrichment_analysis' and len(parts) == 3 and parts[1] == 'results':
+            return 'results'
+        if parts[0] == 'job_status' and len(parts) == 2:
+            return 'status'
+        if parts[0] == 'gui_urls':
+            return 'gui_urls'
+        return None
+
+    def _read_form(self) -> dict:
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode()
+        if self.headers.get('Content-Type', '').startswith('multipart/form-data'):
+            return {}  # uploaded files only affect the payload size, which is what is measured
+        return {key: values[-1] for key, values in parse_qs(body, keep_blank_values=True).items()}
+
+    @staticmethod
+    def _convert(form: dict) -> str:
+        """ Echo every id with a recognizable suffix, in the requested output format """
+        mirnas = [mirna.strip() for mirna in form.get('mirnas', '').replace(',', ';').replace('\n', ';').split(';')]
+        mirnas = [mirna for mirna in mirnas if mirna]
+        if form.get('output_format') == 'tabsep':
+            return '\n'.join('{}\t{}-conv'.format(mirna, mirna) for mirna in mirnas)
+        return '\n'.join('{}-conv'.format(mirna) for mirna in mirnas)
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data).encode(), 'application/json')
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict=None, compressed: bool=False):
+        compress = not compressed and len(body) > 1024 and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compress:
+            body = gzip.compress(body, compresslevel=1)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.mock._lock:
+            self.server.mock.bytes_sent += len(body)
@@ -0,0 +1,202 @@
+""" Benchmark the miEAA client against a local mock server
+
+Measures enrichment job throughput, converter throughput by input size and peak memory of retrieving
+results, and writes a JSON report that can be compared across versions:
+
+    python benchmarks/run_benchmarks.py -o report.json
+    python benchmarks/run_benchmarks.py -o new.json --compare report.json
+"""
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+from time import perf_counter
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mieaa import API, BatchExecutor, CategoryCatalog, FixedInterval, JobSpec, MemoryJobStore, TokenBucket, __version__
+from mock_server import MockConfig, MockServer
+
+
+def configure_client(server: MockServer, client_rate: float):
+    """ Point all API instances at the mock server, without touching the user's job store or caches """
+    API.root_url = server.url
+    API.jobs = MemoryJobStore()
+    API.category_catalog = CategoryCatalog()
+    API.result_cache = None
+    API.mirbase_index = None
+    API.id_cache = None
+    API.polling_strategy = FixedInterval(.05)
+    return TokenBucket(client_rate, burst=max(1, int(client_rate // 10)))
+
+
+def make_api(limiter: TokenBucket) -> API:
+    api = API()
+    api.session.limiter = limiter
+    return api
+
+
+def bench_jobs(server: MockServer, limiter: TokenBucket, jobs: int, workers: int, repeat: int) -> dict:
+    """ Submit, poll and download `jobs` analyses on `workers` concurrent workers """
+    test_set = ['hsa-mir-{}'.format(index) for index in range(200)]
+    specs = [JobSpec('ORA', test_set, ['Category0', 'Category1'], 'precursor', 'hsa', name=index)
+             for index in range(jobs)]
+    make_api(limiter).get_enrichment_categories('precursor', 'hsa')  # warm the category catalog
+
+    timings = []
+    for _ in range(repeat):
+        server.reset_stats()
+        started = perf_counter()
+        results = BatchExecutor(workers, api_factory=lambda: make_api(limiter)).run_all(specs)
+        timings.append(perf_counter() - started)
+        failed = sum(not result.ok for result in results)
+    seconds = statistics.median(timings)
+    return dict(_timing(timings), jobs=jobs, workers=workers, jobs_per_second=jobs / seconds, failed=failed,
+                server=server.stats())
+
+
+def bench_converters(server: MockServer, limiter: TokenBucket, sizes: list, repeat: int) -> dict:
+    """ Convert id lists of increasing size with every converter """
+    converters = {
+        'to_precursor': lambda api, ids: api.to_precursor(ids),
+        'convert_mirbase': lambda api, ids: api.convert_mirbase(ids, 21, 22, 'mirna'),
+        'iter_to_precursor': lambda api, ids: list(api.iter_to_precursor(ids, chunk_size=5000)),
+    }
+    report = {}
+    for name, convert in converters.items():
+        report[name] = {}
+        for size in sizes:
+            ids = ['hsa-miR-{}-5p'.format(index) for index in range(size)]
+            timings = []
+            for _ in range(repeat):
+                api = make_api(limiter)
+                started = perf_counter()
+                converted = convert(api, ids)
+                timings.append(perf_counter() - started)
+                api.session.close()
+            if len(converted) != size:
+                raise RuntimeError('{} returned {} ids for {} inputs'.format(name, len(converted), size))
+            report[name][str(size)] = dict(_timing(timings), ids_per_second=size / statistics.median(timings))
+    return report
+
+
+def bench_memory(server: MockServer, limiter: TokenBucket) -> dict:
+    """ Peak Python memory allocated while retrieving the results of one finished job """
+    directory = tempfile.mkdtemp()
+    operations = {
+        'get_results_json': lambda api: api.get_results('json'),
+        'get_results_csv': lambda api: api.get_results('csv'),
+        'get_results_table': lambda api: api.get_results(as_table=True),
+        'save_enrichment_results_csv': lambda api: api.save_enrichment_results(os.path.join(directory, 'r.csv')),
+        'download_results_csv': lambda api: api.download_results(os.path.join(directory, 'd.csv')),
+        'download_results_gzip': lambda api: api.download_results(os.path.join(directory, 'd.csv.gz')),
+    }
+    api = make_api(limiter)
+    api.run_ora(['hsa-mir-1'], ['Category0'], 'precursor', 'hsa')
+    job_id = api.job_id
+    api.get_results('json')  # wait until the job finished, so only the download is measured
+
+    report = {}
+    for name, operation in operations.items():
+        api = make_api(limiter)
+        api.job_id = job_id
+        tracemalloc.start()
+        started = perf_counter()
+        operation(api)
+        seconds = perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        api.session.close()
+        report[name] = {'peak_bytes': peak, 'seconds': seconds}
+    for file_name in os.listdir(directory):
+        os.remove(os.path.join(directory, file_name))
+    os.rmdir(directory)
+    return report
+
+
+def compare(report: dict, baseline: dict, out=sys.stdout):
+    """ Print the relative change of every numeric metric present in both reports """
+    def flatten(data, prefix=''):
+        for key, value in data.items():
+            name = '{}.{}'.format(prefix, key) if prefix else key
+            if isinstance(value, dict):
+                yield from flatten(value, name)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                yield name, value
+
+    old = dict(flatten(baseline['benchmarks']))
+    print('{:<60} {:>14} {:>14} {:>9}'.format('metric', baseline['version'], report['version'], 'change'), file=out)
+    for name, value in flatten(report['benchmarks']):
+        if name in old and old[name]:
+            change = (value - old[name]) / abs(old[name])
+            print('{:<60} {:>14.4g} {:>14.4g} {:>+8.1%}'.format(name, old[name], value, change), file=out)
+
+
+def _timing(timings: list) -> dict:
+    return {'seconds': statistics.median(timings), 'min_seconds': min(timings), 'runs': len(timings)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('-o', '--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', metavar='REPORT', help='Print changes relative to a previous report')
+    parser.add_argument('--only', nargs='+', choices=['jobs', 'converters', 'memory'],
+                        default=['jobs', 'converters', 'memory'], help='Benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the median is reported')
+    parser.add_argument('--jobs', type=int, default=50, help='Number of enrichment jobs')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent jobs')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help='Converter input sizes')
+    parser.add_argument('--client-rate', type=float, default=200, help='Client requests per second')
+    group = parser.add_argument_group('mock server')
+    group.add_argument('--latency', type=float, default=.005, help='Seconds added to every response')
+    group.add_argument('--job-duration', type=float, default=.2, help='Seconds until a job finishes')
+    group.add_argument('--throttle-rate', type=float, help='Requests per second before the server answers 429')
+    group.add_argument('--throttle-burst', type=int, default=10, help='Requests allowed above the throttle rate')
+    group.add_argument('--result-rows', type=int, default=20000, help='Rows in the results of every job')
+    group.add_argument('--mirnas-per-row', type=int, default=10, help='miRNAs listed in each result row')
+    group.add_argument('--categories', type=int, default=50, help='Categories per species and miRNA type')
+    group.add_argument('--error-rate', type=float, default=0., help='Fraction of requests answered with 502')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = MockConfig(args.latency, args.job_duration, args.throttle_rate, args.throttle_burst, args.result_rows,
+                        args.mirnas_per_row, args.categories, error_rate=args.error_rate)
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'config': dict(config.to_dict(), client_rate=args.client_rate),
+        'benchmarks': {},
+    }
+    with MockServer(config) as server:
+        limiter = configure_client(server, args.client_rate)
+        if 'jobs' in args.only:
+            report['benchmarks']['jobs'] = bench_jobs(server, limiter, args.jobs, args.workers, args.repeat)
+        if 'converters' in args.only:
+            report['benchmarks']['converters'] = bench_converters(server, limiter, args.sizes, args.repeat)
+        if 'memory' in args.only:
+            report['benchmarks']['memory'] = bench_memory(server, limiter)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(text)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(report, json.load(baseline_file), sys.stderr if not args.output else sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
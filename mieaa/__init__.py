@@ -1,3 +1,48 @@
-from .mieaa_cli import API
+import importlib
+import sys
 
 from ._version import __version__
+
+# public names and the modules defining them, imported on first access so that the command line
+# tool does not pay for requests, numpy and aiohttp when it does not need them
+_exports = {
+    'mieaa_async': ['AsyncAPI'],
+    'mieaa_batch': ['BatchExecutor', 'BatchResult', 'JobSpec'],
+    'mieaa_cache': ['CategoryCatalog', 'IdCache', 'ResultCache', 'default_cache_dir'],
+    'mieaa_futures': ['JobFuture', 'PollScheduler'],
+    'mieaa_jobs': ['JobRecord', 'JobStore', 'MemoryJobStore', 'SQLiteJobStore'],
+    'mieaa_local': ['CategoryAnnotations', 'LocalEnrichment', 'MembershipIndex'],
+    'mieaa_manifest': ['ManifestResult', 'ManifestRow', 'ManifestRunner', 'read_manifest'],
+    'mieaa_metrics': ['Instrumentation', 'MetricsRecorder', 'get_instrumentation', 'set_instrumentation'],
+    'mieaa_mirbase': ['MirbaseIndex'],
+    'mieaa_poller': ['StatusPoller'],
+    'mieaa_polling': ['AdaptiveBackoff', 'FixedInterval', 'PollingStrategy'],
+    'mieaa_ratelimit': ['TokenBucket', 'shared_limiter'],
+    'mieaa_results': ['iter_results', 'open_results'],
+    'mieaa_stats': ['adjust_p_values', 'fisher_exact', 'running_sum', 'running_sum_p_values'],
+    'mieaa_sweep': ['ParameterSweep', 'SweepResults'],
+    'mieaa_table': ['ResultsTable', 'StringPool'],
+    'mieaa_transport': ['CircuitBreaker', 'CircuitOpenError', 'ResilientAdapter', 'RetryPolicy', 'shared_adapter'],
+    'mieaa_wrapper': ['API'],
+}
+_modules = {name: module for module, names in _exports.items() for name in names}
+
+__all__ = sorted(_modules) + ['__version__']
+
+
+def __getattr__(name):
+    module = _modules.get(name)
+    if module is None:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_modules))
+
+
+if sys.version_info < (3, 7):  # module level __getattr__ is not supported
+    for _name in _modules:
+        __getattr__(_name)
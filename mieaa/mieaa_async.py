@@ -0,0 +1,607 @@
+import asyncio
+from datetime import datetime
+import functools
+from io import IOBase
+import json
+import os
+import threading
+from time import monotonic, time
+from typing import Callable, List, IO, Iterable, Optional, Union
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency, only required for the asyncio client
+    aiohttp = None
+
+import requests
+
+from mieaa.mieaa_cache import CatalogEntry, split_ids
+from mieaa.mieaa_metrics import Instrumentation, get_instrumentation
+from mieaa.mieaa_polling import PollingStrategy, resolve_strategy
+from mieaa.mieaa_ratelimit import TokenBucket, parse_retry_after, shared_limiter
+from mieaa.mieaa_results import DEFAULT_CHUNK_SIZE, ResultsSink
+from mieaa.mieaa_table import ResultsTable
+from mieaa.mieaa_wrapper import API, API_Session, format_categories
+
+
+class AsyncResponse:
+    """ Fully read response returned by `AsyncTransport`, mirroring the parts of requests.Response we use """
+    def __init__(self, url: str, status_code: int, headers: dict, text: str):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            kind = 'Client' if self.status_code < 500 else 'Server'
+            raise requests.HTTPError('{} {} Error for url: {}\nResponse: {}'.format(
+                self.status_code, kind, self.url, self.text))
+
+
+class AsyncTransport:
+    """ Pooled asyncio HTTP transport shared by `AsyncAPI` instances
+
+    Connection errors and server errors are retried according to `retry_policy`, behind the
+    circuit breaker shared with `API_Session` by default.
+
+    Attributes
+    ----------
+    limiter : TokenBucket or None
+        Limiter to use instead of the process-wide limiter
+    max_connections : int
+        Maximum number of simultaneously open connections
+    instrumentation : Instrumentation or None
+        Receives an event for every request, instead of the process-wide instrumentation
+    throttle_retries [class attribute] : int
+        How many times to retry a request rejected with 429
+    retry_policy [class attribute] : RetryPolicy or None
+        Which failed requests are retried and how long to wait in between, defaults to `API_Session.retry_policy`
+    circuit_breaker [class attribute] : CircuitBreaker or None
+        Breaker to use instead of `API_Session.circuit_breaker`
+    """
+    throttle_retries = 3
+    retry_policy = None
+    circuit_breaker = None
+
+    def __init__(self, limiter: TokenBucket=None, max_connections: int=10, instrumentation: Instrumentation=None):
+        if aiohttp is None:
+            raise ImportError('AsyncAPI requires aiohttp, install it with `pip install mieaa[async]`')
+        self.limiter = limiter
+        self.max_connections = max_connections
+        self.instrumentation = instrumentation
+        self._session = None
+        self._loop = None
+        self._closer = None
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        """ Session of the running event loop, which is closed with its loop """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.max_connections))
+            self._loop = loop
+            # the loop closes the previous session, whose guard is released here, and closes this session
+            # when it shuts down, e.g. at the end of `asyncio.run`
+            self._closer = _close_with_loop(self._session)
+            asyncio.ensure_future(self._closer.__anext__())
+        return self._session
+
+    async def wait_request(self, method: str, url: str, wait: float=1, data: dict=None, endpoint: str='other',
+                           **kwargs) -> AsyncResponse:
+        """ Send a request once the rate limiter allows it, recorded under `endpoint` """
+        limiter = self.limiter or shared_limiter(wait)
+        timer = _RequestTimer(self.instrumentation or get_instrumentation(), endpoint, method)
+        with timer:
+            for attempt in range(self.throttle_retries + 1):
+                await timer.throttle(limiter, attempt)
+                async with await self._open(method, url, data, timer, **kwargs) as response:
+                    text = await response.text()
+                    result = AsyncResponse(str(response.url), response.status, dict(response.headers), text)
+                timer.received(result, len(text.encode()) if 'Content-Length' not in result.headers else None)
+                if result.status_code != 429:
+                    limiter.recovered()
+                    return result
+                limiter.throttled(parse_retry_after(result.headers.get('Retry-After')))
+            return result
+
+    async def download(self, url: str, open_sink: Callable[[], ResultsSink], wait: float=1,
+                       chunk_size: int=DEFAULT_CHUNK_SIZE, **kwargs) -> AsyncResponse:
+        """ GET a url once the rate limiter allows it, writing a successful body to the sink in chunks
+
+        The returned response has an empty text unless the request failed.
+        """
+        limiter = self.limiter or shared_limiter(wait)
+        timer = _RequestTimer(self.instrumentation or get_instrumentation(), 'results', 'GET')
+        with timer:
+            for attempt in range(self.throttle_retries + 1):
+                await timer.throttle(limiter, attempt)
+                async with await self._open('GET', url, None, timer, **kwargs) as response:
+                    result = AsyncResponse(str(response.url), response.status, dict(response.headers), '')
+                    timer.received(result, None)
+                    if response.status == 429:
+                        limiter.throttled(parse_retry_after(response.headers.get('Retry-After')))
+                        continue
+                    limiter.recovered()
+                    if response.status >= 400:
+                        result.text = await response.text()
+                        return result
+                    with open_sink() as sink:
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            sink.write(chunk)
+                    return result
+            return result
+
+    async def _open(self, method: str, url: str, data: Optional[dict], timer: '_RequestTimer',
+                    **kwargs) -> 'aiohttp.ClientResponse':
+        """ Send a request and return the unread response, retrying failures according to `retry_policy` """
+        policy = self.retry_policy or API_Session.retry_policy
+        breaker = self.circuit_breaker or API_Session.circuit_breaker
+        for retry in range(policy.retries + 1):
+            if breaker is not None:
+                breaker.before_request()
+            body = _form_data(data)() if data is not None else None
+            if body is not None:
+                timer.bytes_sent += body.size or 0
+            try:
+                response = await self.session.request(method, url, data=body, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                if breaker is not None:
+                    breaker.record(False)
+                sent = not isinstance(err, aiohttp.ClientConnectorError)
+                if retry == policy.retries or (sent and not policy.is_idempotent(method, url)):
+                    raise
+                delay = policy.delay(retry)
+            except BaseException:
+                # any failure ends a half-open trial, otherwise the breaker would never close again
+                if breaker is not None:
+                    breaker.record(False)
+                raise
+            else:
+                if breaker is not None:
+                    breaker.record(response.status < 500)
+                if retry == policy.retries or not policy.retry_status(method, url, response.status,
+                                                                      response.headers.get('Retry-After')):
+                    return response
+                delay = policy.delay(retry, response.headers.get('Retry-After'))
+                response.release()
+            timer.transport_retries += 1
+            await asyncio.sleep(delay)
+
+    async def wait_post(self, url: str, wait: float=1, data: dict=None, **kwargs) -> AsyncResponse:
+        return await self.wait_request('POST', url, wait, data=data or {}, **kwargs)
+
+    async def wait_get(self, url: str, wait: float=1, **kwargs) -> AsyncResponse:
+        return await self.wait_request('GET', url, wait, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+class _RequestTimer:
+    """ Collect the measurements of one `AsyncTransport` call for instrumentation """
+    def __init__(self, instrumentation: Optional[Instrumentation], endpoint: str, method: str):
+        self.instrumentation = instrumentation
+        self.endpoint = endpoint
+        self.method = method
+        self.status = None
+        self.retries = 0
+        self.transport_retries = 0
+        self.throttle_wait = 0.
+        self.latency = 0.
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._sent = None
+
+    async def throttle(self, limiter: TokenBucket, attempt: int):
+        """ Wait for the limiter and start timing the request """
+        self.retries = attempt
+        started = monotonic()
+        await limiter.acquire_async()
+        self._sent = monotonic()
+        self.throttle_wait += self._sent - started
+
+    def received(self, response: AsyncResponse, size: Optional[int]):
+        """ Record the arrival of a response, `size` defaulting to its Content-Length """
+        self.latency += monotonic() - self._sent
+        self._sent = None
+        self.status = response.status_code
+        length = response.headers.get('Content-Length', '')
+        self.bytes_received += int(length) if size is None and length.isdigit() else size or 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._sent is not None:  # failed before a response arrived
+            self.latency += monotonic() - self._sent
+            self.status = None
+        if self.instrumentation is not None:
+            self.instrumentation.request_completed(self.endpoint, self.method, self.status, self.latency,
+                                                   self.throttle_wait, self.bytes_sent, self.bytes_received,
+                                                   self.retries + self.transport_retries)
+
+
+async def _close_with_loop(session: 'aiohttp.ClientSession'):
+    """ Async generator closing `session` when it is finalized, which its event loop does on shutdown """
+    try:
+        yield
+    finally:
+        await session.close()
+
+
+_shared_transport = None
+_shared_transport_lock = threading.Lock()
+
+
+def shared_transport() -> AsyncTransport:
+    """ Get the transport shared by all `AsyncAPI` instances that were not given their own """
+    global _shared_transport
+    with _shared_transport_lock:
+        if _shared_transport is None:
+            _shared_transport = AsyncTransport()
+        return _shared_transport
+
+
+class _SharedWithAPI:
+    """ Attribute read from `API` whenever it is accessed, unless it was set on an instance """
+    def __init__(self, name: str):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is not None and self.name in instance.__dict__:
+            return instance.__dict__[self.name]
+        return getattr(API, self.name)
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = value
+
+
+class AsyncAPI:
+    """ asyncio miEAA api wrapper class, mirroring `API`
+
+    Instances are cheap: all of them share one pooled transport and the process-wide rate limiter,
+    so thousands of jobs can be awaited from a single event loop.
+    Each instance is tied to a Job ID after starting an enrichment analysis.
+    Instance must be reset with `new_session()` before starting a new analysis.
+
+    Attributes
+    ----------
+    transport [instance attribute] : AsyncTransport
+        Transport used to send requests
+    job_id [instance attribute] : uuid
+        Unique identifier for enrichment analysis job of current session
+    """
+    root_url = _SharedWithAPI('root_url')
+    api_version = _SharedWithAPI('api_version')
+    wait_between_requests = _SharedWithAPI('wait_between_requests')
+    endpoints = API.endpoints
+    default_params = API.default_params
+    polling_strategy = _SharedWithAPI('polling_strategy')
+
+    _extend_payload = API._extend_payload
+    _get_endpoint = API._get_endpoint
+    _job_store = API._job_store
+    _record_job = API._record_job
+    _record_progress = API._record_progress
+    _record_results = API._record_results
+    _record_completion = API._record_completion
+
+    @property
+    def jobs(self):
+        """ Jobs are shared with `API` """
+        return API.jobs
+
+    @property
+    def category_catalog(self):
+        """ Category cache is shared with `API` """
+        return API.category_catalog
+
+    @property
+    def _instrumentation(self) -> Optional[Instrumentation]:
+        return self.transport.instrumentation or get_instrumentation()
+
+    def __init__(self, transport: Optional[AsyncTransport]=None):
+        self.transport = transport or shared_transport()
+        self.job_id = None
+        self._enrichment_parameters = None
+        self._cached_results_type = None
+        self._submitted_at = None
+        self._recorded_progress = None
+        self.results_response = None
+
+    def new_session(self):
+        """ Start a new session, clearing all job results. The transport is kept open """
+        self.__init__(self.transport)
+
+    async def _in_executor(self, function: Callable, *args):
+        """ Call a job store function on a worker thread, so writing to SQLite does not block the event loop """
+        await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+
+    def load_job(self, job_id):
+        self.new_session()
+        self.job_id = job_id
+        record = self._job_store('get_record', job_id)
+        if record is not None:
+            self._enrichment_parameters = record.parameters
+            self._submitted_at = record.created
+
+    async def convert_mirbase(self, mirnas: Union[str, Iterable[str], IO], from_version: float, to_version: float,
+                              mirna_type: str, to_file: Union[str, IO]='', fallback: bool=True,
+                              **kwargs) -> List[str]:
+        """ Convert a set of either miRNAs/precursors from one miRbase version to another, see `API.convert_mirbase` """
+        def payload(mirnas):
+            return {
+                'mirnas': mirnas,
+                'input_type': mirna_type.lower(),
+                'mirbase_input_version': 'v{}'.format(from_version),
+                'mirbase_output_version': 'v{}'.format(to_version),
+            }
+
+        mirnas = _join_set(mirnas)
+        index = API.mirbase_index
+        if index is None or not index.has_versions(from_version, to_version, mirna_type):
+            return await self._convert('mirbase_converter', payload(mirnas), to_file, kwargs)
+
+        mirnas = split_ids(mirnas)
+        output_format = self._extend_payload({}, kwargs, 'converter')['output_format']
+        converted = dict(zip(mirnas, index.convert(mirnas, from_version, to_version, mirna_type)))
+        missing = [mirna for mirna, result in converted.items() if result is None]
+        if missing and fallback:
+            for line in await self._convert('mirbase_converter', payload(';'.join(missing)), '',
+                                            {**kwargs, 'output_format': 'tabsep'}):
+                original, _, result = line.partition('\t')
+                converted[original] = result
+        if output_format == 'tabsep':
+            lines = ['{}\t{}'.format(mirna, converted[mirna] or '') for mirna in mirnas]
+        else:
+            lines = [converted[mirna] or '' for mirna in mirnas]
+        API._save_converted('\n'.join(lines), to_file)
+        return lines
+
+    async def _convert_mirna_type(self, mirnas: Union[str, Iterable[str], IO], conversion: str,
+                                  to_file: Union[str, IO]='', **kwargs) -> List[str]:
+        """ Convert from precursor->mirna or mirna-> precursor, see `API._convert_mirna_type` """
+        base_payload = {
+            'mirnas': _join_set(mirnas),
+            'input_type': conversion.lower()
+        }
+        return await self._convert('mirna_type_converter', base_payload, to_file, kwargs)
+
+    async def to_mirna(self, mirnas: Union[str, Iterable[str], IO],
+                       to_file: Union[str, IO]='', **kwargs) -> List[str]:
+        """ Convert from precursor->mirna, see `API.to_mirna` """
+        return await self._convert_mirna_type(mirnas, 'to_mirna', to_file, **kwargs)
+
+    async def to_precursor(self, mirnas: Union[str, Iterable[str], IO],
+                           to_file: Union[str, IO]='', **kwargs) -> List[str]:
+        """ Convert from mirna->precursor, see `API.to_precursor` """
+        return await self._convert_mirna_type(mirnas, 'to_precursor', to_file, **kwargs)
+
+    async def _start_analysis(self, analysis_type: str, test_set: Union[str, Iterable, IO],
+                              categories: Union[str, Iterable, IOBase], mirna_type: str, species: str,
+                              reference_set: Union[str, Iterable, IOBase]='', **kwargs) -> AsyncResponse:
+        """ Start Enrichment Analysis, see `API._start_analysis` """
+        if self.job_id:
+            raise RuntimeError("Please call the `new_session()` method before starting a new analysis.")
+
+        categories = _join_set(categories)
+        entry = await self._category_entry(mirna_type, species)
+        base_payload = {
+            'categories': format_categories(categories, mirna_type, entry.index),
+            'testset': _join_set(test_set),
+            'reference_set': _join_set(reference_set),
+        }
+        if kwargs.pop('unfiltered', False):
+            kwargs.update(self.default_params['unfiltered'])
+        payload = self._extend_payload(base_payload, kwargs, 'analysis')
+
+        url = self._get_endpoint('enrichment', species=species.lower(),
+                                 analysis=analysis_type.upper(), mirna=mirna_type.lower())
+        response = await self.transport.wait_post(url, wait=self.wait_between_requests, data=payload,
+                                                  endpoint='enrichment')
+        response.raise_for_status()
+
+        self.job_id = response.json()['job_id']
+        self._submitted_at = time()
+        self._enrichment_parameters = {'time': str(datetime.now()), 'enrichment_analysis': analysis_type, **payload}
+        await self._in_executor(self._record_job, analysis_type, species, mirna_type)
+        return response
+
+    async def run_ora(self, test_set: Union[str, Iterable, IO], categories: Iterable, mirna_type: str,
+                      species: str, reference_set: Union[str, IOBase]='', **kwargs) -> AsyncResponse:
+        """ Start Over Enrichment Analysis, see `API.run_ora` """
+        return await self._start_analysis('ORA', test_set, categories, mirna_type, species, reference_set, **kwargs)
+
+    async def run_gsea(self, test_set: Union[str, Iterable, IO], categories: Iterable, mirna_type: str,
+                       species: str, **kwargs) -> AsyncResponse:
+        """ Start miRNA Set Enrichment Analysis, see `API.run_gsea` """
+        return await self._start_analysis('GSEA', test_set, categories, mirna_type, species, '', **kwargs)
+
+    async def _get_status(self) -> dict:
+        if not self.job_id:
+            raise RuntimeError('No enrichment analysis has been initiated.')
+        url = self._get_endpoint('status', job_id=self.job_id)
+        response = await self.transport.wait_get(url, wait=self.wait_between_requests, endpoint='status')
+        response.raise_for_status()
+        return response.json()
+
+    async def get_progress(self):
+        """ Retrieve enrichment analysis progress """
+        progress = (await self._get_status())['status']
+        if progress != self._recorded_progress:
+            await self._in_executor(self._record_progress, progress)
+        return progress
+
+    async def get_results(self, results_format: str='json',
+                          check_progress_interval: Union[float, PollingStrategy]=None, retries=5,
+                          as_table: bool=False) -> Union[str, list, ResultsTable]:
+        """ Return results in json or csv format, see `API.get_results` """
+        if not self.job_id:
+            raise RuntimeError('No enrichment analysis has been initiaited.')
+
+        if as_table:
+            return ResultsTable.from_results(await self.get_results('json', check_progress_interval, retries))
+
+        if self._cached_results_type == results_format and self.results_response is not None:
+            if results_format == 'json':
+                return self.results_response.json()
+            return self.results_response.text
+
+        finished = await self._wait_for_results(resolve_strategy(check_progress_interval, self.polling_strategy),
+                                                retries)
+        if not finished:
+            return [] if results_format == 'json' else ''
+
+        # connection errors are retried by the transport
+        url = self._get_endpoint('results', job_id=self.job_id)
+        response = await self.transport.wait_get(url, wait=self.wait_between_requests,
+                                                 params={'format': results_format}, endpoint='results')
+        response.raise_for_status()
+        self._cached_results_type = results_format
+        self.results_response = response
+        await self._in_executor(self._record_results, response.url)
+        if results_format == 'json':
+            return self.results_response.json()
+        return self.results_response.text
+
+    async def download_results(self, destination: Union[str, IO], results_format: str='csv',
+                               compress: Optional[bool]=None,
+                               check_progress_interval: Union[float, PollingStrategy]=None,
+                               chunk_size: int=DEFAULT_CHUNK_SIZE) -> Union[str, IO]:
+        """ Stream results to a file once they have been computed, see `API.download_results` """
+        if not self.job_id:
+            raise RuntimeError('No enrichment analysis has been initiated.')
+        if compress is None:
+            compress = isinstance(destination, str) and destination.endswith('.gz')
+
+        if self._cached_results_type == results_format and self.results_response is not None:
+            with ResultsSink(destination, compress) as sink:
+                sink.write(self.results_response.text.encode())
+            return destination
+
+        finished = await self._wait_for_results(resolve_strategy(check_progress_interval, self.polling_strategy))
+        if not finished:
+            raise RuntimeError('Enrichment analysis {} failed'.format(self.job_id))
+
+        url = self._get_endpoint('results', job_id=self.job_id)
+        response = await self.transport.download(url, lambda: ResultsSink(destination, compress),
+                                                  wait=self.wait_between_requests, chunk_size=chunk_size,
+                                                  params={'format': results_format})
+        response.raise_for_status()
+        await self._in_executor(self._record_results, os.path.abspath(destination) if isinstance(destination, str) else response.url)
+        return destination
+
+    async def _wait_for_results(self, strategy: PollingStrategy, retries: int=5) -> bool:
+        """ Poll progress until the job stopped, see `API._wait_for_results` """
+        started = self._submitted_at or time()
+        attempt = 0
+        status = None
+        for retry in range(max(retries, 1)):
+            try:
+                while True:
+                    await asyncio.sleep(strategy.next_delay(attempt, status, time() - started))
+                    attempt += 1
+                    status = await self._get_status()
+                    progress = status['status']
+                    if progress != self._recorded_progress:
+                        await self._in_executor(self._record_progress, progress)
+                    if progress == 'FAILED':
+                        return False
+                    if progress >= 100:
+                        return True
+            except aiohttp.ClientConnectionError:
+                # each request was already retried by the transport
+                if retry + 1 >= retries:
+                    raise
+
+    async def get_enrichment_categories(self, mirna_type: str, species: str, mode='all',
+                                        with_suffix=False, refresh=False) -> dict:
+        """ Get possible enrichment categories, see `API.get_enrichment_categories` """
+        categories = (await self._category_entry(mirna_type, species, mode, refresh)).categories
+
+        if with_suffix:
+            return {cat: desc for cat, desc in categories}
+
+        cat_suffix = '_precursor' if mirna_type == 'precursor' else '_mature'
+        return {cat.replace(cat_suffix, ''): desc for cat, desc in categories}
+
+    async def _category_entry(self, mirna_type: str, species: str, mode='all', refresh=False) -> CatalogEntry:
+        """ Get categories from the catalog, fetching them from the server if they are not cached """
+        entry = None if refresh else self.category_catalog.lookup(species, mirna_type, mode)
+        if entry is None:
+            url = self._get_endpoint('categories', species=species.lower(), mirna=mirna_type.lower(),
+                                     mode=mode.lower())
+            response = await self.transport.wait_get(url, wait=self.wait_between_requests, endpoint='categories')
+            response.raise_for_status()
+            entry = self.category_catalog.store(species, mirna_type, mode, response.json()['categories'])
+        return entry
+
+    async def save_enrichment_results(self, save_file: Union[str, IO], file_type: str='csv',
+                                      check_progress_interval: Union[float, PollingStrategy]=None) -> str:
+        """ Save results in specified format, see `API.save_enrichment_results` """
+        results = str(await self.get_results(file_type, check_progress_interval))
+        if isinstance(save_file, IOBase):
+            save_file.write(results)
+        else:
+            with open(save_file, 'w+') as outfile:
+                outfile.write(results)
+            await self._in_executor(self._record_results, os.path.abspath(save_file))
+        return results
+
+    def get_enrichment_parameters(self):
+        """ Retrieve parameters used during enrichment analysis"""
+        if not self.job_id:
+            raise RuntimeError('No enrichment analysis has been initiated.')
+        return self._enrichment_parameters
+
+    async def get_gui_urls(self, job_id=None):
+        """ Retrieve important mieaa webtool urls, see `API.get_gui_urls` """
+        use_job_id = job_id or self.job_id or ''
+        url = self._get_endpoint('gui_urls', job_id=use_job_id)
+        response = await self.transport.wait_get(url, wait=self.wait_between_requests, endpoint='gui_urls')
+        response.raise_for_status()
+        return response.json()
+
+    async def get_gui_url(self, page, job_id=None):
+        """ Get specific url to page in web tool, see `API.get_gui_url` """
+        return (await self.get_gui_urls(job_id))[page]
+
+    async def _convert(self, converter_type, base_payload, to_file, default_overrides):
+        """ Fill in defaults and return converted mirnas """
+        url = self._get_endpoint(converter_type)
+        payload = self._extend_payload(base_payload, default_overrides, 'converter')
+
+        response = await self.transport.wait_post(url, wait=self.wait_between_requests, data=payload,
+                                                  endpoint=converter_type)
+        response.raise_for_status()
+
+        if isinstance(to_file, IOBase):
+            to_file.write(response.text)
+            to_file.close()
+        elif to_file:
+            with open(to_file, 'w+') as savefile:
+                savefile.write(response.text)
+
+        return response.text.splitlines()
+
+
+def _join_set(mirna_set) -> str:
+    """ Normalize a string, iterable or file-like set to a delimited string """
+    if isinstance(mirna_set, IOBase):
+        mirna_set = mirna_set.read().splitlines()
+    return mirna_set if isinstance(mirna_set, str) else ';'.join(mirna_set)
+
+
+def _form_data(payload: dict) -> 'aiohttp.FormData':
+    """ Encode a payload like requests does, repeating keys for list values """
+    form = aiohttp.FormData()
+    for key, value in payload.items():
+        for item in (value if isinstance(value, (list, tuple)) else [value]):
+            form.add_field(key, str(item))
+    return form
@@ -0,0 +1,241 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import IOBase
+from typing import Callable, Iterable, Iterator, IO, List, Optional, TypeVar, Union
+
+from mieaa.mieaa_jobs import JobRecord, JobStore
+from mieaa.mieaa_polling import PollingStrategy
+from mieaa.mieaa_wrapper import API
+
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+class JobSpec:
+    """ Description of a single enrichment analysis to run as part of a batch
+
+    Attributes
+    ----------
+    analysis_type : str
+        * *ORA* - Over-representation Analysis
+        * *GSEA* - miRNA enrichment analysis
+    test_set : str, iterable or file-like
+        set of miRNAs/precursors we want to test
+    categories : str, iterable or file-like
+        Categories we want to run analysis on
+    mirna_type : str
+        * *precursor* - Precursor to a mature miRNA, e.g. hsa-mir-550b-1
+        * *mirna* - Mature miRNA, e.g. hsa-miR-199a-5p
+    species : str
+        Species abbreviation, e.g. hsa
+    reference_set : str, iterable or file-like, default=''
+        ORA specific, background reference set of miRNAs/precursors
+    name : str, optional
+        Identifier used to match results to their spec, defaults to the position in the batch
+    job_id : str, optional
+        ID of an already submitted job. If provided, the job is only polled and downloaded
+    params : dict
+        Analysis parameters passed on to `API.run_ora` or `API.run_gsea`,
+        e.g. p_value_adjustment, significance_level
+    """
+    def __init__(self, analysis_type: str, test_set: Union[str, Iterable, IO], categories: Union[str, Iterable, IO],
+                 mirna_type: str, species: str, reference_set: Union[str, Iterable, IO]='', name=None,
+                 job_id: str=None, **params):
+        if analysis_type.upper() not in ('ORA', 'GSEA'):
+            raise ValueError("analysis_type must be one of 'ORA' or 'GSEA', got {!r}".format(analysis_type))
+        self.analysis_type = analysis_type.upper()
+        self.test_set = test_set
+        self.categories = categories
+        self.mirna_type = mirna_type
+        self.species = species
+        self.reference_set = reference_set
+        self.name = name
+        self.job_id = job_id
+        self.params = params
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> 'JobSpec':
+        """ Create a spec from a dictionary of keyword arguments """
+        spec = dict(spec)
+        spec.setdefault('analysis_type', spec.pop('analysis', 'ORA'))
+        return cls(**spec)
+
+    @classmethod
+    def from_record(cls, record: JobRecord) -> 'JobSpec':
+        """ Create a spec for polling a job from the job store """
+        parameters = record.parameters
+        return cls(record.analysis_type or 'ORA', parameters.get('testset', ''), parameters.get('categories', []),
+                   record.mirna_type, record.species, parameters.get('reference_set', ''), name=record.job_id,
+                   job_id=record.job_id)
+
+    def submit(self, api: API):
+        """ Start the analysis described by this spec on the provided API instance """
+        if self.job_id:
+            return api.load_job(self.job_id)
+        if self.analysis_type == 'ORA':
+            return api.run_ora(self.test_set, self.categories, self.mirna_type, self.species,
+                               self.reference_set, **self.params)
+        return api.run_gsea(self.test_set, self.categories, self.mirna_type, self.species, **self.params)
+
+    def __repr__(self):
+        return '{}({!r}, name={!r}, species={!r}, mirna_type={!r})'.format(
+            type(self).__name__, self.analysis_type, self.name, self.species, self.mirna_type)
+
+
+class BatchResult:
+    """ Outcome of a single batch job
+
+    Attributes
+    ----------
+    spec : JobSpec
+        Spec the job was started from
+    job_id : str or None
+        Job ID assigned by the server, None if submission failed
+    results : list or str or None
+        Enrichment results in the requested format, None if the job errored
+    error : Exception or None
+        Exception raised while submitting or retrieving the job
+    """
+    def __init__(self, spec: JobSpec, job_id=None, results=None, error: Exception=None):
+        self.spec = spec
+        self.job_id = job_id
+        self.results = results
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self):
+        status = 'ok' if self.ok else 'error={!r}'.format(self.error)
+        return '{}(name={!r}, job_id={!r}, {})'.format(type(self).__name__, self.spec.name, self.job_id, status)
+
+
+class BatchExecutor:
+    """ Submit, poll and download many enrichment analyses concurrently
+
+    Every job runs on its own `API` instance inside a bounded thread pool. All sessions share
+    the process-wide request throttle, so running more workers does not exceed the server limit.
+
+    Attributes
+    ----------
+    max_workers : int
+        Maximum number of jobs that are in flight at the same time
+    results_format : str
+        * *json* - retrieve results in json format
+        * *csv* - retrieve results in csv format
+    check_progress_interval : float or PollingStrategy, optional
+        How many seconds to wait between checking if results have been computed,
+        or a strategy deciding the wait. Defaults to `API.polling_strategy`
+    api_factory : callable
+        Returns a fresh `API` instance for each job
+    """
+    def __init__(self, max_workers: int=4, results_format: str='json',
+                 check_progress_interval: Union[float, PollingStrategy]=None, api_factory: Callable[[], API]=API):
+        if max_workers < 1:
+            raise ValueError('max_workers must be at least 1')
+        self.max_workers = max_workers
+        self.results_format = results_format
+        self.check_progress_interval = check_progress_interval
+        self.api_factory = api_factory
+
+    def run(self, specs: Iterable[Union[JobSpec, dict]]) -> Iterator[BatchResult]:
+        """ Run all jobs, yielding results as each job finishes
+
+        Parameters
+        ----------
+        specs : iterable of JobSpec or dict
+            Jobs to run. Dictionaries are converted using `JobSpec.from_dict`
+
+        Yields
+        ------
+        BatchResult
+            Result of each job in order of completion
+        """
+        yield from self.map(self._run_job, self._prepare_specs(specs))
+
+    def run_all(self, specs: Iterable[Union[JobSpec, dict]]) -> List[BatchResult]:
+        """ Run all jobs and return their results in the order the specs were given """
+        specs = self._prepare_specs(specs)
+        order = {id(spec): index for index, spec in enumerate(specs)}
+        return sorted(self.run(specs), key=lambda result: order[id(result.spec)])
+
+    def resume(self, store: Optional[JobStore]=None) -> Iterator[BatchResult]:
+        """ Poll and download every unfinished job, e.g. after the process was interrupted
+
+        Parameters
+        ----------
+        store : JobStore, optional
+            Job store to read unfinished jobs from, defaults to `API.jobs`
+
+        Yields
+        ------
+        BatchResult
+            Result of each resumed job in order of completion, with the job ID as spec name
+        """
+        store = store if store is not None else API.jobs
+        if store is None:
+            raise RuntimeError('No job store to resume jobs from, `API.jobs` is None')
+        return self.run(JobSpec.from_record(record) for record in store.unfinished())
+
+    def map(self, function: Callable[[API, T], R], items: Iterable[T]) -> Iterator[R]:
+        """ Call `function` with a fresh `API` instance for every item in the thread pool, yielding as calls return
+
+        Parameters
+        ----------
+        function : callable
+            Called as `function(api, item)`, the instance's session is closed once it returns
+        items : iterable
+            Items to call `function` with
+
+        Yields
+        ------
+        object
+            Return value of each call in order of completion
+        """
+        pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [pool.submit(self._call, function, item) for item in items]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+    def _call(self, function: Callable[[API, T], R], item: T) -> R:
+        api = self.api_factory()
+        try:
+            return function(api, item)
+        finally:
+            api.session.close()
+
+    def _run_job(self, api: API, spec: JobSpec) -> BatchResult:
+        try:
+            spec.submit(api)
+            if not api.job_id:
+                raise RuntimeError('Job submission failed for spec {!r}'.format(spec))
+            results = api.get_results(self.results_format, self.check_progress_interval)
+            return BatchResult(spec, api.job_id, results)
+        except Exception as err:
+            return BatchResult(spec, api.job_id, error=err)
+
+    @staticmethod
+    def _prepare_specs(specs: Iterable[Union[JobSpec, dict]]) -> List[JobSpec]:
+        prepared = []
+        for index, spec in enumerate(specs):
+            if not isinstance(spec, JobSpec):
+                spec = JobSpec.from_dict(spec)
+            if spec.name is None:
+                spec.name = index
+            if isinstance(spec.test_set, IOBase) or isinstance(spec.reference_set, IOBase):
+                # file objects cannot be safely shared between threads, read them up front
+                spec.test_set = _read_set(spec.test_set)
+                spec.reference_set = _read_set(spec.reference_set)
+            prepared.append(spec)
+        return prepared
+
+
+def _read_set(mirna_set):
+    if isinstance(mirna_set, IOBase):
+        return mirna_set.read().splitlines()
+    return mirna_set
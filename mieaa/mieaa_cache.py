@@ -0,0 +1,412 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+from re import findall
+import threading
+from time import time
+from typing import Hashable, Iterable, List, Optional
+
+
+def default_cache_dir() -> str:
+    """ Directory used for on-disk caches, `$MIEAA_CACHE_DIR` or `~/.cache/mieaa` """
+    cache_dir = os.environ.get('MIEAA_CACHE_DIR')
+    if not cache_dir:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        cache_dir = os.path.join(base, 'mieaa')
+    return cache_dir
+
+
+class LRUCache:
+    """ Thread-safe in-memory least recently used cache
+
+    Attributes
+    ----------
+    maxsize : int
+        Maximum number of entries kept, the least recently used entry is evicted first
+    hits : int
+        Number of successful lookups
+    misses : int
+        Number of failed lookups
+    """
+    def __init__(self, maxsize: int=128):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class CatalogEntry:
+    """ Enrichment categories available for one (species, mirna_type, mode) combination
+
+    Attributes
+    ----------
+    categories : list
+        `[name, description]` pairs as returned by the server, names include the
+        '_precursor' or '_mature' suffix
+    fetched : float
+        Unix time the categories were retrieved from the server
+    index : dict
+        Maps lowercase category names to their correctly cased names
+    """
+    def __init__(self, categories: List[List[str]], fetched: Optional[float]=None):
+        self.categories = [tuple(category) for category in categories]
+        self.fetched = time() if fetched is None else fetched
+        self.index = {name.lower(): name for name, _ in self.categories}
+
+    def is_expired(self, ttl: Optional[float]) -> bool:
+        return ttl is not None and time() - self.fetched > ttl
+
+
+class CategoryCatalog:
+    """ Cache of enrichment categories keyed by (species, mirna_type, mode)
+
+    Categories rarely change, so they are kept in an in-memory LRU cache and optionally persisted
+    to disk. Entries older than `ttl` seconds are fetched again, `refresh` forces a refetch.
+
+    Attributes
+    ----------
+    ttl : float or None
+        Seconds before an entry expires, None to never expire
+    cache_dir : str or None
+        Directory to persist categories in, None to keep them in memory only
+    """
+    def __init__(self, maxsize: int=64, ttl: Optional[float]=7 * 24 * 60 * 60, cache_dir: Optional[str]=None):
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._memory = LRUCache(maxsize)
+
+    @staticmethod
+    def key(species: str, mirna_type: str, mode: str='all') -> tuple:
+        return species.lower(), mirna_type.lower(), mode.lower()
+
+    def lookup(self, species: str, mirna_type: str, mode: str='all') -> Optional[CatalogEntry]:
+        """ Return the cached entry, or None if it is missing or expired """
+        key = self.key(species, mirna_type, mode)
+        entry = self._memory.get(key)
+        if entry is None:
+            entry = self._load(key)
+            if entry is not None:
+                self._memory.set(key, entry)
+        if entry is None or entry.is_expired(self.ttl):
+            return None
+        return entry
+
+    def store(self, species: str, mirna_type: str, mode: str, categories: List[List[str]]) -> CatalogEntry:
+        """ Cache categories retrieved from the server """
+        key = self.key(species, mirna_type, mode)
+        entry = CatalogEntry(categories)
+        self._memory.set(key, entry)
+        self._save(key, entry)
+        return entry
+
+    def refresh(self, species: str=None, mirna_type: str=None, mode: str=None):
+        """ Invalidate cached entries matching all provided arguments, or every entry if none are provided """
+        wanted = [value and value.lower() for value in (species, mirna_type, mode)]
+
+        def matches(key):
+            return all(value is None or value == part for value, part in zip(wanted, key))
+
+        for key in self._memory.keys():
+            if matches(key):
+                self._memory.pop(key)
+        if self.cache_dir and os.path.isdir(self._directory):
+            for file_name in os.listdir(self._directory):
+                key = tuple(os.path.splitext(file_name)[0].split('_'))
+                if len(key) == 3 and matches(key):
+                    os.remove(os.path.join(self._directory, file_name))
+
+    @property
+    def _directory(self) -> str:
+        return os.path.join(self.cache_dir, 'categories')
+
+    def _path(self, key: tuple) -> str:
+        return os.path.join(self._directory, '{}.json'.format('_'.join(key)))
+
+    def _load(self, key: tuple) -> Optional[CatalogEntry]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._path(key)) as cache_file:
+                cached = json.load(cache_file)
+            return CatalogEntry(cached['categories'], cached['fetched'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _save(self, key: tuple, entry: CatalogEntry):
+        if not self.cache_dir:
+            return
+        os.makedirs(self._directory, exist_ok=True)
+        path = self._path(key)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as cache_file:
+            json.dump({'fetched': entry.fetched, 'categories': entry.categories}, cache_file)
+        os.replace(tmp_path, path)
+
+
+def split_ids(mirna_set: str) -> List[str]:
+    """ Split a delimited string of miRNA/precursor ids, accepting the same mixed delimiters as the server """
+    return findall(r'[^\s,;]+', mirna_set)
+
+
+def request_key(analysis_type: str, species: str, mirna_type: str, test_set: str, reference_set: str,
+                categories: List[str], params: dict) -> str:
+    """ Hash a normalized enrichment request
+
+    Test and reference sets are deduplicated and sorted, except for GSEA test sets whose order is the ranking.
+    Categories are expected to already be resolved to server names.
+    """
+    test_ids = list(OrderedDict.fromkeys(split_ids(test_set)))
+    if analysis_type.upper() != 'GSEA':
+        test_ids.sort()
+    normalized = {
+        'analysis_type': analysis_type.upper(),
+        'species': species.lower(),
+        'mirna_type': mirna_type.lower(),
+        'test_set': test_ids,
+        'reference_set': sorted(set(split_ids(reference_set))),
+        'categories': sorted(set(categories)),
+        'params': {key: str(value) for key, value in params.items()},
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """ On-disk cache of completed enrichment results keyed by a hash of the normalized request
+
+    Identical analyses are answered from disk instead of submitting a new server job. Least recently
+    used results are evicted once the cache grows beyond `max_bytes`, entries older than `max_age`
+    seconds are ignored and removed.
+
+    Attributes
+    ----------
+    cache_dir : str
+        Directory results are stored in, defaults to `default_cache_dir()`
+    max_bytes : int
+        Maximum total size of cached results
+    max_age : float or None
+        Seconds before a result expires, None to never expire
+    """
+    def __init__(self, cache_dir: Optional[str]=None, max_bytes: int=512 * 1024 ** 2, max_age: Optional[float]=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    @property
+    def _directory(self) -> str:
+        return os.path.join(self.cache_dir, 'results')
+
+    def path(self, key: str, results_format: str) -> str:
+        """ Path of the file results of a request are cached in, whether or not they are cached """
+        return os.path.join(self._directory, '{}.{}'.format(key, results_format))
+
+    def job_id(self, key: str) -> Optional[str]:
+        """ Return the job ID of a cached request in any format, or None if it is not cached """
+        for results_format in ('json', 'csv'):
+            cached = self._read(key, results_format, with_results=False)
+            if cached is not None:
+                return cached[0]
+        return None
+
+    def get(self, key: str, results_format: str) -> Optional[str]:
+        """ Return cached results, or None if they are not cached """
+        cached = self._read(key, results_format)
+        return None if cached is None else cached[1]
+
+    def put(self, key: str, results_format: str, job_id: str, results: str):
+        """ Store results, evicting old entries if the cache is too large """
+        os.makedirs(self._directory, exist_ok=True)
+        path = self.path(key, results_format)
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as cache_file:
+            cache_file.write(job_id + '\n')
+            cache_file.write(results)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """ Remove expired entries and the least recently used entries beyond `max_bytes` """
+        with self._lock:
+            entries = []
+            for entry in _scandir(self._directory):
+                if entry.name.endswith('.tmp'):
+                    continue
+                stat = entry.stat()
+                if self.max_age is not None and time() - stat.st_mtime > self.max_age:
+                    _remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                _remove(path)
+                total -= size
+
+    def clear(self):
+        """ Remove all cached results """
+        with self._lock:
+            for entry in _scandir(self._directory):
+                _remove(entry.path)
+
+    def _read(self, key: str, results_format: str, with_results: bool=True) -> Optional[tuple]:
+        """ Job ID and results of an entry, only the first line holding the job ID is read without results """
+        path = self.path(key, results_format)
+        try:
+            if self.max_age is not None and time() - os.path.getmtime(path) > self.max_age:
+                return None
+            with open(path) as cache_file:
+                job_id = cache_file.readline().rstrip('\n')
+                results = cache_file.read() if with_results else None
+            os.utime(path)  # mark as recently used
+        except OSError:
+            return None
+        return job_id, results
+
+
+def _scandir(directory: str) -> list:
+    try:
+        return list(os.scandir(directory))
+    except OSError:
+        return []
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class IdCache:
+    """ Per-id cache of converter results
+
+    Conversions are cached for each id within a namespace describing the conversion (converter, direction,
+    miRBase versions and conversion type), so converters only send ids that were not converted before.
+    Entries are kept in an in-memory LRU cache and optionally persisted in a SQLite database.
+
+    Attributes
+    ----------
+    path : str or None
+        SQLite database to persist conversions in, None to keep them in memory only
+    hits : int
+        Number of ids answered from the cache
+    misses : int
+        Number of ids that had to be converted by the server
+    """
+    _schema = 'CREATE TABLE IF NOT EXISTS conversions (namespace TEXT, id TEXT, value TEXT, PRIMARY KEY (namespace, id))'
+
+    def __init__(self, maxsize: int=100000, path: Optional[str]=None):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory = LRUCache(maxsize)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def namespace(payload: dict) -> str:
+        """ Describe a converter request, ignoring the ids and output format """
+        fields = ('input_type', 'mirbase_input_version', 'mirbase_output_version', 'conversion_type')
+        return '|'.join(str(payload.get(field, '')) for field in fields)
+
+    def get_many(self, namespace: str, ids: Iterable[str]) -> dict:
+        """ Return cached conversions for the given ids, updating the hit and miss counters """
+        found = {}
+        missing = []
+        for mirna in ids:
+            value = self._memory.get((namespace, mirna))
+            if value is None:
+                missing.append(mirna)
+            else:
+                found[mirna] = value
+        if missing and self.path:
+            with self._lock:
+                connection = self._connect()
+                for start in range(0, len(missing), 500):
+                    batch = missing[start:start + 500]
+                    rows = connection.execute(
+                        'SELECT id, value FROM conversions WHERE namespace = ? AND id IN ({})'.format(
+                            ', '.join('?' * len(batch))), [namespace] + batch).fetchall()
+                    for mirna, value in rows:
+                        found[mirna] = value
+                        self._memory.set((namespace, mirna), value)
+        self.hits += len(found)
+        self.misses += sum(1 for mirna in missing if mirna not in found)
+        return found
+
+    def put_many(self, namespace: str, conversions: dict):
+        """ Cache conversions, mapping each id to its converted value """
+        for mirna, value in conversions.items():
+            self._memory.set((namespace, mirna), value)
+        if self.path and conversions:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.executemany('INSERT OR REPLACE INTO conversions VALUES (?, ?, ?)',
+                                           [(namespace, mirna, value) for mirna, value in conversions.items()])
+
+    def stats(self) -> dict:
+        """ Hit and miss counters and number of ids kept in memory """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.,
+                'size': len(self._memory)}
+
+    def clear(self):
+        """ Remove all cached conversions and reset the counters """
+        self._memory.clear()
+        self.hits = self.misses = 0
+        if self.path:
+            with self._lock:
+                connection = self._connect()
+                with connection:
+                    connection.execute('DELETE FROM conversions')
+
+    def _connect(self) -> 'sqlite3.Connection':
+        import sqlite3  # only loaded when a persistent id cache is used, keeping the CLI startup short
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute(self._schema)
+        return self._connection
@@ -1,28 +1,51 @@
 import argparse
-from mieaa.mieaa_wrapper import API
+from functools import lru_cache
+import os
+import sys
+from mieaa import mieaa_daemon
 from mieaa._version import __version__
 
+# Modules used by the subcommands (requests, sqlite3, datetime, ...) are imported by the functions
+# running them, so `mieaa --help`, `--version` and calls forwarded to `mieaa serve` start quickly
+
+
+def chunked_results(lines, args):
+    # results were streamed to the output file, avoid keeping them in memory
+    if args.outfile:
+        count = sum(1 for _ in lines)
+        return 'Wrote {} lines to {}'.format(count, args.outfile.name)
+    return list(lines)
+
+
 def type_converter(mieaa, args):
     mirnas = args.mirna_set_file or args.mirna_set
+    if args.chunk_size:
+        convert = mieaa.iter_to_mirna if args.parser_name == 'to_mirna' else mieaa.iter_to_precursor
+        return chunked_results(convert(mirnas, args.outfile, args.chunk_size, args.workers,
+                                       conversion_type=args.conv_type, output_format=args.out_format), args)
     return mieaa._convert_mirna_type(mirnas, args.parser_name, args.outfile,
                                     conversion_type=args.conv_type, output_format=args.out_format)
 
 
 def mirbase_converter(mieaa, args):
+    from mieaa.mieaa_mirbase import MirbaseIndex
     mirnas = args.mirna_set_file or args.mirna_set
     formatting = 'oneline' if args.out_format == 'newline' else args.out_format
+    if args.index:
+        mieaa.mirbase_index = MirbaseIndex(args.index)
+    if args.chunk_size:
+        return chunked_results(mieaa.iter_convert_mirbase(mirnas, args.from_, args.to, args.mirna_type, args.outfile,
+                                                          args.chunk_size, args.workers, fallback=args.fallback,
+                                                          output_format=args.out_format), args)
     return mieaa.convert_mirbase(mirnas, args.from_, args.to, args.mirna_type, args.outfile,
-                                         output_format=args.out_format)
+                                 fallback=args.fallback, output_format=args.out_format)
 
 
 def enrichment_analsis(mieaa, args):
+    from mieaa.mieaa_manifest import expand_categories
     mirnas = args.mirna_set_file or args.mirna_set
     categories = args.categories_file.read().splitlines() if args.categories_file else args.categories
-    for option in ['all', 'default', 'defaults', 'expert']:
-        if option in categories:
-            categories.remove(option)
-            categories.extend(mieaa.get_enrichment_categories(args.mirna_type, args.species, option))
-    categories = set(categories)
+    categories = expand_categories(mieaa, categories, args.mirna_type, args.species)
 
     ref_set = ''
     if args.parser_name == 'ora':
@@ -39,6 +62,9 @@ def enrichment_analsis(mieaa, args):
 
     if args.no_results:
         return mieaa.job_id
+    if args.outfile and not args.verbose:
+        # results are not printed, stream them to the file instead of loading them
+        return mieaa.download_results(args.outfile, args.outfile_type)
     if args.outfile:
         return mieaa.save_enrichment_results(args.outfile, args.outfile_type)
     return mieaa.get_results()
@@ -47,114 +73,302 @@ def enrichment_analsis(mieaa, args):
 def open_browser(mieaa, args):
     return mieaa.open_gui(args.open, args.job_id)
 
-def create_subcommands(subparsers):
-    def mutex_help_text(required=True):  # title and description of help groups
-        if required:
-            return "mutually exclusive required arguments", "either a set or file must be provided"
-        return "mutually exclusive optional arguments", "either a set or file may be provided"
-
-    # Abstract Parsers
-    # ----------------
+def manage_jobs(mieaa, args):
+    from datetime import datetime
+    from mieaa.mieaa_batch import BatchExecutor, JobSpec
+    from mieaa.mieaa_jobs import FAILED, FINISHED, UNFINISHED
+
+    def timestamp(seconds):
+        return datetime.fromtimestamp(seconds).strftime('%Y-%m-%d %H:%M:%S')
+
+    store = mieaa.jobs
+    if store is None:
+        raise SystemExit('The job store is disabled by $MIEAA_NO_JOB_STORE')
+    if args.jobs_command == 'resume':
+        if args.job_id:
+            records = [store.get_record(job_id) for job_id in args.job_id]
+            missing = [job_id for job_id, record in zip(args.job_id, records) if record is None]
+            if missing:
+                raise SystemExit('Unknown job ID(s): {}'.format(', '.join(missing)))
+        else:
+            records = store.unfinished()
+        executor = BatchExecutor(args.workers, args.outfile_type)
+        os.makedirs(args.outdir, exist_ok=True)
+        lines = []
+        for result in executor.run(JobSpec.from_record(record) for record in records):
+            if not result.ok:
+                lines.append('{}\terror\t{}'.format(result.job_id, result.error))
+                continue
+            path = os.path.join(args.outdir, '{}.{}'.format(result.job_id, args.outfile_type))
+            with open(path, 'w+') as outfile:
+                outfile.write(str(result.results))
+            store.update(result.job_id, result_location=os.path.abspath(path))
+            lines.append('{}\tsaved\t{}'.format(result.job_id, path))
+        return '\n'.join(lines)
+
+    statuses = {'all': None, 'finished': [FINISHED], 'failed': [FAILED], 'unfinished': UNFINISHED}[args.status]
+    if args.jobs_command == 'purge':
+        older_than = args.older_than * 24 * 60 * 60 if args.older_than is not None else None
+        return 'Purged {} job(s)'.format(store.purge(statuses, older_than))
+
+    columns = ['job_id', 'status', 'analysis', 'species', 'mirna_type', 'created', 'updated', 'result_location']
+    rows = ['\t'.join(columns)]
+    for record in store.records(statuses):
+        rows.append('\t'.join([record.job_id, record.status, record.analysis_type, record.species, record.mirna_type,
+                               timestamp(record.created), timestamp(record.updated), record.result_location]))
+    return '\n'.join(rows)
+
+
+def run_batch(mieaa, args):
+    from mieaa.mieaa_manifest import ManifestRunner, read_manifest
+    try:
+        rows = read_manifest(args.manifest)
+    except (OSError, ValueError) as err:
+        raise SystemExit('Invalid manifest: {}'.format(err))
+    runner = ManifestRunner(args.outdir, args.workers, args.outfile_type, resume=not args.restart)
+    counts = {'completed': 0, 'skipped': 0, 'failed': 0}
+    for result in runner.run(rows):
+        counts[result.status] += 1
+        detail = result.error if result.error is not None else result.output
+        print('{}\t{}\t{}'.format(result.row.name, result.status, detail), flush=True)
+    summary = '{} row(s): {completed} completed, {skipped} skipped, {failed} failed. Summary saved to {}'.format(
+        len(rows), runner.summary_path, **counts)
+    if counts['failed']:
+        raise SystemExit(summary)
+    return summary
+
+
+def run_daemon(mieaa, args):
+    if args.stop:
+        stopped = mieaa_daemon.stop(args.socket)
+        return 'Stopped daemon' if stopped else 'No daemon is running'
+    mieaa_daemon.serve(args.socket, args.idle_timeout)
+    return 'Daemon stopped'
+
+
+# Subcommands and their help, listed in this order by `mieaa --help`
+SUBCOMMANDS = {
+    'ora': 'Run Over-representation Analysis',
+    'gsea': 'Run Gene Set Enrichment Analysis',
+    'to_precursor': 'Convert miRNAs to precursors',
+    'to_mirna': 'Convert precursors to miRNAs',
+    'convert_mirbase': 'Convert mirBase version',
+    'open': 'Open MiEAA tool in browser',
+    'jobs': 'List, resume or purge previously submitted jobs',
+    'batch': 'Run the analyses and conversions listed in a manifest',
+    'serve': 'Run a daemon that executes the other subcommands, keeping connections, caches and the rate limit '
+             'across calls',
+}
+
+
+def mutex_help_text(required=True):  # title and description of help groups
+    if required:
+        return "mutually exclusive required arguments", "either a set or file must be provided"
+    return "mutually exclusive optional arguments", "either a set or file may be provided"
+
+
+# Abstract Parsers
+# ----------------
+# Built on first use, so only the parents of the selected subcommand are constructed
+@lru_cache(maxsize=None)
+def base_parser():
     # Parent parser with requirements inherited by all subcommands
-    base_parser = argparse.ArgumentParser(add_help=False)
-    base_parser.add_argument('-v', '--verbose', action='store_true', help='Always print results to stdout')
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('-v', '--verbose', action='store_true', help='Always print results to stdout')
+    return parser
 
+
+@lru_cache(maxsize=None)
+def mirna_parser():
     # Abstract parser for any commands involving mirnas
-    mirna_parser = argparse.ArgumentParser(add_help=False, parents=[base_parser])
-    mirna_set_group = mirna_parser.add_argument_group(*mutex_help_text(required=True))
+    parser = argparse.ArgumentParser(add_help=False, parents=[base_parser()])
+    mirna_set_group = parser.add_argument_group(*mutex_help_text(required=True))
     mirna_set_group.add_argument('-m', '--mirna-set', nargs='+', help='miRNA/precursor target set')
     mirna_set_group.add_argument('-M', '--mirna-set-file', type=argparse.FileType('r'),
         help='Specify miRNA/precursor target set via file')
-    mirna_parser.add_argument('-p', '--precursor', '--precursors', action='store_const', const='precursor',
+    parser.add_argument('-p', '--precursor', '--precursors', action='store_const', const='precursor',
         default='mirna', dest='mirna_type', help='Use if running on a set of precursors as opposed to miRNAs')
-    mirna_parser.add_argument('-o', '--outfile', type=argparse.FileType('w+'),
+    parser.add_argument('-o', '--outfile', type=argparse.FileType('w+'),
         help='Save results to provided file')
+    return parser
+
 
+@lru_cache(maxsize=None)
+def converter_parser():
     # Abstract Converter applicable to all converters
-    converter_parser = argparse.ArgumentParser(add_help=False, parents=[mirna_parser])
-    output_style_group = converter_parser.add_mutually_exclusive_group()
+    parser = argparse.ArgumentParser(add_help=False, parents=[mirna_parser()])
+    output_style_group = parser.add_mutually_exclusive_group()
     output_style_group.add_argument('--oneline', action='store_const', const='oneline', dest='out_format',
         default='oneline', help='Output style: Multi-mapped ids are separated by a semicolon (default)')
     output_style_group.add_argument('--newline', action='store_const', const='newline', dest='out_format',
         default='oneline', help='Output style: Multi-mapped ids are separated by a newline')
     output_style_group.add_argument('--tabsep', action='store_const', const='tabsep', dest='out_format',
         default='oneline', help='Output style: Tab-separated `original\tconverted` ids')
+    parser.add_argument('--chunk-size', type=int, default=0,
+        help='Stream input in chunks of this many ids, converting chunks concurrently (default: single request)')
+    parser.add_argument('-w', '--workers', type=int, default=4,
+        help='Number of chunks converted concurrently when using --chunk-size (default=4)')
+    return parser
 
+
+@lru_cache(maxsize=None)
+def convert_type_parser():
     # Abstract Type Converter Parser (`to_precursors` and `to_mirnas`)
-    convert_type_parser = argparse.ArgumentParser(add_help=False, parents=[converter_parser])
-    convert_type_parser.add_argument('-u', '--unique', action='store_const', const='unique', dest='conv_type',
+    parser = argparse.ArgumentParser(add_help=False, parents=[converter_parser()])
+    parser.add_argument('-u', '--unique', action='store_const', const='unique', dest='conv_type',
         default='all', help='Only output ids that map uniquely')
+    return parser
+
 
+@lru_cache(maxsize=None)
+def enrichment_parser():
     # Abstract Analysis Parser
     species_choices = ['hsa', 'mmu', 'rno', 'ath', 'bta', 'cel', 'dme', 'dre', 'gga', 'ssc']
-    enrichment_parser = argparse.ArgumentParser(add_help=False, parents=[mirna_parser])
-    enrichment_parser.add_argument('species', choices=species_choices, help='Species')
-    enrichment_parser.add_argument('-x', '--no-results', action='store_true',
+    parser = argparse.ArgumentParser(add_help=False, parents=[mirna_parser()])
+    parser.add_argument('species', choices=species_choices, help='Species')
+    parser.add_argument('-x', '--no-results', action='store_true',
         help='Do not monitor progress or obtain results. Can retrieve later using Job ID.')
-    categories_group = enrichment_parser.add_argument_group(*mutex_help_text(required=False))
+    categories_group = parser.add_argument_group(*mutex_help_text(required=False))
     categories_group.add_argument('-c', '--categories', nargs='+', default=['default'],
         help='Set of categories to include in analysis, can include `all`, `default`, `expert` or specific categories')
     categories_group.add_argument('-C', '--categories-file', type=argparse.FileType('r'),
         help='File specifying categories to include in analysis')
-    enrichment_parser.add_argument('-t', '--threshold', type=int, default=2, nargs=1,
+    parser.add_argument('-t', '--threshold', type=int, default=2, nargs=1,
         help='Filter out subcategories that contain less than this many miRNAs/precursors (default=2)')
-    enrichment_parser.add_argument('-s', '--significance', '--alpha', type=float, default=0.05, nargs=1,
+    parser.add_argument('-s', '--significance', '--alpha', type=float, default=0.05, nargs=1,
         help='Significance level (default=0.05)')
-    enrichment_parser.add_argument('-g', '--group-adjust', action='store_false', dest='indep_adjust',
+    parser.add_argument('-g', '--group-adjust', action='store_false', dest='indep_adjust',
         help='Adjust p-values over aggregated groups (By default each group is adjusted independently)')
-    enrichment_parser.add_argument('-a', '--adjustment', type=str, default='fdr', nargs=1,
+    parser.add_argument('-a', '--adjustment', type=str, default='fdr', nargs=1,
         choices=['none', 'fdr', 'bonferroni', 'BY', 'holm', 'hochberg', 'hommel'],
         help="p-value adjustment method (default='fdr')")
-    output_format_group = enrichment_parser.add_mutually_exclusive_group()
+    output_format_group = parser.add_mutually_exclusive_group()
     output_format_group.add_argument('--csv', action='store_const', const='csv', dest='outfile_type',
         help="Store results in output file in csv format (default)")
     output_format_group.add_argument('--json', action='store_const', const='json', dest='outfile_type',
         help="Store results in output file in json format (default is csv)")
-    enrichment_parser.set_defaults(outfile_type='csv')
+    parser.set_defaults(outfile_type='csv')
+    return parser
+
 
+@lru_cache(maxsize=None)
+def job_parser():
     # Abstract Job Parser
-    job_parser = argparse.ArgumentParser(add_help=False, parents=[base_parser])
-    job_parser.add_argument('-j', '--jobid', type=str, dest='job_id', help='Job ID')
+    parser = argparse.ArgumentParser(add_help=False, parents=[base_parser()])
+    parser.add_argument('-j', '--jobid', type=str, dest='job_id', help='Job ID')
+    return parser
+
+
+def create_subcommands(subparsers, selected=None):
+    """ Add all subcommands, building arguments only for the `selected` names (default: all) """
+    def add_parser(name, *parents):
+        if selected is not None and name not in selected:
+            # listed by `mieaa --help`, but parsing its arguments requires building it
+            subparsers.add_parser(name, help=SUBCOMMANDS[name])
+            return None
+        return subparsers.add_parser(name, help=SUBCOMMANDS[name], parents=[parent() for parent in parents])
 
     # Concrete Subcommand Parsers
     # ---------------------------
     # ORA parser
-    ora_parser = subparsers.add_parser('ora', parents=[enrichment_parser], help='Run Over-representation Analysis')
-    reference_set_group = ora_parser.add_argument_group(*mutex_help_text(required=False))
-    reference_set_group.add_argument('-r', '--reference-set', nargs='+',
-        help='(Optional) Set of background miRNAs/precursors')
-    reference_set_group.add_argument('-R', '--reference-set-file',
-        help='(Optional) File specifying background miRNAs/precursors')
-    ora_parser.set_defaults(parser_name='ora', call=enrichment_analsis)
+    ora_parser = add_parser('ora', enrichment_parser)
+    if ora_parser is not None:
+        reference_set_group = ora_parser.add_argument_group(*mutex_help_text(required=False))
+        reference_set_group.add_argument('-r', '--reference-set', nargs='+',
+            help='(Optional) Set of background miRNAs/precursors')
+        reference_set_group.add_argument('-R', '--reference-set-file',
+            help='(Optional) File specifying background miRNAs/precursors')
+        ora_parser.set_defaults(parser_name='ora', call=enrichment_analsis)
 
     # GSEA parser
-    gsea_parser = subparsers.add_parser('gsea', parents=[enrichment_parser], help='Run Gene Set Enrichment Analysis')
-    gsea_parser.set_defaults(parser_name='gsea', call=enrichment_analsis)
+    gsea_parser = add_parser('gsea', enrichment_parser)
+    if gsea_parser is not None:
+        gsea_parser.set_defaults(parser_name='gsea', call=enrichment_analsis)
 
     # miRNA->precursor
-    to_prec_parser = subparsers.add_parser('to_precursor', parents=[convert_type_parser],
-        help='Convert miRNAs to precursors')
-    to_prec_parser.set_defaults(parser_name='to_precursor', call=type_converter)
+    to_prec_parser = add_parser('to_precursor', convert_type_parser)
+    if to_prec_parser is not None:
+        to_prec_parser.set_defaults(parser_name='to_precursor', call=type_converter)
 
     # precursor->miRNA
-    to_mirna_parser = subparsers.add_parser('to_mirna', parents=[convert_type_parser],
-        help='Convert precursors to miRNAs')
-    to_mirna_parser.set_defaults(parser_name='to_mirna', call=type_converter)
+    to_mirna_parser = add_parser('to_mirna', convert_type_parser)
+    if to_mirna_parser is not None:
+        to_mirna_parser.set_defaults(parser_name='to_mirna', call=type_converter)
 
     # mirbase converter parser
-    version_parser = subparsers.add_parser('convert_mirbase', parents=[converter_parser],
-        help='Convert mirBase version')
-    version_parser.add_argument('from_', metavar='FROM', help='mirBase version to convert miRNAs/precursors from')
-    version_parser.add_argument('--to', default=22,
-        help='mirBase version to convert miRNAs/precursors from (default=22)')
-    version_parser.set_defaults(parser_name='convert_mirbase', call=mirbase_converter)
+    version_parser = add_parser('convert_mirbase', converter_parser)
+    if version_parser is not None:
+        version_parser.add_argument('from_', metavar='FROM', help='mirBase version to convert miRNAs/precursors from')
+        version_parser.add_argument('--to', default=22,
+            help='mirBase version to convert miRNAs/precursors from (default=22)')
+        version_parser.add_argument('-i', '--index', help='Convert locally using a prebuilt miRBase index file')
+        version_parser.add_argument('--no-fallback', action='store_false', dest='fallback',
+            help='Do not send ids missing from the local index to the server')
+        version_parser.set_defaults(parser_name='convert_mirbase', call=mirbase_converter)
 
     # open webtool in browser parser
-    open_parser = subparsers.add_parser('open', help='Open MiEAA tool in browser', parents=[job_parser])
-    open_parser.add_argument('open', choices=('input', 'progress', 'results'), help='Open MiEAA interface in browser')
-    open_parser.set_defaults(parser_name='open', call=open_browser)
-
-def main():
+    open_parser = add_parser('open', job_parser)
+    if open_parser is not None:
+        open_parser.add_argument('open', choices=('input', 'progress', 'results'),
+            help='Open MiEAA interface in browser')
+        open_parser.set_defaults(parser_name='open', call=open_browser)
+
+    # job store parser
+    jobs_parser = add_parser('jobs', base_parser)
+    if jobs_parser is not None:
+        jobs_subparsers = jobs_parser.add_subparsers(dest='jobs_command')
+        status_parser = argparse.ArgumentParser(add_help=False)
+        status_parser.add_argument('--status', choices=('all', 'unfinished', 'finished', 'failed'), default='all',
+            help='Only include jobs with this status (default=all)')
+        jobs_subparsers.add_parser('list', parents=[status_parser], help='List jobs')
+        resume_parser = jobs_subparsers.add_parser('resume',
+            help='Poll unfinished jobs (or the provided Job IDs) and save their results')
+        resume_parser.add_argument('-j', '--jobid', nargs='+', dest='job_id', help='Job IDs to resume')
+        resume_parser.add_argument('-d', '--outdir', default='.', help='Directory to save results in (default=.)')
+        resume_parser.add_argument('-w', '--workers', type=int, default=4,
+            help='Number of jobs polled concurrently (default=4)')
+        resume_format_group = resume_parser.add_mutually_exclusive_group()
+        resume_format_group.add_argument('--csv', action='store_const', const='csv', dest='outfile_type',
+            help="Save results in csv format (default)")
+        resume_format_group.add_argument('--json', action='store_const', const='json', dest='outfile_type',
+            help="Save results in json format")
+        resume_parser.set_defaults(outfile_type='csv')
+        purge_parser = jobs_subparsers.add_parser('purge', parents=[status_parser],
+            help='Delete jobs from the job store')
+        purge_parser.add_argument('--older-than', type=float, metavar='DAYS',
+            help='Only purge jobs last updated more than this many days ago')
+        jobs_parser.set_defaults(parser_name='jobs', call=manage_jobs, jobs_command='list', status='all',
+            outfile=None)
+
+    # manifest parser
+    batch_parser = add_parser('batch', base_parser)
+    if batch_parser is not None:
+        batch_parser.add_argument('manifest', help='Tab-separated manifest with a header row, or JSON lines (.jsonl)')
+        batch_parser.add_argument('-d', '--outdir', default='.', help='Directory to save results and summary.tsv in '
+            '(default=.)')
+        batch_parser.add_argument('-w', '--workers', type=int, default=4,
+            help='Number of rows run concurrently (default=4)')
+        batch_parser.add_argument('--restart', action='store_true',
+            help='Run all rows, instead of skipping rows completed by an earlier run')
+        batch_format_group = batch_parser.add_mutually_exclusive_group()
+        batch_format_group.add_argument('--csv', action='store_const', const='csv', dest='outfile_type',
+            help="Save analysis results in csv format unless a row sets `format` (default)")
+        batch_format_group.add_argument('--json', action='store_const', const='json', dest='outfile_type',
+            help="Save analysis results in json format unless a row sets `format`")
+        batch_parser.set_defaults(parser_name='batch', call=run_batch, outfile_type='csv', outfile=None)
+
+    # daemon parser
+    serve_parser = add_parser('serve', base_parser)
+    if serve_parser is not None:
+        serve_parser.add_argument('--socket', help='Unix socket to listen on (default=$MIEAA_SOCKET or '
+            'daemon.sock in the cache directory)')
+        serve_parser.add_argument('--idle-timeout', type=float, metavar='SECONDS',
+            help='Exit after this many seconds without commands (default: run until stopped)')
+        serve_parser.add_argument('--stop', action='store_true', help='Stop the running daemon')
+        serve_parser.set_defaults(parser_name='serve', call=run_daemon, outfile=None)
+
+
+def parse_args(argv=None):
     # check for mutually exclusive arguments (basically ArgumentParser.add_mutually_exclusive_group)
     # implemented due to inability to combine custom title/descriptions in help flag
     def exclusivity_check(subparser, set_opt, file_opt, flag_letter, required=True):
@@ -173,9 +387,12 @@ def main():
     mieaa_parser = argparse.ArgumentParser(prog='miEAA', description='miEAA Command Line Tool')
     mieaa_parser.add_argument('--version', action='version', version='{} {}'.format(mieaa_parser.prog, __version__))
     mieaa_subparsers = mieaa_parser.add_subparsers()
-    create_subcommands(mieaa_subparsers)
+    # only the invoked subcommand is built, the top level parser takes no options besides --help and --version
+    argv = sys.argv[1:] if argv is None else argv
+    command = next((arg for arg in argv if not arg.startswith('-')), None)
+    create_subcommands(mieaa_subparsers, selected=[command] if command else [])
 
-    args, unknown = mieaa_parser.parse_known_args()
+    args, unknown = mieaa_parser.parse_known_args(argv)
 
     try:
         selected_parser = mieaa_subparsers.choices[args.parser_name]
@@ -195,7 +412,11 @@ def main():
             exclusivity_check(selected_parser, args.reference_set, args.reference_set_file, 'r', required=False)
     except AttributeError:
         pass
+    return args
+
 
+def run(args):
+    from mieaa.mieaa_wrapper import API
     mieaa = API()
     results = args.call(mieaa, args)
     try:  # outfile not in all parsers
@@ -205,5 +426,14 @@ def main():
         pass
 
 
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # a running `mieaa serve` daemon executes the command with its warm sessions and caches
+    status = mieaa_daemon.forward(argv)
+    if status is not None:
+        sys.exit(status)
+    run(parse_args(argv))
+
+
 if __name__ == "__main__":
     main()
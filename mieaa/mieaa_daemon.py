@@ -0,0 +1,288 @@
+from contextlib import contextmanager
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+from time import monotonic, sleep
+from typing import List, Optional
+
+from mieaa.mieaa_cache import default_cache_dir
+from mieaa._version import __version__
+
+
+# subcommands that must run in the calling process: `open` starts the user's browser
+LOCAL_COMMANDS = ('serve', 'open')
+# arguments holding paths that are opened after parsing, resolved against the caller's working directory
+PATH_ARGUMENTS = ('outdir', 'index', 'manifest')
+# variables deciding where caches are kept and how the server is reached, which the daemon cannot change per command
+ENVIRONMENT_VARIABLES = ('MIEAA_CACHE_DIR', 'XDG_CACHE_HOME', 'HOME', 'HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY',
+                         'NO_PROXY', 'http_proxy', 'https_proxy', 'all_proxy', 'no_proxy', 'REQUESTS_CA_BUNDLE',
+                         'CURL_CA_BUNDLE')
+
+
+def environment() -> dict:
+    """ Values of `ENVIRONMENT_VARIABLES` in this process, commands are only forwarded to a daemon with the same """
+    return {name: os.environ.get(name) for name in ENVIRONMENT_VARIABLES}
+
+
+def default_socket_path() -> str:
+    """ Socket of the daemon, `$MIEAA_SOCKET` or `daemon.sock` in the cache directory """
+    return os.environ.get('MIEAA_SOCKET') or os.path.join(default_cache_dir(), 'daemon.sock')
+
+
+class _ThreadLocalStream(io.TextIOBase):
+    """ Stream writing to a per-thread buffer while one is set, and to the wrapped stream otherwise """
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer: Optional[io.StringIO]):
+        self._local.buffer = buffer
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer if buffer is not None else self.stream).write(text)
+
+    def flush(self):
+        if getattr(self._local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        server = self.server
+        with server.activity():
+            try:
+                request = json.loads(self.rfile.readline().decode())
+            except ValueError:
+                return
+            if request.get('command') == 'stop':
+                response = {'status': 0}
+                threading.Thread(target=server.shutdown, daemon=True).start()
+            elif request.get('version') != __version__:
+                # the daemon runs other code than the caller, which falls back to running the command itself
+                response = {'status': None, 'error': 'daemon runs version {}'.format(__version__)}
+            elif request.get('env') != environment():
+                # e.g. another cache directory, the caller runs the command itself
+                response = {'status': None, 'error': 'daemon runs in another environment'}
+            else:
+                response = server.run(request['argv'], request['cwd'])
+            self.wfile.write(json.dumps(response).encode())
+
+
+class Daemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Run CLI commands sent by `mieaa` processes over a Unix socket
+
+    Commands run in threads of the daemon, so they share the pooled connections, the rate limiter and the
+    category, id and results caches, which stay warm between calls. The socket is only accessible by its owner.
+
+    Attributes
+    ----------
+    socket_path : str
+        Path of the Unix socket
+    idle_timeout : float or None
+        Seconds without commands after which the daemon exits, None to run until stopped
+    """
+    daemon_threads = False  # running commands finish before the daemon exits
+    block_on_close = True
+
+    def __init__(self, socket_path: Optional[str]=None, idle_timeout: Optional[float]=None):
+        self.socket_path = socket_path or default_socket_path()
+        self.idle_timeout = idle_timeout
+        self._active = 0
+        self._last_activity = monotonic()
+        self._activity_lock = threading.Lock()
+        self._cwd_lock = threading.Lock()
+        if ping(self.socket_path):
+            raise RuntimeError('A daemon is already listening on {}'.format(self.socket_path))
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # left behind by a daemon that did not shut down
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)), exist_ok=True)
+        umask = os.umask(0o177)
+        try:
+            super().__init__(self.socket_path, _Handler)
+        finally:
+            os.umask(umask)
+
+    def serve_forever(self, poll_interval: float=.5):
+        """ Handle commands until `shutdown` is called, a stop request is received or the daemon was idle too long """
+        from mieaa import mieaa_cli
+        self._cli = mieaa_cli
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = _ThreadLocalStream(stdout), _ThreadLocalStream(stderr)
+        if self.idle_timeout is not None:
+            threading.Thread(target=self._watch_idle, daemon=True).start()
+        try:
+            super().serve_forever(poll_interval)
+        finally:
+            self.server_close()
+            sys.stdout, sys.stderr = stdout, stderr
+
+    def server_close(self):
+        """ Stop listening and wait for running commands """
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # new calls run in their own process from now on
+        super().server_close()
+
+    def run(self, argv: List[str], cwd: str) -> dict:
+        """ Run a command line as `mieaa` would in `cwd`, returning its exit status and output """
+        output, errors = io.StringIO(), io.StringIO()
+        sys.stdout.capture(output)
+        sys.stderr.capture(errors)
+        args = None
+        try:
+            # files are opened while parsing, relative to the working directory shared by all threads
+            with self._cwd_lock:
+                os.chdir(cwd)
+                args = self._cli.parse_args(argv)
+            for name in PATH_ARGUMENTS:
+                if getattr(args, name, None):
+                    setattr(args, name, os.path.join(cwd, getattr(args, name)))
+            self._cli.run(args)
+            status = 0
+        except SystemExit as err:
+            status = 0 if err.code is None else (err.code if isinstance(err.code, int) else 1)
+            if err.code is not None and not isinstance(err.code, int):
+                print(err.code, file=sys.stderr)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            status = 1
+        finally:
+            sys.stdout.capture(None)
+            sys.stderr.capture(None)
+            # the caller reads output files once the command returned, so they are flushed here
+            for value in vars(args).values() if args is not None else ():
+                if isinstance(value, io.IOBase) and value not in (sys.stdin, sys.stdout, sys.stderr):
+                    value.close()
+        return {'status': status, 'stdout': output.getvalue(), 'stderr': errors.getvalue()}
+
+    @contextmanager
+    def activity(self):
+        """ Mark a command as running, so the daemon is not idle """
+        with self._activity_lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._activity_lock:
+                self._active -= 1
+                self._last_activity = monotonic()
+
+    def _watch_idle(self):
+        while True:
+            with self._activity_lock:
+                idle = monotonic() - self._last_activity if not self._active else 0.
+            if idle >= self.idle_timeout:
+                self.shutdown()
+                return
+            sleep(min(1., self.idle_timeout - idle))
+
+
+def serve(socket_path: Optional[str]=None, idle_timeout: Optional[float]=None):
+    """ Run a daemon in the foreground until it is stopped
+
+    Parameters
+    ----------
+    socket_path : str, optional
+        Path of the Unix socket, defaults to `default_socket_path()`
+    idle_timeout : float, optional
+        Seconds without commands after which the daemon exits
+    """
+    Daemon(socket_path, idle_timeout).serve_forever()
+
+
+def forward(argv: List[str], socket_path: Optional[str]=None) -> Optional[int]:
+    """ Run a command line in the daemon, writing its output to stdout and stderr
+
+    Parameters
+    ----------
+    argv : list of str
+        Command line arguments, without the program name
+    socket_path : str, optional
+        Path of the Unix socket, defaults to `default_socket_path()`
+
+    Returns
+    -------
+    int or None
+        Exit status of the command, None if it was not run because no daemon is listening, the daemon's
+        `ENVIRONMENT_VARIABLES` differ, `$MIEAA_NO_DAEMON` is set or the command must run in the calling process.
+        If the daemon accepted the command but exited without answering, an error is written to stderr and the
+        status is 1: the command may have run, e.g. submitted a job, so it is not run again in the calling process
+    """
+    if os.environ.get('MIEAA_NO_DAEMON') or not hasattr(socket, 'AF_UNIX'):
+        return None
+    if not argv or argv[0].startswith('-') or argv[0] in LOCAL_COMMANDS or '-' in argv or '-h' in argv or '--help' in argv:
+        return None  # reads stdin, starts a browser or only prints help or the version
+    try:
+        response = _send({'argv': argv, 'cwd': os.getcwd(), 'version': __version__, 'env': environment()},
+                         socket_path)
+    except ConnectionError as err:
+        sys.stderr.write('Error: {}\n'.format(err))
+        return 1
+    if response is None or response.get('status') is None:
+        return None
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+
+def stop(socket_path: Optional[str]=None) -> bool:
+    """ Ask the daemon to exit once running commands finished, returns whether a daemon was listening """
+    try:
+        return _send({'command': 'stop'}, socket_path) is not None
+    except ConnectionError:  # it exited before answering
+        return True
+
+
+def ping(socket_path: Optional[str]=None) -> bool:
+    """ Whether a daemon is listening on the socket """
+    connection = _connect(socket_path)
+    if connection is None:
+        return False
+    connection.close()
+    return True
+
+
+def _connect(socket_path: Optional[str]) -> Optional[socket.socket]:
+    path = socket_path or default_socket_path()
+    if not os.path.exists(path):
+        return None
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(1.)
+    try:
+        connection.connect(path)
+    except OSError:  # a stale socket of a daemon that was killed
+        connection.close()
+        return None
+    connection.settimeout(None)  # commands can run for as long as an analysis takes
+    return connection
+
+
+def _send(request: dict, socket_path: Optional[str]) -> Optional[dict]:
+    """ Response of the daemon, None if no daemon is listening or the request could not be written
+
+    Raises
+    ------
+    ConnectionError
+        If the daemon received the request but closed the connection without answering
+    """
+    connection = _connect(socket_path)
+    if connection is None:
+        return None
+    with connection, connection.makefile('rwb') as stream:
+        try:
+            stream.write(json.dumps(request).encode() + b'\n')
+            stream.flush()
+        except OSError:  # the daemon exited before reading the request
+            return None
+        try:
+            return json.loads(stream.read().decode())
+        except (OSError, ValueError):
+            raise ConnectionError('the daemon exited without answering, the command may have run partially')
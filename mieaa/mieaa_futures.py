@@ -0,0 +1,180 @@
+from concurrent.futures import Future
+import threading
+import copy
+from typing import Hashable, List, Optional, Union
+
+from mieaa.mieaa_poller import StatusPoller
+from mieaa.mieaa_polling import PollingStrategy
+from mieaa.mieaa_wrapper import API
+
+
+class JobFuture(Future):
+    """ Future resolving to the results of a submitted enrichment analysis
+
+    Works with `concurrent.futures.wait` and `as_completed`. The result is in the requested format,
+    empty if the job failed on the server. Retrieval errors are raised by `result()`.
+
+    Attributes
+    ----------
+    job_id : str
+        Job ID assigned by the server
+    results_format : str
+        * *json* - results in json format
+        * *csv* - results in csv format
+    """
+    def __init__(self, job_id: str, results_format: str='json', scheduler: Optional['PollScheduler']=None):
+        super().__init__()
+        self.job_id = job_id
+        self.results_format = results_format
+        self._scheduler = scheduler
+        self._poller_key = None  # type: Optional[Hashable]
+
+    def cancel(self) -> bool:
+        """ Stop waiting for the job. The server keeps computing it, so it can still be loaded by its job ID """
+        cancelled = super().cancel()
+        if cancelled and self._scheduler is not None:
+            self._scheduler.discard(self)
+        return cancelled
+
+    def __repr__(self):
+        return '<{} job_id={!r} {}>'.format(type(self).__name__, self.job_id, self._state.lower())
+
+
+class PollScheduler:
+    """ Poll submitted jobs on background threads and resolve their futures
+
+    Jobs are checked by a `StatusPoller` per results format, polling strategy and submitting `API` configuration
+    (session, server, wait between requests, result cache and job store), whose thread only runs while jobs are
+    pending, so jobs share a status schedule and the session's rate limit.
+
+    Attributes
+    ----------
+    strategy : PollingStrategy, optional
+        Decides when each job is checked next unless one is passed to `submit`, defaults to `API.polling_strategy`
+    retries : int
+        Number of consecutive connection errors after which a job's future fails
+    """
+    def __init__(self, strategy: Optional[PollingStrategy]=None, retries: int=5):
+        self.strategy = strategy
+        self.retries = retries
+        self._pollers = {}
+        self._threads = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: Union[str, API], results_format: str='json', submitted_at: Optional[float]=None,
+               strategy: Optional[PollingStrategy]=None) -> JobFuture:
+        """ Start polling a submitted job
+
+        Parameters
+        ----------
+        job_id : str or API
+            Job ID assigned by the server, or an API instance whose current job is polled with a copy of the
+            instance, so its server, session, result cache and job store are used
+        results_format : str, default='json'
+            * *json* - retrieve results in json format
+            * *csv* - retrieve results in csv format
+        submitted_at : float, optional
+            Unix time the job was submitted, looked up in `API.jobs` if not provided
+        strategy : PollingStrategy, optional
+            Decides when the job is checked next, defaults to `strategy`
+
+        Returns
+        -------
+        JobFuture
+            Future resolving to the job's results
+        """
+        strategy = strategy if strategy is not None else self.strategy
+        job, api = job_id, None
+        if isinstance(job, API):
+            job_id, api = job.job_id, job
+            key = (results_format, strategy, type(api), api.session, api.root_url, api.api_version,
+                   api.wait_between_requests, api.result_cache, api.jobs)
+        else:
+            key = (results_format, strategy)
+        future = JobFuture(job_id, results_format, self)
+        future._poller_key = key
+        with self._lock:
+            poller = self._pollers.get(key)
+            if poller is None:
+                if api is not None:
+                    # the poller moves its instance from job to job, so the caller's instance is left alone
+                    api = copy.copy(api)
+                    api._reset_job()
+                poller = self._pollers[key] = StatusPoller(results_format=results_format, strategy=strategy,
+                                                           api=api, retries=self.retries)
+            self._futures.setdefault((key, job_id), []).append(future)
+            poller.add(job, submitted_at)
+            if key not in self._threads:
+                thread = threading.Thread(target=self._run, args=(key, poller), daemon=True,
+                                          name='mieaa-poll-{}'.format(results_format))
+                self._threads[key] = thread
+                thread.start()
+        return future
+
+    def discard(self, future: JobFuture):
+        """ Stop polling for a future, and its job if no other future waits for it """
+        key = (future._poller_key, future.job_id)
+        with self._lock:
+            futures = self._futures.get(key, [])
+            if future in futures:
+                futures.remove(future)
+            if not futures:
+                self._futures.pop(key, None)
+                poller = self._pollers.get(future._poller_key)
+                if poller is not None:
+                    poller.remove(future.job_id)
+
+    @property
+    def pending(self) -> List[str]:
+        """ IDs of jobs that are still polled """
+        with self._lock:
+            return sorted({job_id for _, job_id in self._futures})
+
+    def _run(self, key: Hashable, poller: StatusPoller):
+        try:
+            while True:
+                for job_id, results in poller:
+                    error = poller.errors.pop(job_id, None)
+                    if results is None and error is None:
+                        error = RuntimeError('Could not retrieve results for job {}'.format(job_id))
+                    with self._lock:
+                        futures = self._futures.pop((key, job_id), [])
+                    for future in futures:
+                        _resolve(future, results, error)
+                with self._lock:
+                    # jobs submitted while the poller was finishing are picked up by this thread
+                    if not poller.pending:
+                        del self._threads[key]
+                        return
+        except Exception as err:
+            with self._lock:
+                del self._threads[key]
+                keys = [future_key for future_key in self._futures if future_key[0] == key]
+                futures = [future for future_key in keys for future in self._futures.pop(future_key)]
+                for future in futures:
+                    poller.remove(future.job_id)
+            for future in futures:
+                _resolve(future, None, err)
+
+
+def _resolve(future: JobFuture, results, error: Optional[Exception]):
+    if not future.set_running_or_notify_cancel():
+        return  # cancelled
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(results)
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def default_scheduler() -> PollScheduler:
+    """ Get the scheduler used by `API.submit_ora` and `API.submit_gsea` unless `API.poll_scheduler` is set """
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = PollScheduler()
+        return _default_scheduler
@@ -0,0 +1,299 @@
+import json
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Iterable, Iterator, List, Optional
+import warnings
+
+from mieaa.mieaa_cache import default_cache_dir
+
+
+SUBMITTED = 'submitted'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+UNFINISHED = (SUBMITTED, RUNNING)
+
+
+class JobRecord:
+    """ Everything known about a submitted enrichment analysis
+
+    Attributes
+    ----------
+    job_id : str
+        Unique identifier assigned by the server
+    analysis_type : str
+        * *ORA* - Over-representation Analysis
+        * *GSEA* - miRNA enrichment analysis
+    species : str
+        Species abbreviation, e.g. hsa
+    mirna_type : str
+        * *precursor* - Precursor to a mature miRNA, e.g. hsa-mir-550b-1
+        * *mirna* - Mature miRNA, e.g. hsa-miR-199a-5p
+    parameters : dict
+        Enrichment parameters the job was submitted with
+    status : str
+        One of `submitted`, `running`, `finished` or `failed`
+    progress : float or None
+        Last progress reported by the server
+    created : float
+        Unix time the job was submitted
+    updated : float
+        Unix time the record was last changed
+    result_location : str
+        Where results were saved or can be downloaded from
+    """
+    fields = ('job_id', 'analysis_type', 'species', 'mirna_type', 'parameters', 'status', 'progress',
+              'created', 'updated', 'result_location')
+
+    def __init__(self, job_id: str, analysis_type: str='', species: str='', mirna_type: str='',
+                 parameters: Optional[dict]=None, status: str=SUBMITTED, progress: Optional[float]=None,
+                 created: Optional[float]=None, updated: Optional[float]=None, result_location: str=''):
+        self.job_id = job_id
+        self.analysis_type = analysis_type
+        self.species = species
+        self.mirna_type = mirna_type
+        self.parameters = parameters or {}
+        self.status = status
+        self.progress = progress
+        self.created = time() if created is None else created
+        self.updated = self.created if updated is None else updated
+        self.result_location = result_location
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in UNFINISHED
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.fields}
+
+    def __repr__(self):
+        return '{}({!r}, status={!r}, analysis_type={!r})'.format(
+            type(self).__name__, self.job_id, self.status, self.analysis_type)
+
+
+class JobStore:
+    """ Base class for job stores
+
+    Subclasses implement `add`, `get_record`, `update`, `records` and `delete`. Stores can also be used
+    like the plain `dict` that `API.jobs` used to be, mapping job IDs to enrichment parameters.
+    """
+    def add(self, record: JobRecord):
+        """ Insert or replace a record """
+        raise NotImplementedError
+
+    def get_record(self, job_id: str) -> Optional[JobRecord]:
+        """ Return the record for a job, or None if the job is unknown """
+        raise NotImplementedError
+
+    def update(self, job_id: str, **fields):
+        """ Update fields of a record, ignoring unknown jobs """
+        raise NotImplementedError
+
+    def records(self, statuses: Optional[Iterable[str]]=None) -> List[JobRecord]:
+        """ Return records ordered by submission time, optionally only those with the given statuses """
+        raise NotImplementedError
+
+    def delete(self, job_id: str):
+        """ Remove a record """
+        raise NotImplementedError
+
+    def unfinished(self) -> List[JobRecord]:
+        """ Return records of jobs that were submitted but whose results were never retrieved """
+        return self.records(UNFINISHED)
+
+    def purge(self, statuses: Optional[Iterable[str]]=None, older_than: Optional[float]=None) -> int:
+        """ Delete records matching the given statuses and last updated more than `older_than` seconds ago
+
+        Returns
+        -------
+        int
+            Number of deleted records
+        """
+        cutoff = None if older_than is None else time() - older_than
+        purged = 0
+        for record in self.records(statuses):
+            if cutoff is None or record.updated < cutoff:
+                self.delete(record.job_id)
+                purged += 1
+        return purged
+
+    # dict-like access to the enrichment parameters of each job
+    def __getitem__(self, job_id: str) -> dict:
+        record = self.get_record(job_id)
+        if record is None:
+            raise KeyError(job_id)
+        return record.parameters
+
+    def __setitem__(self, job_id: str, parameters: dict):
+        self.add(JobRecord(job_id, parameters.get('enrichment_analysis', ''), parameters=parameters))
+
+    def __delitem__(self, job_id: str):
+        if self.get_record(job_id) is None:
+            raise KeyError(job_id)
+        self.delete(job_id)
+
+    def __contains__(self, job_id) -> bool:
+        return self.get_record(job_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.records())
+
+    def get(self, job_id: str, default=None):
+        try:
+            return self[job_id]
+        except KeyError:
+            return default
+
+    def keys(self) -> List[str]:
+        return [record.job_id for record in self.records()]
+
+    def values(self) -> List[dict]:
+        return [record.parameters for record in self.records()]
+
+    def items(self) -> List[tuple]:
+        return [(record.job_id, record.parameters) for record in self.records()]
+
+
+class MemoryJobStore(JobStore):
+    """ Job store kept in memory, lost when the process exits """
+    def __init__(self):
+        self._records = {}
+        self._lock = threading.Lock()
+
+    def add(self, record: JobRecord):
+        with self._lock:
+            self._records[record.job_id] = record
+
+    def get_record(self, job_id: str) -> Optional[JobRecord]:
+        return self._records.get(job_id)
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            record = self._records.get(job_id)
+            if record is None:
+                return
+            for field, value in fields.items():
+                setattr(record, field, value)
+            record.updated = time()
+
+    def records(self, statuses: Optional[Iterable[str]]=None) -> List[JobRecord]:
+        statuses = None if statuses is None else set(statuses)
+        with self._lock:
+            records = [record for record in self._records.values() if statuses is None or record.status in statuses]
+        return sorted(records, key=lambda record: record.created)
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._records.pop(job_id, None)
+
+
+class SQLiteJobStore(JobStore):
+    """ Job store persisted in a SQLite database, shared by all processes using the same file
+
+    The database is only opened once the store is first used.
+
+    Attributes
+    ----------
+    path : str
+        Database file, defaults to `jobs.sqlite` in `default_cache_dir()`
+    """
+    _schema = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            analysis_type TEXT NOT NULL DEFAULT '',
+            species TEXT NOT NULL DEFAULT '',
+            mirna_type TEXT NOT NULL DEFAULT '',
+            parameters TEXT NOT NULL DEFAULT '{}',
+            status TEXT NOT NULL,
+            progress REAL,
+            created REAL NOT NULL,
+            updated REAL NOT NULL,
+            result_location TEXT NOT NULL DEFAULT ''
+        )
+    """
+
+    def __init__(self, path: Optional[str]=None):
+        self.path = path
+        self._connection = None
+        self._lock = threading.RLock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            return self._connection
+
+    def _connect(self) -> sqlite3.Connection:
+        path = self.path or os.path.join(default_cache_dir(), 'jobs.sqlite')
+        try:
+            if path != ':memory:':
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            connection.execute(self._schema)
+        except (OSError, sqlite3.Error) as err:
+            warnings.warn('Could not open job store at {} ({}), jobs will only be kept in memory'.format(path, err))
+            connection = sqlite3.connect(':memory:', check_same_thread=False)
+            connection.execute(self._schema)
+        connection.commit()
+        return connection
+
+    def add(self, record: JobRecord):
+        values = record.as_dict()
+        values['parameters'] = json.dumps(values['parameters'], default=str)
+        columns = ', '.join(JobRecord.fields)
+        placeholders = ', '.join(':' + field for field in JobRecord.fields)
+        self._execute('INSERT OR REPLACE INTO jobs ({}) VALUES ({})'.format(columns, placeholders), values)
+
+    def get_record(self, job_id: str) -> Optional[JobRecord]:
+        rows = self._query('SELECT {} FROM jobs WHERE job_id = ?'.format(', '.join(JobRecord.fields)), (job_id,))
+        return rows[0] if rows else None
+
+    def update(self, job_id: str, **fields):
+        unknown = set(fields) - set(JobRecord.fields)
+        if unknown:
+            raise ValueError('Unknown job fields: {}'.format(', '.join(sorted(unknown))))
+        if 'parameters' in fields:
+            fields['parameters'] = json.dumps(fields['parameters'], default=str)
+        fields['updated'] = time()
+        assignments = ', '.join('{0} = :{0}'.format(field) for field in fields)
+        self._execute('UPDATE jobs SET {} WHERE job_id = :job_id'.format(assignments), dict(fields, job_id=job_id))
+
+    def records(self, statuses: Optional[Iterable[str]]=None) -> List[JobRecord]:
+        query = 'SELECT {} FROM jobs'.format(', '.join(JobRecord.fields))
+        params = ()
+        if statuses is not None:
+            params = tuple(statuses)
+            if not params:
+                return []
+            query += ' WHERE status IN ({})'.format(', '.join('?' * len(params)))
+        return self._query(query + ' ORDER BY created', params)
+
+    def delete(self, job_id: str):
+        self._execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _execute(self, statement: str, params):
+        with self._lock:
+            with self.connection:
+                self.connection.execute(statement, params)
+
+    def _query(self, query: str, params) -> List[JobRecord]:
+        with self._lock:
+            rows = self.connection.execute(query, params).fetchall()
+        records = []
+        for row in rows:
+            values = dict(zip(JobRecord.fields, row))
+            values['parameters'] = json.loads(values['parameters'])
+            records.append(JobRecord(**values))
+        return records
@@ -0,0 +1,378 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import os
+import re
+from typing import Dict, IO, Iterable, List, Optional, Tuple, Union
+
+from mieaa.mieaa_cache import split_ids
+from mieaa.mieaa_stats import (adjust_p_values_grouped, fisher_exact, numpy, require_numpy, running_sum,
+                               running_sum_p_values)
+from mieaa.mieaa_table import MIRNA_SEPARATOR, ResultsTable
+from mieaa.mieaa_wrapper import API
+
+CATEGORY_SUFFIXES = ('_precursor', '_mature')
+
+
+class MembershipIndex:
+    """ Compressed membership of miRNAs/precursors in subcategories
+
+    Members of subcategory `i` are `member_ids[offsets[i]:offsets[i + 1]]`, sorted ids into `mirnas`.
+
+    Attributes
+    ----------
+    mirnas : list
+        miRNA/precursor names, indexed by id
+    mirna_ids : dict
+        Maps names to ids
+    categories : list
+        Category of each subcategory
+    subcategories : list
+        Subcategory names
+    offsets : numpy.ndarray
+        Start of each subcategory's members in `member_ids`
+    member_ids : numpy.ndarray
+        Concatenated member ids of all subcategories
+    """
+    def __init__(self, annotations: 'CategoryAnnotations'):
+        require_numpy('MembershipIndex')
+        self.mirnas = []
+        self.mirna_ids = {}
+        self.categories = []
+        self.subcategories = []
+        members = []
+        offsets = [0]
+        for category, subcategories in annotations.items():
+            for subcategory, mirnas in subcategories.items():
+                ids = sorted({self._intern(mirna) for mirna in mirnas})
+                self.categories.append(category)
+                self.subcategories.append(subcategory)
+                members.extend(ids)
+                offsets.append(len(members))
+        self.offsets = numpy.asarray(offsets, dtype='int64')
+        self.member_ids = numpy.asarray(members, dtype='int64')
+
+    def __len__(self) -> int:
+        return len(self.subcategories)
+
+    def mask(self, mirnas: Iterable[str]) -> 'numpy.ndarray':
+        """ Boolean array over all ids, True for the given miRNAs/precursors """
+        mask = numpy.zeros(len(self.mirnas), dtype=bool)
+        ids = [self.mirna_ids[mirna] for mirna in mirnas if mirna in self.mirna_ids]
+        mask[ids] = True
+        return mask
+
+    def counts(self, mask: 'numpy.ndarray') -> 'numpy.ndarray':
+        """ Number of members of each subcategory within the mask """
+        hits = numpy.concatenate(([0], numpy.cumsum(mask[self.member_ids], dtype='int64')))
+        return hits[self.offsets[1:]] - hits[self.offsets[:-1]]
+
+    def members(self, index: int) -> 'numpy.ndarray':
+        return self.member_ids[self.offsets[index]:self.offsets[index + 1]]
+
+    def _intern(self, mirna: str) -> int:
+        mirna_id = self.mirna_ids.get(mirna)
+        if mirna_id is None:
+            mirna_id = self.mirna_ids[mirna] = len(self.mirnas)
+            self.mirnas.append(mirna)
+        return mirna_id
+
+
+class CategoryAnnotations:
+    """ Locally loaded category annotations: which miRNAs/precursors belong to which subcategory
+
+    Annotations are organized like the server's: categories (e.g. `Diseases (HMDD)`) contain subcategories
+    (e.g. `Alopecia`), each a set of miRNAs/precursors of one type and species.
+
+    Examples
+    --------
+    >>> annotations = CategoryAnnotations()
+    >>> annotations.load('HMDD_precursor.gmt', category='Diseases (HMDD)')
+    >>> annotations.load('annotations.tsv')  # category<TAB>subcategory<TAB>miRNAs
+    """
+    def __init__(self):
+        self._categories = OrderedDict()  # type: Dict[str, Dict[str, set]]
+        self._index = None
+
+    def add(self, category: str, subcategory: str, mirnas: Iterable[str]):
+        """ Add miRNAs/precursors to a subcategory """
+        self._categories.setdefault(category, OrderedDict()).setdefault(subcategory, set()).update(mirnas)
+        self._index = None
+
+    def load(self, source: Union[str, IO], category: Optional[str]=None) -> 'CategoryAnnotations':
+        """ Load annotations from a GMT or tab-separated file
+
+        Parameters
+        ----------
+        source : str or file-like
+            * *GMT* (`.gmt`) - `subcategory<TAB>description<TAB>miRNA<TAB>miRNA...` per line
+            * *tab-separated* - `category<TAB>subcategory<TAB>miRNAs` per line, miRNAs delimited like test sets
+        category : str, optional
+            Category of all subcategories in a GMT file, defaults to the file name without extension
+        """
+        name = source if isinstance(source, str) else getattr(source, 'name', '')
+        if isinstance(source, str):
+            with open(source) as annotation_file:
+                return self.load(annotation_file, category)
+
+        is_gmt = isinstance(name, str) and name.lower().endswith('.gmt')
+        if is_gmt and category is None:
+            category = os.path.splitext(os.path.basename(name))[0]
+        for line in source:
+            line = line.rstrip('\r\n')
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split('\t')
+            if is_gmt:
+                self.add(category, fields[0], [mirna for mirna in fields[2:] if mirna])
+            elif len(fields) >= 3:
+                self.add(fields[0], fields[1], split_ids(' '.join(fields[2:])))
+        return self
+
+    def items(self) -> List[Tuple[str, Dict[str, set]]]:
+        return list(self._categories.items())
+
+    @property
+    def categories(self) -> List[str]:
+        return list(self._categories)
+
+    @property
+    def index(self) -> MembershipIndex:
+        """ Membership index of all subcategories, rebuilt after annotations changed """
+        if self._index is None:
+            self._index = MembershipIndex(self)
+        return self._index
+
+    def select(self, categories: Union[str, Iterable[str], None]) -> 'numpy.ndarray':
+        """ Indices of subcategories in the given categories, matched case-insensitively and with or without suffix """
+        index = self.index
+        if categories is None:
+            return numpy.arange(len(index))
+        if isinstance(categories, str):
+            categories = [category.strip() for category in re.split(r'[;,\n]', categories) if category.strip()]
+        wanted = {_category_key(category) for category in categories}
+        if 'all' in wanted:
+            return numpy.arange(len(index))
+        unknown = wanted - {_category_key(category) for category in self._categories}
+        if unknown:
+            raise ValueError('Unknown categories: {}'.format(', '.join(sorted(unknown))))
+        return numpy.asarray([i for i, category in enumerate(index.categories) if _category_key(category) in wanted],
+                             dtype='int64')
+
+
+class LocalEnrichment:
+    """ Offline enrichment analyses over locally loaded category annotations
+
+    Results have the same schema as `API.get_results` in json format. All subcategories are tested at once
+    with vectorized NumPy, so many analyses (e.g. permutations or null models) can be run in quick succession.
+    GSEA p-values are computed exactly, spreading blocks of subcategories and ranked lists over a process pool.
+    Requires numpy.
+
+    Attributes
+    ----------
+    annotations : CategoryAnnotations
+        Categories to test
+    processes : int or None
+        Number of worker processes used for GSEA, defaults to the number of CPUs. With 1, everything runs
+        in the calling process
+    block_size : int
+        Number of subcategories scored together in one GSEA task
+    """
+    def __init__(self, annotations: CategoryAnnotations, processes: Optional[int]=None, block_size: int=256):
+        require_numpy('LocalEnrichment')
+        self.annotations = annotations
+        self.processes = processes
+        self.block_size = block_size
+
+    def run_ora(self, test_set: Union[str, Iterable, IO], categories: Union[str, Iterable, None]=None,
+                reference_set: Union[str, Iterable, IO]='', as_table: bool=False,
+                **kwargs) -> Union[list, ResultsTable]:
+        """ Over-representation Analysis using Fisher's exact test
+
+        Parameters
+        -----------
+        test_set : str, iterable or file-like
+            set of miRNAs/precursors we want to test
+        categories : str or iterable, optional
+            Categories we want to run analysis on, defaults to all loaded categories
+        reference_set : str, iterable or file-like, default=''
+            Background reference set of miRNAs/precursors, defaults to all annotated miRNAs/precursors
+        as_table : bool, default=False
+            Return a `ResultsTable` instead of rows
+
+        **kwargs
+            p_value_adjustment, independent_p_adjust, significance_level, threshold_level and unfiltered,
+            see `API.run_ora`
+
+        Returns
+        -------
+        list or ResultsTable
+            Significant subcategories, in the same form as `API.get_results` in json format
+        """
+        params = _analysis_params(kwargs)
+        index = self.annotations.index
+        test_ids = set(_read_ids(test_set))
+        reference_ids = set(_read_ids(reference_set))
+
+        if reference_ids:
+            universe = index.mask(reference_ids)
+            population_size = len(reference_ids)
+            test_ids &= reference_ids
+        else:
+            universe = numpy.ones(len(index.mirnas), dtype=bool)
+            population_size = len(index.mirnas)
+        test_mask = index.mask(test_ids) & universe
+        # unannotated miRNAs of a reference set count towards both the population and the sample
+        sample_size = len(test_ids) if reference_ids else int(test_mask.sum())
+
+        selected = self.annotations.select(categories)
+        observed = index.counts(test_mask)[selected]
+        category_sizes = index.counts(universe)[selected]
+        p_values = fisher_exact(observed, category_sizes, sample_size, population_size)
+        expected = sample_size * category_sizes / max(population_size, 1)
+
+        return _build_results(index, selected, observed, expected, p_values,
+                              numpy.where(observed >= expected, 'over-represented', 'under-represented'),
+                              test_mask, params, as_table)
+
+    def run_gsea(self, test_set: Union[str, Iterable, IO], categories: Union[str, Iterable, None]=None,
+                 as_table: bool=False, **kwargs) -> Union[list, ResultsTable]:
+        """ miRNA Set Enrichment Analysis of a ranked list using the unweighted running sum
+
+        Each subcategory is scored by the largest deviation of the Kolmogorov-Smirnov running sum, with an exact
+        p-value over all orderings of the list. Subcategories with positive scores are `enriched` at the top of
+        the list, those with negative scores `depleted`. The observed count is the number of miRNAs/precursors
+        of the list in a subcategory, the expected count is the number of them expected up to the position of
+        the largest deviation.
+
+        Parameters
+        -----------
+        test_set : str, iterable or file-like
+            Ranked list of miRNAs/precursors, most relevant first
+        categories : str or iterable, optional
+            Categories we want to run analysis on, defaults to all loaded categories
+        as_table : bool, default=False
+            Return a `ResultsTable` instead of rows
+
+        **kwargs
+            p_value_adjustment, independent_p_adjust, significance_level, threshold_level and unfiltered,
+            see `API.run_gsea`
+
+        Returns
+        -------
+        list or ResultsTable
+            Significant subcategories, in the same form as `API.get_results` in json format
+        """
+        return self.run_gsea_many([test_set], categories, as_table, **kwargs)[0]
+
+    def run_gsea_many(self, test_sets: Iterable[Union[str, Iterable, IO]], categories: Union[str, Iterable, None]=None,
+                      as_table: bool=False, **kwargs) -> List[Union[list, ResultsTable]]:
+        """ Score many ranked lists against the same categories, see `run_gsea`
+
+        Subcategories of all lists are split into blocks that are scored in parallel.
+
+        Returns
+        -------
+        list
+            Results of each ranked list, in the order of `test_sets`
+        """
+        params = _analysis_params(kwargs)
+        index = self.annotations.index
+        selected = self.annotations.select(categories)
+        lists = [list(OrderedDict.fromkeys(_read_ids(test_set))) for test_set in test_sets]
+
+        tasks = []
+        observed = []
+        for list_number, ranked in enumerate(lists):
+            ranks = numpy.full(len(index.mirnas), -1, dtype='int64')
+            for position, mirna in enumerate(ranked):
+                mirna_id = index.mirna_ids.get(mirna)
+                if mirna_id is not None:
+                    ranks[mirna_id] = position
+            hit_positions = []
+            for subcategory in selected:
+                positions = ranks[index.members(subcategory)]
+                hit_positions.append(numpy.sort(positions[positions >= 0]))
+            observed.append(numpy.asarray([len(positions) for positions in hit_positions], dtype='int64'))
+            for start in range(0, len(selected), self.block_size):
+                tasks.append((list_number, start, hit_positions[start:start + self.block_size], len(ranked)))
+
+        scored = [numpy.zeros((4, len(selected))) for _ in lists]
+        for (list_number, start, block, _), block_scores in zip(tasks, self._map(_score_gsea_block, tasks)):
+            scored[list_number][:, start:start + len(block)] = block_scores
+
+        results = []
+        for list_number, ranked in enumerate(lists):
+            scores, peaks, _, p_values = scored[list_number]
+            hits = observed[list_number]
+            expected = peaks * hits / max(len(ranked), 1)
+            results.append(_build_results(index, selected, hits, expected, p_values,
+                                          numpy.where(scores >= 0, 'enriched', 'depleted'),
+                                          index.mask(ranked), params, as_table))
+        return results
+
+    def _map(self, function, tasks: list) -> Iterable:
+        """ Apply a function to all tasks, in a process pool if there are several """
+        processes = self.processes or os.cpu_count() or 1
+        if processes == 1 or len(tasks) <= 1:
+            return map(function, tasks)
+        with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as pool:
+            return list(pool.map(function, tasks, chunksize=max(1, len(tasks) // (4 * processes))))
+
+
+def _score_gsea_block(task: tuple) -> 'numpy.ndarray':
+    """ Score a block of subcategories against one ranked list, run in worker processes """
+    _, _, hit_positions, list_size = task
+    scores, peaks, deviations = running_sum(hit_positions, list_size)
+    p_values = running_sum_p_values([len(positions) for positions in hit_positions], deviations, list_size)
+    return numpy.vstack((scores, peaks, deviations, p_values))
+
+
+def _analysis_params(kwargs: dict) -> dict:
+    params = dict(API.default_params['analysis'])
+    unfiltered = kwargs.pop('unfiltered', False)
+    unknown = set(kwargs) - set(params)
+    if unknown:
+        raise TypeError('Unknown analysis parameters: {}'.format(', '.join(sorted(unknown))))
+    params.update(kwargs)
+    if unfiltered:
+        params.update(API.default_params['unfiltered'])
+    return params
+
+
+def _read_ids(mirna_set: Union[str, Iterable, IO]) -> List[str]:
+    if isinstance(mirna_set, str):
+        return split_ids(mirna_set)
+    ids = []
+    for line in mirna_set:
+        ids.extend(split_ids(line))
+    return ids
+
+
+def _category_key(category: str) -> str:
+    category = category.lower()
+    for suffix in CATEGORY_SUFFIXES:
+        if category.endswith(suffix):
+            return category[:-len(suffix)]
+    return category
+
+
+def _build_results(index: MembershipIndex, selected: 'numpy.ndarray', observed: 'numpy.ndarray',
+                   expected: 'numpy.ndarray', p_values: 'numpy.ndarray', enrichment: 'numpy.ndarray',
+                   hit_mask: 'numpy.ndarray', params: dict, as_table: bool) -> Union[list, ResultsTable]:
+    """ Adjust, filter and sort p-values of the selected subcategories into result rows """
+    groups = [index.categories[i] for i in selected]
+    independent = params['independent_p_adjust']
+    p_adjusted = adjust_p_values_grouped(p_values, groups, params['p_value_adjustment'], independent)
+    q_values = adjust_p_values_grouped(p_values, groups, 'fdr', independent)
+
+    keep = (p_adjusted <= params['significance_level']) & (observed >= params['threshold_level'])
+    category_order = {category: position for position, category in enumerate(OrderedDict.fromkeys(index.categories))}
+    rows = []
+    for i in numpy.flatnonzero(keep):
+        subcategory = selected[i]
+        mirnas = [index.mirnas[mirna_id] for mirna_id in index.members(subcategory) if hit_mask[mirna_id]]
+        rows.append([index.categories[subcategory], index.subcategories[subcategory], str(enrichment[i]),
+                     float(p_values[i]), float(p_adjusted[i]), float(q_values[i]), float(expected[i]),
+                     int(observed[i]), MIRNA_SEPARATOR.join(sorted(mirnas))])
+    rows.sort(key=lambda row: (category_order[row[0]], row[4], row[3]))
+    return ResultsTable.from_rows(rows) if as_table else rows
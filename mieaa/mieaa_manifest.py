@@ -0,0 +1,414 @@
+import csv
+import hashlib
+import json
+import os
+import threading
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from mieaa.mieaa_batch import BatchExecutor
+from mieaa.mieaa_wrapper import API
+
+
+ANALYSES = ('ora', 'gsea')
+CONVERSIONS = ('to_precursor', 'to_mirna', 'convert_mirbase')
+CATEGORY_KEYWORDS = ('all', 'default', 'defaults', 'expert')
+# manifest fields besides the analysis parameters in `API.default_params['analysis']`
+FIELDS = ('name', 'command', 'mirnas', 'input', 'mirna_type', 'species', 'categories', 'categories_file',
+          'reference', 'reference_file', 'from', 'to', 'conversion_type', 'output_format', 'format', 'output')
+PATH_FIELDS = ('input', 'categories_file', 'reference_file')
+SUMMARY_COLUMNS = ('name', 'command', 'status', 'job_id', 'output', 'seconds', 'digest', 'error')
+
+SUBMITTED = 'submitted'
+COMPLETED = 'completed'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+
+def expand_categories(api: API, categories: Iterable[str], mirna_type: str, species: str) -> List[str]:
+    """ Replace the keywords `all`, `default` and `expert` by the categories they stand for """
+    expanded = []
+    for category in categories:
+        if category in CATEGORY_KEYWORDS:
+            expanded.extend(api.get_enrichment_categories(mirna_type, species, category))
+        else:
+            expanded.append(category)
+    return list(dict.fromkeys(expanded))
+
+
+class ManifestRow:
+    """ One analysis or conversion listed in a batch manifest
+
+    Attributes
+    ----------
+    name : str
+        Unique name of the row, used to name its output and to resume the batch
+    command : str
+        * *ora* - Over-representation Analysis
+        * *gsea* - miRNA enrichment analysis
+        * *to_precursor*, *to_mirna*, *convert_mirbase* - id conversions
+    fields : dict
+        All other fields of the row, paths already resolved against the manifest's directory
+    """
+    def __init__(self, name: str, command: str, fields: dict):
+        self.name = name
+        self.command = command
+        self.fields = fields
+
+    @classmethod
+    def from_dict(cls, row: dict, base_dir: str='.', default_name: str='') -> 'ManifestRow':
+        """ Validate a manifest row, dropping empty fields
+
+        Raises
+        ------
+        ValueError
+            If a field is unknown or a required field is missing
+        """
+        row = {key.strip(): value.strip() if isinstance(value, str) else value for key, value in row.items() if key}
+        row = {key: value for key, value in row.items() if value not in (None, '')}
+        unknown = set(row) - set(FIELDS) - set(API.default_params['analysis']) - {'unfiltered'}
+        if unknown:
+            raise ValueError('unknown field(s) {}'.format(', '.join(sorted(unknown))))
+        command = str(row.pop('command', '')).lower()
+        if command not in ANALYSES + CONVERSIONS:
+            raise ValueError('command must be one of {}, got {!r}'.format(', '.join(ANALYSES + CONVERSIONS), command))
+        if ('mirnas' in row) == ('input' in row):
+            raise ValueError('exactly one of `mirnas` or `input` is required')
+        if command in ANALYSES and 'species' not in row:
+            raise ValueError('`species` is required for {}'.format(command))
+        if command == 'convert_mirbase' and 'from' not in row:
+            raise ValueError('`from` is required for convert_mirbase')
+        for key in PATH_FIELDS:
+            if key in row:
+                row[key] = os.path.join(base_dir, row[key])
+        name = str(row.pop('name', default_name))
+        manifest_row = cls(name, command, row)
+        manifest_row._analysis_params()  # raises ValueError for malformed parameter values
+        return manifest_row
+
+    @property
+    def digest(self) -> str:
+        """ Fingerprint of the fields and input file sizes and times, so a resumed batch reruns rows that changed """
+        files = {key: _file_stamp(self.fields[key]) for key in PATH_FIELDS if key in self.fields}
+        text = json.dumps([self.command, self.fields, files], sort_keys=True, default=str)
+        return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+    def output_path(self, outdir: str, results_format: str='csv') -> str:
+        """ Where the row's results are saved, `output` relative to `outdir` or the row name with an extension """
+        if 'output' in self.fields:
+            return os.path.join(outdir, self.fields['output'])
+        extension = self.fields.get('format', results_format) if self.command in ANALYSES else 'txt'
+        return os.path.join(outdir, '{}.{}'.format(self.name, extension))
+
+    def run(self, api: API, output: str, results_format: str='csv', job_id: Optional[str]=None,
+            on_submitted: Optional[Callable[[str], None]]=None):
+        """ Run the row on `api`, saving its results to `output`
+
+        Parameters
+        ----------
+        api : API
+            Fresh instance to run the row on
+        output : str
+            Path of the results, only written once they are complete
+        results_format : str, default='csv'
+            Results format of analyses without a `format` field
+        job_id : str, optional
+            Job previously submitted for this row, which is downloaded instead of starting a new one
+        on_submitted : callable, optional
+            Called with the job ID once an analysis was submitted
+        """
+        fields = self.fields
+        mirna_type = fields.get('mirna_type', 'mirna')
+        if self.command in ANALYSES:
+            if job_id:
+                api.load_job(job_id)
+            else:
+                with _open_set(fields, 'mirnas', 'input') as test_set, \
+                        _open_set(fields, 'reference', 'reference_file') as reference_set:
+                    categories = _read_set(fields, 'categories', 'categories_file') or ['default']
+                    categories = expand_categories(api, categories, mirna_type, fields['species'])
+                    api._start_analysis(self.command.upper(), test_set, categories, mirna_type, fields['species'],
+                                        reference_set or '', **self._analysis_params())
+                if not api.job_id:
+                    raise RuntimeError('Job submission failed')
+                if on_submitted is not None:
+                    on_submitted(api.job_id)
+            api.download_results(output, fields.get('format', results_format))
+            return
+
+        partial = output + '.part'
+        options = {key: fields[key] for key in ('conversion_type', 'output_format') if key in fields}
+        with _open_set(fields, 'mirnas', 'input') as mirnas:
+            if self.command == 'convert_mirbase':
+                api.convert_mirbase(mirnas, fields['from'], fields.get('to', 22), mirna_type, partial, **options)
+            else:
+                api._convert_mirna_type(mirnas, self.command, partial, **options)
+        os.replace(partial, output)
+
+    def _analysis_params(self) -> dict:
+        params = {}
+        for key, default in API.default_params['analysis'].items():
+            if key in self.fields:
+                params[key] = _coerce(self.fields[key], type(default))
+        if 'unfiltered' in self.fields:
+            params['unfiltered'] = _coerce(self.fields['unfiltered'], bool)
+        return params
+
+    def __repr__(self):
+        return '{}({!r}, command={!r})'.format(type(self).__name__, self.name, self.command)
+
+
+class ManifestResult:
+    """ Outcome of a single manifest row
+
+    Attributes
+    ----------
+    row : ManifestRow
+        Row that was run
+    status : str
+        `completed`, `skipped` if it was completed by an earlier run, or `failed`
+    output : str
+        Path of the row's results
+    job_id : str or None
+        Job ID of analyses
+    seconds : float
+        Time spent on the row
+    error : Exception or None
+        Exception raised while running the row
+    """
+    def __init__(self, row: ManifestRow, status: str, output: str, job_id: Optional[str]=None,
+                 seconds: float=0., error: Optional[Exception]=None):
+        self.row = row
+        self.status = status
+        self.output = output
+        self.job_id = job_id
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status != FAILED
+
+    def __repr__(self):
+        return '{}(name={!r}, status={!r}, output={!r})'.format(type(self).__name__, self.row.name, self.status,
+                                                                self.output)
+
+
+class ManifestRunner:
+    """ Run the rows of a manifest concurrently, saving each row's results to a file
+
+    Rows run on the thread pool of a `BatchExecutor`, each on its own `API` instance, and all instances share the
+    process-wide rate limiter. Progress is appended to a tab-separated summary in `outdir` as rows are submitted and finish,
+    so an interrupted batch can be resumed: completed rows whose fields did not change and whose output still
+    exists are skipped, and analyses that were already submitted are downloaded instead of being started again.
+
+    Attributes
+    ----------
+    outdir : str
+        Directory the results and the summary are written to
+    resume : bool
+        Whether to skip rows completed by an earlier run
+    executor : BatchExecutor
+        Runs the rows with at most `max_workers` at the same time, on instances returned by `api_factory`.
+        Its `results_format` is used for analyses without a `format` field
+    """
+    summary_name = 'summary.tsv'
+
+    def __init__(self, outdir: str='.', max_workers: int=4, results_format: str='csv', resume: bool=True,
+                 api_factory: Callable[[], API]=API):
+        self.outdir = outdir
+        self.resume = resume
+        self.executor = BatchExecutor(max_workers, results_format, api_factory=api_factory)
+        self._lock = threading.Lock()
+
+    @property
+    def summary_path(self) -> str:
+        return os.path.join(self.outdir, self.summary_name)
+
+    def run(self, rows: Iterable[ManifestRow]) -> Iterator[ManifestResult]:
+        """ Run all rows, yielding results as rows finish
+
+        The summary is compacted to the latest entry of every row once all rows finished.
+
+        Parameters
+        ----------
+        rows : iterable of ManifestRow
+            Rows to run, e.g. from `read_manifest`
+
+        Yields
+        ------
+        ManifestResult
+            Result of each row in order of completion, skipped rows first
+        """
+        rows = list(rows)
+        os.makedirs(self.outdir, exist_ok=True)
+        previous = self._read_summary() if self.resume else {}
+        if not self.resume or not os.path.exists(self.summary_path):
+            with open(self.summary_path, 'w') as summary:
+                summary.write('\t'.join(SUMMARY_COLUMNS) + '\n')
+
+        pending = []
+        for row in rows:
+            entry = previous.get(row.name)
+            output = row.output_path(self.outdir, self.executor.results_format)
+            if entry is not None and entry['digest'] != row.digest:
+                entry = None  # the row changed since the earlier run
+            if entry is not None and entry['status'] == COMPLETED and os.path.exists(output):
+                yield ManifestResult(row, SKIPPED, output, entry['job_id'] or None)
+            else:
+                job_id = entry['job_id'] if entry is not None and entry['status'] == SUBMITTED else None
+                pending.append((row, output, job_id or None))
+
+        yield from self.executor.map(self._run_row, pending)
+        self._compact_summary([row.name for row in rows])
+
+    def _run_row(self, api: API, pending: Tuple[ManifestRow, str, Optional[str]]) -> ManifestResult:
+        row, output, job_id = pending
+        started = perf_counter()
+        submitted = []
+
+        def on_submitted(new_job_id):
+            submitted.append(new_job_id)
+            self._log(row, SUBMITTED, new_job_id, output)
+
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+            row.run(api, output, self.executor.results_format, job_id, on_submitted)
+            status, error = COMPLETED, None
+        except Exception as err:
+            status, error = FAILED, err
+        job_id = submitted[-1] if submitted else job_id
+        seconds = perf_counter() - started
+        self._log(row, status, job_id, output, seconds, error)
+        return ManifestResult(row, status, output, job_id, seconds, error)
+
+    def _log(self, row: ManifestRow, status: str, job_id: Optional[str], output: str, seconds: float=0.,
+             error: Optional[Exception]=None):
+        values = (row.name, row.command, status, job_id or '', output, '{:.3f}'.format(seconds), row.digest,
+                  ' '.join(str(error).split()) if error is not None else '')
+        with self._lock, open(self.summary_path, 'a') as summary:
+            summary.write('\t'.join(values) + '\n')
+
+    def _read_summary(self) -> Dict[str, dict]:
+        """ Latest summary entry of every row name """
+        if not os.path.exists(self.summary_path):
+            return {}
+        entries = {}
+        with open(self.summary_path, newline='') as summary:
+            for entry in csv.DictReader(summary, delimiter='\t', quoting=csv.QUOTE_NONE):
+                if entry.get('name') is not None and entry.get('status'):
+                    entries[entry['name']] = entry
+        return entries
+
+    def _compact_summary(self, names: List[str]):
+        entries = self._read_summary()
+        order = {name: index for index, name in enumerate(names)}
+        partial = self.summary_path + '.part'
+        with open(partial, 'w') as summary:
+            summary.write('\t'.join(SUMMARY_COLUMNS) + '\n')
+            for name in sorted(entries, key=lambda name: (order.get(name, len(order)), name)):
+                summary.write('\t'.join(entries[name].get(column) or '' for column in SUMMARY_COLUMNS) + '\n')
+        os.replace(partial, self.summary_path)
+
+
+def read_manifest(path: str) -> List[ManifestRow]:
+    """ Read a batch manifest
+
+    Manifests are tab-separated with a header row, or JSON lines if the file name ends in `.jsonl` or `.json`.
+    Blank lines and lines starting with `#` are ignored. Relative input paths are resolved against the
+    manifest's directory. Rows without a `name` are named after their line number.
+
+    Parameters
+    ----------
+    path : str
+        Path of the manifest
+
+    Returns
+    -------
+    list of ManifestRow
+        Validated rows in manifest order
+
+    Raises
+    ------
+    ValueError
+        If a row is invalid or a name is used twice
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, newline='') as manifest:
+        lines = [(number, line) for number, line in enumerate(manifest, 1)
+                 if line.strip() and not line.lstrip().startswith('#')]
+    if path.endswith(('.jsonl', '.json')):
+        records = []
+        for number, line in lines:
+            try:
+                records.append((number, json.loads(line)))
+            except ValueError as err:
+                raise ValueError('{}, line {}: {}'.format(path, number, err))
+    elif lines:
+        header = lines[0][1].rstrip('\r\n').split('\t')
+        records = [(number, dict(zip(header, line.rstrip('\r\n').split('\t')))) for number, line in lines[1:]]
+    else:
+        records = []
+
+    rows = []
+    names = set()
+    for number, record in records:
+        try:
+            row = ManifestRow.from_dict(record, base_dir, default_name='row{}'.format(number))
+        except ValueError as err:
+            raise ValueError('{}, line {}: {}'.format(path, number, err))
+        if row.name in names:
+            raise ValueError('{}, line {}: duplicate name {!r}'.format(path, number, row.name))
+        names.add(row.name)
+        rows.append(row)
+    return rows
+
+
+def _open_set(fields: dict, inline_key: str, file_key: str):
+    """ File object of a set given as a path, or a context returning the inline set """
+    if file_key in fields:
+        return open(fields[file_key])
+    return _Inline(fields.get(inline_key))
+
+
+def _file_stamp(path: str) -> Optional[list]:
+    """ Size and modification time of a file, None if it does not exist """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_set(fields: dict, inline_key: str, file_key: str) -> List[str]:
+    if file_key in fields:
+        with open(fields[file_key]) as set_file:
+            return [line.strip() for line in set_file if line.strip()]
+    value = fields.get(inline_key)
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.replace(',', ';').split(';') if item.strip()]
+    return list(value)
+
+
+class _Inline:
+    def __init__(self, value):
+        self.value = value
+
+    def __enter__(self):
+        return self.value
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def _coerce(value, to_type: type):
+    """ Convert a manifest value to the type of the parameter's default """
+    if not isinstance(value, str) or to_type is str:
+        return value
+    if to_type is bool:
+        if value.lower() not in ('true', 'false', 'yes', 'no', '1', '0'):
+            raise ValueError('expected true or false, got {!r}'.format(value))
+        return value.lower() in ('true', 'yes', '1')
+    return to_type(value)
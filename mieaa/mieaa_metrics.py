@@ -0,0 +1,253 @@
+from collections import defaultdict
+import threading
+from typing import Dict, Optional, Sequence
+
+
+# upper bounds in seconds, as used by Prometheus client libraries
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10., 30.)
+JOB_DURATION_BUCKETS = (1., 5., 10., 30., 60., 120., 300., 600., 1800., 3600.)
+
+
+class Instrumentation:
+    """ Receives events from API sessions and instances
+
+    Subclass and override the events of interest, then install an instance with `set_instrumentation`,
+    or assign it to the `instrumentation` attribute of a single session. Events are called from the thread
+    or event loop that sent the request, so implementations must be thread safe.
+    """
+    def request_completed(self, endpoint: str, method: str, status: Optional[int], latency: float,
+                          throttle_wait: float, bytes_sent: int, bytes_received: int, retries: int):
+        """ Called once per API call, after any retries
+
+        Parameters
+        ----------
+        endpoint : str
+            Key of the endpoint in `API.endpoints`, or `other`
+        method : str
+            HTTP method
+        status : int or None
+            Status code of the final response, None if no response was received
+        latency : float
+            Seconds spent waiting for responses, summed over retries
+        throttle_wait : float
+            Seconds spent waiting for the rate limiter, summed over retries
+        bytes_sent : int
+            Size of the request bodies
+        bytes_received : int
+            Size of the response bodies as transferred, i.e. compressed if the server compressed them
+        retries : int
+            Number of times the request was repeated after being throttled
+        """
+
+    def job_completed(self, job_id: str, analysis_type: str, status: str, duration: float):
+        """ Called when a job is first seen finished or failed
+
+        Parameters
+        ----------
+        job_id : str
+            Job ID assigned by the server
+        analysis_type : str
+            * *ORA* - Over-representation Analysis
+            * *GSEA* - miRNA enrichment analysis
+        status : str
+            `finished` or `failed`
+        duration : float
+            Seconds from submission until the job was seen completed
+        """
+
+
+class Histogram:
+    """ Counts of observations below fixed bucket bounds, with their sum """
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.
+        self.count = 0
+
+    def observe(self, value: float):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> Dict[str, int]:
+        """ Observations at most each bound, keyed by bound as used for the Prometheus `le` label """
+        total = 0
+        result = {}
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            result['+Inf' if bound == float('inf') else repr(bound)] = total
+        return result
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'sum': self.sum, 'buckets': self.cumulative()}
+
+
+class _EndpointMetrics:
+    def __init__(self, buckets: Sequence[float]):
+        self.statuses = defaultdict(int)
+        self.latency = Histogram(buckets)
+        self.throttle_wait = 0.
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+
+
+class MetricsRecorder(Instrumentation):
+    """ Aggregate request and job metrics in memory
+
+    Attributes
+    ----------
+    latency_buckets : sequence of float
+        Upper bounds of the request latency histogram, in seconds
+    job_buckets : sequence of float
+        Upper bounds of the job duration histogram, in seconds
+
+    Examples
+    --------
+    >>> metrics = MetricsRecorder()
+    >>> set_instrumentation(metrics)
+    >>> API().to_precursor(['hsa-miR-20b-5p'])
+    >>> metrics.snapshot()['requests']['mirna_type_converter']['count']
+    1
+    """
+    def __init__(self, latency_buckets: Sequence[float]=LATENCY_BUCKETS,
+                 job_buckets: Sequence[float]=JOB_DURATION_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self.job_buckets = tuple(job_buckets)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Discard everything recorded so far """
+        with self._lock:
+            self._endpoints = {}  # type: Dict[tuple, _EndpointMetrics]
+            self._jobs = {}  # type: Dict[tuple, Histogram]
+
+    def request_completed(self, endpoint: str, method: str, status: Optional[int], latency: float,
+                          throttle_wait: float, bytes_sent: int, bytes_received: int, retries: int):
+        with self._lock:
+            metrics = self._endpoints.get((endpoint, method))
+            if metrics is None:
+                metrics = self._endpoints[endpoint, method] = _EndpointMetrics(self.latency_buckets)
+            metrics.statuses['error' if status is None else str(status)] += 1
+            metrics.latency.observe(latency)
+            metrics.throttle_wait += throttle_wait
+            metrics.bytes_sent += bytes_sent
+            metrics.bytes_received += bytes_received
+            metrics.retries += retries
+
+    def job_completed(self, job_id: str, analysis_type: str, status: str, duration: float):
+        with self._lock:
+            histogram = self._jobs.get((analysis_type, status))
+            if histogram is None:
+                histogram = self._jobs[analysis_type, status] = Histogram(self.job_buckets)
+            histogram.observe(duration)
+
+    def snapshot(self) -> dict:
+        """ Copy of all metrics recorded so far
+
+        Returns
+        -------
+        dict
+            `requests` maps endpoint names to their request count, counts per status code, latency histogram,
+            throttle wait, bytes sent and received and retries, summed over HTTP methods.
+            `jobs` maps analysis types to a job duration histogram per final status
+        """
+        requests = {}
+        jobs = defaultdict(dict)
+        with self._lock:
+            for (endpoint, method), metrics in sorted(self._endpoints.items()):
+                summary = requests.setdefault(endpoint, {
+                    'count': 0, 'statuses': defaultdict(int), 'latency': Histogram(self.latency_buckets),
+                    'throttle_wait': 0., 'bytes_sent': 0, 'bytes_received': 0, 'retries': 0})
+                summary['count'] += metrics.latency.count
+                for status, count in metrics.statuses.items():
+                    summary['statuses'][status] += count
+                _merge(summary['latency'], metrics.latency)
+                summary['throttle_wait'] += metrics.throttle_wait
+                summary['bytes_sent'] += metrics.bytes_sent
+                summary['bytes_received'] += metrics.bytes_received
+                summary['retries'] += metrics.retries
+            for (analysis_type, status), histogram in sorted(self._jobs.items()):
+                jobs[analysis_type][status] = histogram.to_dict()
+        for summary in requests.values():
+            summary['statuses'] = dict(summary['statuses'])
+            summary['latency'] = summary['latency'].to_dict()
+        return {'requests': requests, 'jobs': dict(jobs)}
+
+    def to_prometheus(self, prefix: str='mieaa') -> str:
+        """ All metrics in the Prometheus text exposition format """
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help_text))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+
+        def sample(name, labels, value):
+            label_text = ','.join('{}="{}"'.format(key, _escape(value)) for key, value in labels)
+            lines.append('{}_{}{{{}}} {}'.format(prefix, name, label_text, _format_value(value)))
+
+        def histogram(name, labels, values):
+            for bound, count in values.cumulative().items():
+                sample(name + '_bucket', labels + (('le', bound),), count)
+            sample(name + '_sum', labels, values.sum)
+            sample(name + '_count', labels, values.count)
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            jobs = sorted(self._jobs.items())
+
+            family('requests_total', 'counter', 'API requests by endpoint, method and final status code.')
+            for (endpoint, method), metrics in endpoints:
+                for status, count in sorted(metrics.statuses.items()):
+                    sample('requests_total', (('endpoint', endpoint), ('method', method), ('status', status)), count)
+            family('request_duration_seconds', 'histogram', 'Time spent waiting for API responses.')
+            for (endpoint, method), metrics in endpoints:
+                histogram('request_duration_seconds', (('endpoint', endpoint), ('method', method)), metrics.latency)
+            counters = (
+                ('throttle_wait_seconds_total', 'Time spent waiting for the rate limiter.', 'throttle_wait'),
+                ('request_bytes_total', 'Size of request bodies sent.', 'bytes_sent'),
+                ('response_bytes_total', 'Size of response bodies received.', 'bytes_received'),
+                ('request_retries_total', 'Requests repeated after being throttled.', 'retries'),
+            )
+            for name, help_text, attribute in counters:
+                family(name, 'counter', help_text)
+                for (endpoint, method), metrics in endpoints:
+                    sample(name, (('endpoint', endpoint), ('method', method)), getattr(metrics, attribute))
+            family('job_duration_seconds', 'histogram', 'Time from job submission until it was seen completed.')
+            for (analysis_type, status), values in jobs:
+                histogram('job_duration_seconds', (('analysis', analysis_type), ('status', status)), values)
+        return '\n'.join(lines) + '\n'
+
+
+_instrumentation = None
+
+
+def set_instrumentation(instrumentation: Optional[Instrumentation]):
+    """ Install process-wide instrumentation, used by every session without its own, or remove it with None """
+    global _instrumentation
+    _instrumentation = instrumentation
+
+
+def get_instrumentation() -> Optional[Instrumentation]:
+    """ Process-wide instrumentation, None if not installed """
+    return _instrumentation
+
+
+def _merge(target: Histogram, source: Histogram):
+    target.counts = [a + b for a, b in zip(target.counts, source.counts)]
+    target.sum += source.sum
+    target.count += source.count
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
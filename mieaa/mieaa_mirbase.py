@@ -0,0 +1,263 @@
+import json
+import mmap
+import os
+import struct
+from typing import Dict, IO, Iterable, List, Optional, Union
+
+
+_MAGIC = b'MIEAAMB1'
+_HEADER = struct.Struct('<8sQ')
+_STRING_REF = struct.Struct('<II')  # offset, length into the string blob
+_NAME_ENTRY = struct.Struct('<III')  # name offset, name length, accession id
+_MISSING = 0xFFFFFFFF
+
+MIRNA_TYPES = ('mirna', 'precursor')
+
+
+def version_key(version: Union[str, float]) -> str:
+    """ Normalize a miRBase version, e.g. 22, '22.0' and 'v22' all map to '22' """
+    return '{:g}'.format(float(str(version).lstrip('vV')))
+
+
+def read_mirbase_table(table: Union[str, IO]) -> Dict[str, str]:
+    """ Read a miRBase table mapping names to accessions
+
+    Supports the FASTA files released with every miRBase version (`mature.fa`, `hairpin.fa`), whose headers
+    look like `>hsa-let-7a-5p MIMAT0000062 Homo sapiens let-7a-5p`, and tab-separated `accession<TAB>name` files.
+
+    Returns
+    -------
+    dict
+        Keys are miRNA/precursor names and values are their accessions
+    """
+    if isinstance(table, str):
+        with open(table) as table_file:
+            return read_mirbase_table(table_file)
+
+    names = {}
+    for line in table:
+        line = line.strip()
+        if line.startswith('>'):
+            fields = line[1:].split()
+            if len(fields) >= 2:
+                names[fields[0]] = fields[1]
+        elif line and not line.startswith('#') and '\t' in line:
+            accession, name = line.split('\t')[:2]
+            names[name.strip()] = accession.strip()
+    return names
+
+
+def read_mirbase_aliases(aliases: Union[str, IO]) -> Dict[str, str]:
+    """ Read a miRBase `aliases.txt` file (`accession<TAB>name1;name2;`) mapping every historical name to its accession """
+    if isinstance(aliases, str):
+        with open(aliases) as aliases_file:
+            return read_mirbase_aliases(aliases_file)
+
+    names = {}
+    for line in aliases:
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 2:
+            continue
+        for name in fields[1].split(';'):
+            if name:
+                names.setdefault(name, fields[0])
+    return names
+
+
+class MirbaseIndex:
+    """ Memory-mapped index for converting miRNAs/precursors between miRBase versions offline
+
+    The index is a single precomputed file containing, for every version and miRNA type, the names
+    sorted for binary search and a table from accession to name. It is memory-mapped read-only, so any
+    number of worker processes can share it without loading it into memory. Build it once with `build`.
+
+    Attributes
+    ----------
+    path : str
+        Index file
+    versions : dict
+        Keys are the indexed versions and values are the indexed miRNA types
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as index_file:
+            self._mmap = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            raise ValueError('{} is not a miRBase index'.format(path))
+        header = json.loads(self._mmap[_HEADER.size:_HEADER.size + header_length].decode())
+        base = _HEADER.size + header_length
+        self._strings = base + header['strings'][0]
+        self._accessions = base + header['accessions'][0]
+        self._tables = {
+            table: {'names': (base + offsets['names'][0], offsets['names'][1]),
+                    'accessions': base + offsets['accessions'][0]}
+            for table, offsets in header['tables'].items()
+        }
+        self.versions = {}
+        for table in self._tables:
+            version, mirna_type = table.split('|')
+            if version != 'aliases':
+                self.versions.setdefault(version, []).append(mirna_type)
+
+    @classmethod
+    def build(cls, path: str, tables: Dict[Union[str, float], Dict[str, Union[str, IO]]],
+              aliases: Union[str, IO, None]=None) -> 'MirbaseIndex':
+        """ Build an index file from miRBase tables
+
+        Parameters
+        ----------
+        path : str
+            File to write the index to
+        tables : dict
+            Keys are miRBase versions, values map a miRNA type (`mirna` or `precursor`) to a table
+            readable by `read_mirbase_table`, e.g. `{22: {'mirna': 'mature.fa', 'precursor': 'hairpin.fa'}}`
+        aliases : str or file-like, optional
+            miRBase `aliases.txt`, used to resolve names that are missing from the input version
+
+        Returns
+        -------
+        MirbaseIndex
+            The opened index
+        """
+        names_by_table = {}
+        for version, version_tables in tables.items():
+            for mirna_type, table in version_tables.items():
+                if mirna_type not in MIRNA_TYPES:
+                    raise ValueError('mirna_type must be one of {}, got {!r}'.format(MIRNA_TYPES, mirna_type))
+                names_by_table['{}|{}'.format(version_key(version), mirna_type)] = read_mirbase_table(table)
+        if aliases is not None:
+            names_by_table['aliases|all'] = read_mirbase_aliases(aliases)
+
+        strings = bytearray()
+        string_offsets = {}
+
+        def intern(value: str) -> tuple:
+            encoded = value.encode()
+            if encoded not in string_offsets:
+                string_offsets[encoded] = len(strings)
+                strings.extend(encoded)
+            return string_offsets[encoded], len(encoded)
+
+        accession_ids = {}
+        for names in names_by_table.values():
+            for accession in names.values():
+                accession_ids.setdefault(accession, len(accession_ids))
+
+        sections = []
+        accession_table = bytearray()
+        for accession in accession_ids:
+            accession_table.extend(_STRING_REF.pack(*intern(accession)))
+        sections.append(('accessions', accession_table, len(accession_ids)))
+
+        for table, names in names_by_table.items():
+            name_table = bytearray()
+            entries = sorted((name, accession_ids[accession]) for name, accession in names.items())
+            for name, accession_id in entries:
+                name_table.extend(_NAME_ENTRY.pack(*intern(name), accession_id))
+            by_accession = [(0, _MISSING)] * len(accession_ids)
+            for name, accession in names.items():
+                by_accession[accession_ids[accession]] = intern(name)
+            accession_names = bytearray()
+            for ref in by_accession:
+                accession_names.extend(_STRING_REF.pack(*ref))
+            sections.append((table + ':names', name_table, len(entries)))
+            sections.append((table + ':accessions', accession_names, len(accession_ids)))
+        sections.append(('strings', strings, len(strings)))
+
+        # section offsets are relative to the end of the header
+        layout = {}
+        position = 0
+        for name, data, count in sections:
+            layout[name] = [position, count]
+            position += len(data)
+        header = json.dumps({
+            'strings': layout['strings'],
+            'accessions': layout['accessions'],
+            'tables': {table: {'names': layout[table + ':names'], 'accessions': layout[table + ':accessions']}
+                       for table in names_by_table},
+        }).encode()
+
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'wb') as index_file:
+            index_file.write(_HEADER.pack(_MAGIC, len(header)))
+            index_file.write(header)
+            for _, data, _ in sections:
+                index_file.write(data)
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def has_versions(self, from_version: Union[str, float], to_version: Union[str, float], mirna_type: str) -> bool:
+        """ Whether both versions are indexed for the given miRNA type """
+        mirna_type = mirna_type.lower()
+        return all(mirna_type in self.versions.get(version_key(version), [])
+                   for version in (from_version, to_version))
+
+    def accession(self, name: str, version: Union[str, float], mirna_type: str) -> Optional[str]:
+        """ Return the accession of a miRNA/precursor name in the given version, falling back to aliases """
+        accession_id = self._find(name, '{}|{}'.format(version_key(version), mirna_type.lower()))
+        if accession_id is None and 'aliases|all' in self._tables:
+            accession_id = self._find(name, 'aliases|all')
+        if accession_id is None:
+            return None
+        return self._string(_STRING_REF.unpack_from(self._mmap, self._accessions + accession_id * _STRING_REF.size))
+
+    def convert(self, mirnas: Iterable[str], from_version: Union[str, float], to_version: Union[str, float],
+                mirna_type: str) -> List[Optional[str]]:
+        """ Convert names from one miRBase version to another
+
+        Returns
+        -------
+        list
+            Converted name for each input name, None if it could not be converted
+        """
+        mirna_type = mirna_type.lower()
+        from_table = '{}|{}'.format(version_key(from_version), mirna_type)
+        to_table = '{}|{}'.format(version_key(to_version), mirna_type)
+        if from_table not in self._tables or to_table not in self._tables:
+            raise KeyError('miRBase versions {} and {} are not both indexed for {}'.format(
+                from_version, to_version, mirna_type))
+        to_accessions = self._tables[to_table]['accessions']
+        converted = []
+        for mirna in mirnas:
+            accession_id = self._find(mirna, from_table)
+            if accession_id is None and 'aliases|all' in self._tables:
+                accession_id = self._find(mirna, 'aliases|all')
+            if accession_id is None:
+                converted.append(None)
+                continue
+            ref = _STRING_REF.unpack_from(self._mmap, to_accessions + accession_id * _STRING_REF.size)
+            converted.append(None if ref[1] == _MISSING else self._string(ref))
+        return converted
+
+    def close(self):
+        self._mmap.close()
+
+    def _find(self, name: str, table: str) -> Optional[int]:
+        """ Binary search the sorted name table, returning the accession id """
+        offset, count = self._tables[table]['names']
+        target = name.encode()
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            name_offset, name_length, accession_id = _NAME_ENTRY.unpack_from(
+                self._mmap, offset + middle * _NAME_ENTRY.size)
+            candidate = self._mmap[self._strings + name_offset:self._strings + name_offset + name_length]
+            if candidate == target:
+                return accession_id
+            if candidate < target:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def _string(self, ref: tuple) -> str:
+        offset, length = ref
+        start = self._strings + offset
+        return self._mmap[start:start + length].decode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,198 @@
+from concurrent.futures import TimeoutError
+import heapq
+import itertools
+import threading
+from time import time
+from typing import Iterable, Iterator, Optional, Tuple, Union
+
+import requests
+
+from mieaa.mieaa_polling import PollingStrategy
+from mieaa.mieaa_wrapper import API
+
+
+class _PolledJob:
+    """ Scheduling state of a single job """
+    def __init__(self, job_id: str, started: float, request_key: Optional[str]=None):
+        self.job_id = job_id
+        self.started = started
+        self.request_key = request_key
+        self.attempt = 0
+        self.status = None
+        self.errors = 0
+
+
+class StatusPoller:
+    """ Wait for many enrichment analyses using a single status scheduler
+
+    Instead of running a `get_results` loop per job, the poller keeps every tracked job in one queue
+    ordered by when its next status check is due, as decided by the polling strategy. Checks are made
+    one at a time over a single session, so all jobs share the session's rate limit and no job can
+    starve the others. Jobs can be added at any time, including while iterating.
+
+    Attributes
+    ----------
+    results_format : str
+        * *json* - retrieve results in json format
+        * *csv* - retrieve results in csv format
+    strategy : PollingStrategy
+        Decides when each job is checked next, defaults to `API.polling_strategy`
+    api : API
+        Instance whose session is used for all requests
+    retries : int
+        Number of consecutive connection errors after which a job is given up
+    errors : dict
+        Keys are IDs of jobs that could not be retrieved and values are the raised exceptions
+
+    Examples
+    --------
+    >>> poller = StatusPoller(['job-1', 'job-2'])
+    >>> for job_id, results in poller:
+    ...     if results is None:
+    ...         print(job_id, poller.errors[job_id])
+    """
+    def __init__(self, job_ids: Iterable[str]=(), results_format: str='json',
+                 strategy: Optional[PollingStrategy]=None, api: Optional[API]=None, retries: int=5):
+        self.results_format = results_format
+        self.api = api if api is not None else API()
+        self.strategy = strategy if strategy is not None else self.api.polling_strategy
+        self.retries = retries
+        self.errors = {}
+        self._queue = []
+        self._jobs = {}
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        for job_id in job_ids:
+            self.add(job_id)
+
+    @property
+    def pending(self) -> list:
+        """ IDs of jobs that have not completed yet """
+        with self._condition:
+            return list(self._jobs)
+
+    def add(self, job_id: Union[str, API], submitted_at: Optional[float]=None):
+        """ Start tracking a job, ignoring jobs that are already tracked
+
+        Parameters
+        ----------
+        job_id : str or API
+            Job ID, or an API instance whose current job should be tracked, whose results are then also stored in
+            the result cache
+        submitted_at : float, optional
+            Unix time the job was submitted, looked up in `API.jobs` if not provided
+        """
+        request_key = None
+        if isinstance(job_id, API):
+            submitted_at = submitted_at or job_id._submitted_at
+            request_key = job_id._request_key
+            job_id = job_id.job_id
+        if not job_id:
+            raise ValueError('No job ID provided')
+        if submitted_at is None:
+            record = self.api._job_store('get_record', job_id)
+            submitted_at = record.created if record is not None else time()
+        with self._condition:
+            if job_id in self._jobs:
+                return
+            job = _PolledJob(job_id, submitted_at, request_key)
+            self._jobs[job_id] = job
+            self._schedule(job, self.strategy.next_delay(0, None, time() - job.started))
+            self._condition.notify()
+
+    def remove(self, job_id: str):
+        """ Stop tracking a job """
+        with self._condition:
+            self._jobs.pop(job_id, None)
+            self._condition.notify()
+
+    def as_completed(self, timeout: Optional[float]=None) -> Iterator[Tuple[str, Union[str, list, None]]]:
+        """ Yield `(job_id, results)` as each job completes, until no tracked job is left
+
+        Results are in `results_format`, empty if the job failed on the server, and None if the job could
+        not be retrieved (see `errors`).
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait in total
+
+        Raises
+        ------
+        concurrent.futures.TimeoutError
+            If jobs are still pending after `timeout` seconds
+        """
+        deadline = None if timeout is None else time() + timeout
+        while True:
+            job = self._next_due(deadline)
+            if job is None:
+                return
+            completed, results = self._check(job)
+            if completed:
+                with self._condition:
+                    self._jobs.pop(job.job_id, None)
+                yield job.job_id, results
+
+    def __iter__(self) -> Iterator[Tuple[str, Union[str, list, None]]]:
+        return self.as_completed()
+
+    def close(self):
+        self.api.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _schedule(self, job: _PolledJob, delay: float):
+        heapq.heappush(self._queue, (time() + delay, next(self._counter), job))
+
+    def _next_due(self, deadline: Optional[float]) -> Optional[_PolledJob]:
+        """ Block until the next status check is due and return its job, None if no jobs are left """
+        with self._condition:
+            while True:
+                while self._queue and self._jobs.get(self._queue[0][2].job_id) is not self._queue[0][2]:
+                    heapq.heappop(self._queue)  # removed job
+                if not self._queue:
+                    return None
+                due = self._queue[0][0]
+                now = time()
+                if due <= now:
+                    return heapq.heappop(self._queue)[2]
+                if deadline is not None and deadline <= now:
+                    raise TimeoutError('{} jobs are still pending'.format(len(self._jobs)))
+                wait = due - now if deadline is None else min(due, deadline) - now
+                # woken early when a job is added
+                self._condition.wait(wait)
+
+    def _check(self, job: _PolledJob) -> Tuple[bool, Union[str, list, None]]:
+        """ Check a job once, returning whether it completed and its results """
+        api = self.api
+        api.job_id = job.job_id
+        api._request_key = job.request_key
+        # progress is only written to the job store when it changed since this job's previous check
+        api._recorded_progress = job.status['status'] if job.status else None
+        job.attempt += 1
+        try:
+            job.status = api._get_progress_response().json()
+            job.errors = 0
+            progress = job.status['status']
+            api._record_progress(progress)
+            if progress == 'FAILED':
+                return True, [] if self.results_format == 'json' else ''
+            if progress >= 100:
+                return True, api._download_results(self.results_format)
+        except requests.exceptions.ConnectionError as err:
+            job.errors += 1
+            if job.errors >= self.retries:
+                self.errors[job.job_id] = err
+                return True, None
+        except (requests.HTTPError, ValueError, KeyError, TypeError) as err:
+            self.errors[job.job_id] = err
+            return True, None
+
+        with self._condition:
+            if self._jobs.get(job.job_id) is job:
+                self._schedule(job, self.strategy.next_delay(job.attempt, job.status, time() - job.started))
+        return False, None
@@ -0,0 +1,102 @@
+import random
+from typing import Optional, Union
+
+
+class PollingStrategy:
+    """ Decides how long to wait before each job status check
+
+    Strategies are stateless, so one instance can be shared by any number of jobs and threads.
+    """
+    def next_delay(self, attempt: int, status: Optional[dict]=None, elapsed: float=0.) -> float:
+        """ Seconds to wait before the next status check
+
+        Parameters
+        ----------
+        attempt : int
+            Number of status checks already made for the job
+        status : dict or None
+            Last response of the job status endpoint, None before the first check
+        elapsed : float
+            Seconds since the job was submitted (or since polling started if unknown)
+        """
+        raise NotImplementedError
+
+
+class FixedInterval(PollingStrategy):
+    """ Wait the same number of seconds before every status check """
+    def __init__(self, interval: float=5.):
+        self.interval = interval
+
+    def next_delay(self, attempt: int, status: Optional[dict]=None, elapsed: float=0.) -> float:
+        return self.interval
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, self.interval)
+
+
+class AdaptiveBackoff(PollingStrategy):
+    """ Check immediately, then back off exponentially, guided by the job's progress
+
+    If the status response contains an estimate of the remaining time, or the job reports partial
+    progress from which its rate can be estimated, the next check is scheduled for when the job is
+    expected to finish. Otherwise the wait grows exponentially. Delays are capped at `max_interval`
+    and randomized by `jitter` so that many jobs do not poll in lockstep.
+
+    Attributes
+    ----------
+    initial : float
+        Wait before the second status check
+    factor : float
+        Growth of the wait between subsequent checks
+    max_interval : float
+        Longest wait between checks
+    jitter : float
+        Relative random variation of every wait, e.g. 0.1 for +/- 10%
+    first_delay : float
+        Wait before the first status check
+    """
+    eta_fields = ('eta', 'remaining', 'remaining_time', 'estimated_time')
+
+    def __init__(self, initial: float=.5, factor: float=2., max_interval: float=30., jitter: float=.1,
+                 first_delay: float=0.):
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.first_delay = first_delay
+
+    def next_delay(self, attempt: int, status: Optional[dict]=None, elapsed: float=0.) -> float:
+        if attempt == 0:
+            return self.first_delay
+        delay = self.initial * self.factor ** (attempt - 1)
+        remaining = self._remaining(status, elapsed)
+        if remaining is not None:
+            delay = max(self.initial, remaining)
+        delay = min(self.max_interval, delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _remaining(self, status: Optional[dict], elapsed: float) -> Optional[float]:
+        """ Estimate the remaining run time from server hints or the progress rate """
+        if not status:
+            return None
+        for field in self.eta_fields:
+            if isinstance(status.get(field), (int, float)):
+                return float(status[field])
+        progress = status.get('status')
+        if isinstance(progress, (int, float)) and 0 < progress < 100 and elapsed > 0:
+            return elapsed * (100 - progress) / progress
+        return None
+
+    def __repr__(self):
+        return '{}(initial={}, factor={}, max_interval={})'.format(
+            type(self).__name__, self.initial, self.factor, self.max_interval)
+
+
+def resolve_strategy(check_progress_interval: Union[None, float, PollingStrategy],
+                     default: PollingStrategy) -> PollingStrategy:
+    """ Interpret the `check_progress_interval` argument accepted by `get_results` """
+    if check_progress_interval is None:
+        return default
+    if isinstance(check_progress_interval, PollingStrategy):
+        return check_progress_interval
+    return FixedInterval(check_progress_interval)
@@ -0,0 +1,156 @@
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import threading
+from time import monotonic, sleep
+from typing import Optional
+
+
+REQUEST_SLACK = .1  # wait just a tad bit longer than the server interval to allow time to send requests
+DEFAULT_BURST = 1
+
+
+class TokenBucket:
+    """ Thread and asyncio safe token-bucket rate limiter
+
+    Tokens are refilled at `rate` per second up to `burst` tokens. Each request takes one token,
+    waiting if none are available. Callers reserve their slot under a lock and then sleep outside
+    of it, so the limiter can be shared by any number of threads and event loops.
+
+    When the server responds with 429 (Too Many Requests), `throttled` pauses the bucket for the
+    `Retry-After` delay and halves the rate. Each successful response passed to `recovered`
+    increases the rate again until the configured rate is reached.
+
+    Attributes
+    ----------
+    max_rate : float
+        Configured number of requests per second
+    rate : float
+        Current number of requests per second, lower than `max_rate` after being throttled
+    burst : int
+        Maximum number of requests that may be sent without waiting
+    min_rate : float
+        Lowest rate the bucket will back off to
+    """
+    backoff_factor = .5
+    recovery_step = .1  # fraction of max_rate regained per successful request
+
+    def __init__(self, rate: float, burst: int=DEFAULT_BURST, min_rate: Optional[float]=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        if burst < 1:
+            raise ValueError('burst must be at least 1')
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate or rate / 16
+        self._tokens = float(burst)
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_interval(cls, interval: float, burst: int=DEFAULT_BURST) -> 'TokenBucket':
+        """ Create a bucket allowing one request every `interval` seconds """
+        return cls(1 / interval, burst)
+
+    def reserve(self) -> float:
+        """ Take a token, returning how many seconds the caller must wait before sending its request """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """ Block the current thread until a request may be sent """
+        wait = self.reserve()
+        if wait > 0:
+            sleep(wait)
+
+    async def acquire_async(self):
+        """ Wait without blocking the event loop until a request may be sent """
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def throttled(self, retry_after: Optional[float]=None):
+        """ Back off after the server rejected a request for exceeding its rate limit
+
+        Parameters
+        ----------
+        retry_after : float, optional
+            Seconds the server asked us to wait. Defaults to one interval at the reduced rate
+        """
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+            delay = retry_after if retry_after is not None else 1 / self.rate
+            # put the bucket in debt so subsequent reservations queue behind the delay
+            self._tokens = min(self._tokens, 0.) - delay * self.rate
+
+    def recovered(self):
+        """ Record a successful request, gradually restoring the configured rate """
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate * self.recovery_step)
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def __repr__(self):
+        return '{}(rate={:.3g}, burst={}, max_rate={:.3g})'.format(
+            type(self).__name__, self.rate, self.burst, self.max_rate)
+
+
+_shared_limiters = {}
+_shared_limiters_lock = threading.Lock()
+
+
+def shared_limiter(wait: float=1, burst: Optional[int]=None) -> TokenBucket:
+    """ Get the process-wide limiter for a given wait between requests
+
+    All sessions waiting the same number of seconds between requests draw from the same bucket,
+    so running several API instances in one process never exceeds the server rate limit.
+
+    Parameters
+    ----------
+    wait : float, default=1
+        Seconds the server requires between requests
+    burst : int, optional
+        If provided, update the number of requests that may be sent without waiting
+
+    Returns
+    -------
+    TokenBucket
+        Limiter shared by all sessions using the same wait
+    """
+    with _shared_limiters_lock:
+        limiter = _shared_limiters.get(wait)
+        if limiter is None:
+            limiter = TokenBucket.from_interval(wait + REQUEST_SLACK, burst or DEFAULT_BURST)
+            _shared_limiters[wait] = limiter
+        elif burst is not None:
+            limiter.burst = burst
+        return limiter
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """ Convert a Retry-After header (seconds or HTTP date) to a number of seconds """
+    if not value:
+        return None
+    try:
+        return max(0., float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0., (retry_at - datetime.now(timezone.utc)).total_seconds())
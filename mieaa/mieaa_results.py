@@ -0,0 +1,182 @@
+import codecs
+import csv
+import gzip
+import io
+import json
+import os
+from typing import IO, Iterable, Iterator, Optional, Union
+
+
+_GZIP_MAGIC = b'\x1f\x8b'
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+class ResultsSink:
+    """ Write downloaded results chunk by chunk, optionally gzip compressed
+
+    Paths are written to a temporary file that only replaces the destination once the download
+    completed, so an interrupted download never leaves a truncated result file behind.
+
+    Attributes
+    ----------
+    destination : str or file-like
+        Path or binary/text file object to write to
+    compress : bool
+        Whether to gzip compress written chunks
+    """
+    def __init__(self, destination: Union[str, IO], compress: bool=False):
+        self.destination = destination
+        self.compress = compress
+        self._file = None
+        self._gzip = None
+        self._tmp_path = None
+
+    def __enter__(self) -> 'ResultsSink':
+        if isinstance(self.destination, str):
+            self._tmp_path = '{}.{}.part'.format(self.destination, os.getpid())
+            self._file = open(self._tmp_path, 'wb')
+        elif isinstance(self.destination, io.TextIOBase):
+            buffer = getattr(self.destination, 'buffer', None)
+            if buffer is None:
+                if self.compress:
+                    raise ValueError('Compressed results can only be written to binary files')
+                self._file = _TextWriter(self.destination)
+            else:
+                self.destination.flush()
+                self._file = buffer
+        else:
+            self._file = self.destination
+        if self.compress:
+            self._gzip = gzip.GzipFile(fileobj=self._file, mode='wb', compresslevel=6)
+        return self
+
+    def write(self, chunk: bytes):
+        (self._gzip or self._file).write(chunk)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._gzip is not None:
+            self._gzip.close()
+        if self._tmp_path is None:
+            self._file.flush()
+            return
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp_path, self.destination)
+        else:
+            os.remove(self._tmp_path)
+
+
+class _TextWriter:
+    """ Decode bytes incrementally into a text file without a binary buffer, e.g. io.StringIO """
+    def __init__(self, text_file: IO):
+        self.text_file = text_file
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def write(self, chunk: bytes):
+        self.text_file.write(self.decoder.decode(chunk))
+
+    def flush(self):
+        self.text_file.write(self.decoder.decode(b'', final=True))
+        self.text_file.flush()
+
+
+def open_results(source: Union[str, IO]) -> IO:
+    """ Open saved results as text, transparently decompressing gzip files
+
+    Parameters
+    ----------
+    source : str or file-like
+        Path, or binary/text file object, of results written by `API.download_results`
+    """
+    if isinstance(source, str):
+        binary = open(source, 'rb')
+    elif isinstance(source, io.TextIOBase):
+        return source
+    else:
+        binary = source
+    if _peek(binary, len(_GZIP_MAGIC)) == _GZIP_MAGIC:
+        binary = gzip.GzipFile(fileobj=binary, mode='rb')
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
+
+
+def iter_results(source: Union[str, IO], results_format: Optional[str]=None,
+                 chunk_size: int=DEFAULT_CHUNK_SIZE) -> Iterator[list]:
+    """ Lazily parse saved results row by row, without loading the whole file
+
+    Parameters
+    ----------
+    source : str or file-like
+        Path, or file object, of results written by `API.download_results`. Gzip compression is detected automatically
+    results_format : str, optional
+        * *json* - results in json format
+        * *csv* - results in csv format, the header row is skipped
+
+        Inferred from the file extension of paths, defaulting to csv
+
+    Yields
+    ------
+    list
+        Fields of each result row, in the same form as returned by `API.get_results`
+    """
+    if results_format is None:
+        name = source if isinstance(source, str) else getattr(source, 'name', '')
+        name = name[:-3] if isinstance(name, str) and name.endswith('.gz') else str(name)
+        results_format = 'json' if name.endswith('.json') else 'csv'
+
+    text_file = open_results(source)
+    try:
+        if results_format == 'json':
+            yield from _iter_json_array(iter(lambda: text_file.read(chunk_size), ''))
+        else:
+            reader = csv.reader(text_file)
+            next(reader, None)
+            yield from reader
+    finally:
+        if isinstance(source, str):
+            text_file.close()
+        elif text_file is not source:
+            text_file.detach()  # leave the caller's file open
+
+
+def _peek(binary: IO, size: int) -> bytes:
+    if hasattr(binary, 'peek'):
+        return binary.peek(size)[:size]
+    if binary.seekable():
+        position = binary.tell()
+        head = binary.read(size)
+        binary.seek(position)
+        return head
+    return b''
+
+
+def _iter_json_array(chunks: Iterable[str]) -> Iterator:
+    """ Yield the items of a top level JSON array as its text arrives in chunks """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    in_array = False
+    for chunk in chunks:
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if position == len(buffer):
+                break
+            if not in_array:
+                if buffer[position] != '[':
+                    raise ValueError('Results are not a JSON array')
+                in_array = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                break  # item continues in the next chunk
+            if end == len(buffer) and not isinstance(item, (list, dict)):
+                break  # a number or literal might continue in the next chunk
+            yield item
+            position = end
+    raise ValueError('Results are not a complete JSON array')
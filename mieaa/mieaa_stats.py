@@ -0,0 +1,269 @@
+from typing import Sequence, Tuple, Union
+
+try:
+    import numpy
+except ImportError:  # optional dependency, required for local statistics
+    numpy = None
+
+
+P_VALUE_ADJUSTMENTS = ('none', 'fdr', 'bonferroni', 'BY', 'hochberg', 'holm', 'hommel')
+ALTERNATIVES = ('two-sided', 'greater', 'less')
+
+# relative tolerance when comparing probabilities of the observed and other tables, as in R's fisher.test
+_RELATIVE_ERROR = 1 + 1e-7
+
+
+def require_numpy(feature: str):
+    if numpy is None:
+        raise ImportError('{} requires numpy, install it with `pip install mieaa[numpy]`'.format(feature))
+
+
+def adjust_p_values(p_values: Union[Sequence[float], 'numpy.ndarray'], method: str='fdr') -> 'numpy.ndarray':
+    """ Adjust p-values for multiple testing, matching R's `p.adjust`
+
+    Parameters
+    ----------
+    p_values : sequence of float
+        Unadjusted p-values, NaN values are kept and do not count as tests
+    method : str, default='fdr'
+        * *none* - No adjustment
+        * *fdr* - FDR (Benjamini-Hochberg) adjustment
+        * *bonferroni* - Bonferroni adjustment
+        * *BY* - Benjamini-Yekutieli adjustment
+        * *hochberg* - Hochberg adjustment
+        * *holm* - Holm adjustment
+        * *hommel* - Hommel adjustment
+
+    Returns
+    -------
+    numpy.ndarray
+        Adjusted p-values in the order of `p_values`
+    """
+    require_numpy('adjust_p_values')
+    method = _adjustment_method(method)
+    p_values = numpy.asarray(p_values, dtype='float64')
+    adjusted = p_values.copy()
+    valid = ~numpy.isnan(p_values)
+    p = p_values[valid]
+    n = len(p)
+    if n <= 1 or method == 'none':
+        return adjusted
+
+    if method == 'bonferroni':
+        result = numpy.minimum(1., p * n)
+    elif method == 'holm':
+        order = numpy.argsort(p, kind='stable')
+        result = numpy.empty(n)
+        result[order] = numpy.minimum(1., numpy.maximum.accumulate((n - numpy.arange(n)) * p[order]))
+    elif method in ('hochberg', 'fdr', 'BY'):
+        order = numpy.argsort(p, kind='stable')[::-1]
+        rank = numpy.arange(n, 0, -1)
+        if method == 'hochberg':
+            scaled = (n - rank + 1) * p[order]
+        else:
+            scaled = n / rank * p[order]
+            if method == 'BY':
+                scaled *= numpy.sum(1. / numpy.arange(1, n + 1))
+        result = numpy.empty(n)
+        result[order] = numpy.minimum(1., numpy.minimum.accumulate(scaled))
+    else:
+        result = _hommel(p)
+    adjusted[valid] = result
+    return adjusted
+
+
+def adjust_p_values_grouped(p_values: Union[Sequence[float], 'numpy.ndarray'], groups: Sequence,
+                            method: str='fdr', independent: bool=True) -> 'numpy.ndarray':
+    """ Adjust p-values within each group, or all together if not `independent`
+
+    Mirrors the `independent_p_adjust` analysis parameter, where groups are categories.
+    """
+    require_numpy('adjust_p_values_grouped')
+    p_values = numpy.asarray(p_values, dtype='float64')
+    if not independent:
+        return adjust_p_values(p_values, method)
+    groups = numpy.asarray(groups)
+    adjusted = numpy.empty(len(p_values))
+    for group in numpy.unique(groups):
+        members = groups == group
+        adjusted[members] = adjust_p_values(p_values[members], method)
+    return adjusted
+
+
+def _hommel(p: 'numpy.ndarray') -> 'numpy.ndarray':
+    n = len(p)
+    order = numpy.argsort(p, kind='stable')
+    p = p[order]
+    q = numpy.full(n, numpy.min(n * p / numpy.arange(1, n + 1)))
+    pa = q.copy()
+    for m in range(n - 1, 1, -1):
+        i1 = numpy.arange(n - m + 1)
+        i2 = numpy.arange(n - m + 1, n)
+        q1 = numpy.min(m * p[i2] / numpy.arange(2, m + 1))
+        q[i1] = numpy.minimum(m * p[i1], q1)
+        q[i2] = q[n - m]
+        pa = numpy.maximum(pa, q)
+    result = numpy.empty(n)
+    result[order] = numpy.maximum(pa, p)
+    return result
+
+
+def _adjustment_method(method: str) -> str:
+    for name in P_VALUE_ADJUSTMENTS:
+        if method.lower() == name.lower():
+            return name
+    raise ValueError('p_value_adjustment must be one of {}, got {!r}'.format(P_VALUE_ADJUSTMENTS, method))
+
+
+def log_factorials(n: int) -> 'numpy.ndarray':
+    """ log(k!) for k = 0..n """
+    require_numpy('log_factorials')
+    return numpy.concatenate(([0.], numpy.cumsum(numpy.log(numpy.arange(1, n + 1)))))
+
+
+def fisher_exact(observed: Sequence[int], category_sizes: Sequence[int], sample_size: int, population_size: int,
+                 alternative: str='two-sided', block_size: int=1 << 20) -> 'numpy.ndarray':
+    """ Fisher's exact test of many 2x2 tables sharing the sample and population size at once
+
+    For each category of `category_sizes[i]` of `population_size` elements, tests whether drawing `sample_size`
+    elements hitting the category `observed[i]` times is unexpected under the hypergeometric distribution.
+
+    Parameters
+    ----------
+    observed : sequence of int
+        Sampled elements in each category
+    category_sizes : sequence of int
+        Elements of the population in each category
+    sample_size : int
+        Number of sampled elements
+    population_size : int
+        Number of elements in the population
+    alternative : str, default='two-sided'
+        * *two-sided* - Sum probabilities of all tables at most as likely as the observed one
+        * *greater* - Probability of observing at least as many elements
+        * *less* - Probability of observing at most as many elements
+    block_size : int
+        Maximum number of probabilities computed at once, bounding memory use
+
+    Returns
+    -------
+    numpy.ndarray
+        p-value of each category
+    """
+    require_numpy('fisher_exact')
+    if alternative not in ALTERNATIVES:
+        raise ValueError('alternative must be one of {}, got {!r}'.format(ALTERNATIVES, alternative))
+    observed = numpy.asarray(observed, dtype='int64')
+    category_sizes = numpy.asarray(category_sizes, dtype='int64')
+    p_values = numpy.ones(len(observed))
+    if not len(observed) or sample_size <= 0:
+        return p_values
+
+    log_fact = log_factorials(population_size)
+    draws = numpy.arange(sample_size + 1)
+    rows_per_block = max(1, block_size // (sample_size + 1))
+    log_total = log_fact[population_size] - log_fact[sample_size] - log_fact[population_size - sample_size]
+    for start in range(0, len(observed), rows_per_block):
+        sizes = category_sizes[start:start + rows_per_block, None]
+        hits = observed[start:start + rows_per_block, None]
+        low = numpy.maximum(0, sample_size + sizes - population_size)
+        high = numpy.minimum(sample_size, sizes)
+        valid = (draws >= low) & (draws <= high)
+        # log(C(K, x) * C(N - K, n - x) / C(N, n)), clipped indices only matter for invalid draws
+        x = numpy.where(valid, draws, 0)
+        log_pmf = (log_fact[sizes] - log_fact[x] - log_fact[numpy.clip(sizes - x, 0, None)]
+                   + log_fact[numpy.clip(population_size - sizes, 0, None)]
+                   - log_fact[numpy.clip(sample_size - x, 0, None)]
+                   - log_fact[numpy.clip(population_size - sizes - sample_size + x, 0, None)]
+                   - log_total)
+        pmf = numpy.where(valid, numpy.exp(log_pmf), 0.)
+        if alternative == 'greater':
+            keep = draws >= hits
+        elif alternative == 'less':
+            keep = draws <= hits
+        else:
+            observed_pmf = numpy.take_along_axis(pmf, numpy.clip(hits, 0, sample_size), axis=1)
+            keep = pmf <= observed_pmf * _RELATIVE_ERROR
+        p_values[start:start + rows_per_block] = numpy.minimum(1., numpy.sum(numpy.where(keep, pmf, 0.), axis=1))
+    return p_values
+
+
+def running_sum(hit_positions: Sequence['numpy.ndarray'], list_size: int) -> Tuple['numpy.ndarray', ...]:
+    """ Enrichment scores of the unweighted (Kolmogorov-Smirnov) running sum of many sets in one ranked list
+
+    Walking down the list, the running sum increases by `1 / m` at each of the `m` members of a set and decreases
+    by `1 / (list_size - m)` at every other entry. The enrichment score is its largest deviation from zero.
+
+    Parameters
+    ----------
+    hit_positions : sequence of numpy.ndarray
+        Sorted 0-based ranks of the members of each set in the list
+    list_size : int
+        Length of the ranked list
+
+    Returns
+    -------
+    tuple of numpy.ndarray
+        Enrichment score, number of entries up to and including its position, and the integer deviation
+        `hits * (list_size - m) - misses * m` the score corresponds to, for each set
+    """
+    require_numpy('running_sum')
+    scores = numpy.zeros(len(hit_positions))
+    peaks = numpy.zeros(len(hit_positions), dtype='int64')
+    deviations = numpy.zeros(len(hit_positions), dtype='int64')
+    for index, positions in enumerate(hit_positions):
+        m = len(positions)
+        if m == 0 or m == list_size:
+            continue
+        hits = numpy.arange(1, m + 1)
+        # deviation right after each hit and right before it, scaled by m * (list_size - m) to stay integral
+        after = hits * (list_size - m) - (positions + 1 - hits) * m
+        before = (hits - 1) * (list_size - m) - (positions - hits + 1) * m
+        highest, lowest = numpy.argmax(after), numpy.argmin(before)
+        if after[highest] >= -before[lowest]:
+            deviations[index], peaks[index] = after[highest], positions[highest] + 1
+        else:
+            deviations[index], peaks[index] = before[lowest], positions[lowest]
+        scores[index] = deviations[index] / (m * (list_size - m))
+    return scores, peaks, deviations
+
+
+def running_sum_p_values(set_sizes: Sequence[int], deviations: Sequence[int], list_size: int) -> 'numpy.ndarray':
+    """ Exact p-values of running sum enrichment scores under random orderings of the list
+
+    The probability that the running sum of a random ordering reaches a deviation at least as large as observed
+    is computed by dynamic programming over the number of members seen after each entry, for all sets at once.
+
+    Parameters
+    ----------
+    set_sizes : sequence of int
+        Number of members `m` of each set in the list
+    deviations : sequence of int
+        Observed deviations as returned by `running_sum`
+    list_size : int
+        Length of the ranked list
+    """
+    require_numpy('running_sum_p_values')
+    sizes = numpy.asarray(set_sizes, dtype='int64')[:, None]
+    bounds = numpy.abs(numpy.asarray(deviations, dtype='int64'))[:, None]
+    p_values = numpy.ones(len(sizes))
+    active = (bounds[:, 0] > 0) & (sizes[:, 0] > 0) & (sizes[:, 0] < list_size)
+    if not active.any():
+        return p_values
+    sizes, bounds = sizes[active], bounds[active]
+
+    hits = numpy.arange(sizes.max() + 1)[None, :]
+    state = numpy.zeros((len(sizes), hits.shape[1]))
+    state[:, 0] = 1.
+    escaped = numpy.zeros(len(sizes))
+    for seen in range(list_size):
+        remaining = list_size - seen
+        hit = state * numpy.clip(sizes - hits, 0, None) / remaining
+        state = state - hit
+        state[:, 1:] += hit[:, :-1]
+        deviation = hits * (list_size - sizes) - (seen + 1 - hits) * sizes
+        outside = numpy.abs(deviation) >= bounds
+        escaped += numpy.sum(numpy.where(outside, state, 0.), axis=1)
+        state[outside] = 0.
+    p_values[active] = numpy.minimum(1., escaped)
+    return p_values
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+import itertools
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from mieaa.mieaa_batch import BatchExecutor, JobSpec, _read_set
+from mieaa.mieaa_stats import numpy
+from mieaa.mieaa_table import ResultsTable
+from mieaa.mieaa_wrapper import API
+
+SET_PARAMS = ('test_set', 'categories', 'reference_set', 'mirna_type', 'species')
+FILTER_PARAMS = ('significance_level', 'threshold_level')
+ADJUST_PARAMS = ('p_value_adjustment', 'independent_p_adjust')
+
+
+class SweepJob:
+    """ A server job of a sweep and the grid cells derived from it
+
+    Attributes
+    ----------
+    spec : JobSpec
+        Analysis submitted to the server
+    cells : list of dict
+        Parameters of every grid cell computed from this job's results
+    """
+    def __init__(self, spec: JobSpec, cells: List[dict]):
+        self.spec = spec
+        self.cells = cells
+
+    def __repr__(self):
+        return '{}({!r}, {} cells)'.format(type(self).__name__, self.spec, len(self.cells))
+
+
+class SweepResults:
+    """ Results of every cell of a parameter grid
+
+    Attributes
+    ----------
+    keys : tuple
+        Swept parameter names, in grid order
+    results : OrderedDict
+        Maps tuples of swept values to a `ResultsTable`, or None if the cell's job failed
+    job_ids : dict
+        Maps tuples of swept values to the ID of the job the cell was derived from
+    errors : dict
+        Maps tuples of swept values to the exception raised by the cell's job
+    """
+    def __init__(self, keys: Tuple[str, ...]):
+        self.keys = keys
+        self.results = OrderedDict()
+        self.job_ids = {}
+        self.errors = {}
+
+    def get(self, **params) -> Optional[ResultsTable]:
+        """ Results of the cell with the given swept values """
+        return self.results[self._key(params)]
+
+    def __getitem__(self, key: Union[tuple, dict]) -> Optional[ResultsTable]:
+        return self.results[self._key(key) if isinstance(key, dict) else key]
+
+    def __iter__(self) -> Iterator[Tuple[dict, Optional[ResultsTable]]]:
+        for key, table in self.results.items():
+            yield dict(zip(self.keys, key)), table
+
+    def __len__(self) -> int:
+        return len(self.results)
+
+    def _key(self, params: dict) -> tuple:
+        return tuple(_hashable(params[name]) for name in self.keys)
+
+
+class ParameterSweep:
+    """ Run an enrichment analysis for every combination of a parameter grid, using as few server jobs as possible
+
+    Adjustment and filter parameters only change how results are post-processed, so cells differing only in those
+    are derived from one job. With numpy installed, a single unfiltered job per distinct combination of sets,
+    miRNA type and species serves every adjustment, significance and threshold level. Without numpy, one job per
+    adjustment is submitted with the most permissive filters of its cells, and each cell is filtered locally.
+
+    Attributes
+    ----------
+    analysis_type : str
+        * *ORA* - Over-representation Analysis
+        * *GSEA* - miRNA enrichment analysis
+    base : dict
+        Parameters shared by all cells: `test_set`, `categories`, `mirna_type`, `species`, `reference_set`
+        and analysis parameters, see `API.run_ora`
+    grid : OrderedDict
+        Maps swept parameter names to the values to try. Any of the base parameters can be swept
+    local_adjust : bool
+        Whether p-values are adjusted locally from unfiltered results, defaults to whether numpy is installed
+
+    Examples
+    --------
+    >>> sweep = ParameterSweep('ORA', test_set, ['HMDD'], 'precursor', 'hsa',
+    ...                        grid={'p_value_adjustment': ['fdr', 'holm'], 'significance_level': [0.01, 0.05]})
+    >>> results = sweep.run()
+    >>> results.get(p_value_adjustment='holm', significance_level=0.01)
+    """
+    def __init__(self, analysis_type: str, test_set, categories, mirna_type: str, species: str,
+                 grid: Dict[str, Iterable], reference_set='', local_adjust: Optional[bool]=None, **params):
+        if analysis_type.upper() not in ('ORA', 'GSEA'):
+            raise ValueError("analysis_type must be one of 'ORA' or 'GSEA', got {!r}".format(analysis_type))
+        self.analysis_type = analysis_type.upper()
+        # file objects are read up front, as every job needs the sets
+        self.base = dict(API.default_params['analysis'], test_set=_read_set(test_set),
+                         categories=_read_set(categories), mirna_type=mirna_type, species=species,
+                         reference_set=_read_set(reference_set), **params)
+        unknown = set(grid) - set(self.base)
+        if unknown:
+            raise ValueError('Cannot sweep unknown parameters: {}'.format(', '.join(sorted(unknown))))
+        self.grid = OrderedDict((name, [_read_set(value) for value in values]) for name, values in grid.items())
+        self.local_adjust = numpy is not None if local_adjust is None else local_adjust
+
+    def cells(self) -> List[dict]:
+        """ Complete parameters of every grid cell """
+        return [dict(self.base, **dict(zip(self.grid, values))) for values in itertools.product(*self.grid.values())]
+
+    def plan(self) -> List[SweepJob]:
+        """ Work out the minimal set of server jobs covering all cells """
+        groups = OrderedDict()
+        for cell in self.cells():
+            job_params = {name: value for name, value in cell.items() if name not in FILTER_PARAMS + ADJUST_PARAMS}
+            if not self.local_adjust:
+                job_params.update((name, cell[name]) for name in ADJUST_PARAMS)
+            groups.setdefault(_freeze(job_params), (job_params, []))[1].append(cell)
+
+        jobs = []
+        for number, (job_params, cells) in enumerate(groups.values()):
+            params = dict(job_params)
+            sets = {name: params.pop(name) for name in SET_PARAMS}
+            if self.local_adjust:
+                params['unfiltered'] = True
+            else:
+                params['significance_level'] = max(cell['significance_level'] for cell in cells)
+                params['threshold_level'] = min(cell['threshold_level'] for cell in cells)
+            jobs.append(SweepJob(JobSpec(self.analysis_type, name=number, **sets, **params), cells))
+        return jobs
+
+    def run(self, max_workers: int=4, executor: Optional[BatchExecutor]=None) -> SweepResults:
+        """ Submit the planned jobs concurrently and derive the results of every cell
+
+        Parameters
+        ----------
+        max_workers : int
+            Maximum number of jobs in flight at the same time
+        executor : BatchExecutor, optional
+            Executor to run the jobs with, overriding `max_workers`
+        """
+        executor = executor or BatchExecutor(max_workers)
+        jobs = self.plan()
+        results = SweepResults(tuple(self.grid))
+        for cell in self.cells():
+            results.results[results._key(cell)] = None
+
+        for batch_result in executor.run(job.spec for job in jobs):
+            job = jobs[batch_result.spec.name]
+            table = ResultsTable.from_results(batch_result.results) if batch_result.ok else None
+            for cell in job.cells:
+                key = results._key(cell)
+                results.job_ids[key] = batch_result.job_id
+                if table is None:
+                    results.errors[key] = batch_result.error
+                    continue
+                results.results[key] = self._derive(table, cell)
+        return results
+
+    def _derive(self, table: ResultsTable, cell: dict) -> ResultsTable:
+        if self.local_adjust:
+            return table.readjust(**{name: cell[name] for name in ADJUST_PARAMS + FILTER_PARAMS})
+        return table.filter(p_adjusted=cell['significance_level'], min_size=cell['threshold_level'])
+
+
+def _hashable(value):
+    """ Hashable form of a parameter value, sets compared by content """
+    if isinstance(value, (str, int, float, bool, type(None))):
+        return value
+    return tuple(value)
+
+
+def _freeze(params: dict) -> tuple:
+    return tuple((name, _hashable(value)) for name, value in sorted(params.items()))
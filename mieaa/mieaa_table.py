@@ -0,0 +1,362 @@
+from array import array
+import csv
+import heapq
+import io
+import math
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Sequence, Union
+
+try:
+    import numpy
+except ImportError:  # optional dependency, only used to speed up filtering and for exports
+    numpy = None
+
+from mieaa.mieaa_results import iter_results
+from mieaa.mieaa_stats import adjust_p_values_grouped, require_numpy
+
+
+RESULT_COLUMNS = ('category', 'subcategory', 'enrichment', 'p-value', 'p-adjusted', 'q-value', 'expected',
+                  'observed', 'mirnas/precursors')
+NUMERIC_COLUMNS = ('p-value', 'p-adjusted', 'q-value', 'expected', 'observed')
+MIRNA_SEPARATOR = '; '
+
+
+class StringPool:
+    """ Interned strings, each stored once and referred to by an integer id
+
+    Attributes
+    ----------
+    strings : list
+        Interned strings, indexed by id
+    """
+    def __init__(self, strings: Iterable[str]=()):
+        self.strings = []
+        self._ids = {}
+        for string in strings:
+            self.intern(string)
+
+    def intern(self, string: str) -> int:
+        """ Return the id of a string, adding it to the pool if necessary """
+        string_id = self._ids.get(string)
+        if string_id is None:
+            string_id = self._ids[string] = len(self.strings)
+            self.strings.append(string)
+        return string_id
+
+    def id(self, string: str) -> Optional[int]:
+        """ Return the id of a string, None if it is not in the pool """
+        return self._ids.get(string)
+
+    def __getitem__(self, string_id: int) -> str:
+        return self.strings[string_id]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class ResultsTable:
+    """ Enrichment results stored column by column
+
+    Numeric columns are compact typed arrays, and category, subcategory, enrichment and miRNA names are
+    interned, so large results take a fraction of the memory of the rows returned by `API.get_results`.
+    Filtering, sorting and top-k selection work on whole columns at once, using NumPy if it is installed.
+    Tables are immutable; every operation returns a new table sharing the string pools.
+
+    Attributes
+    ----------
+    category_ids, subcategory_ids, enrichment_ids : array.array
+        Ids into `categories`, `subcategories` and `enrichments` for each row
+    p_values, p_adjusted, q_values, expected : array.array
+        Float columns, missing values are NaN
+    observed : array.array
+        Number of miRNAs/precursors of the test set in each subcategory
+    mirna_offsets, mirna_ids : array.array
+        miRNAs/precursors of row `i` are `mirna_ids[mirna_offsets[i]:mirna_offsets[i + 1]]`, ids into `mirnas`
+    categories, subcategories, enrichments, mirnas : StringPool
+        Interned names
+    """
+    def __init__(self, pools: Optional[Dict[str, StringPool]]=None):
+        pools = pools or {}
+        self.categories = pools.get('categories', StringPool())
+        self.subcategories = pools.get('subcategories', StringPool())
+        self.enrichments = pools.get('enrichments', StringPool())
+        self.mirnas = pools.get('mirnas', StringPool())
+        self.category_ids = array('I')
+        self.subcategory_ids = array('I')
+        self.enrichment_ids = array('I')
+        self.p_values = array('d')
+        self.p_adjusted = array('d')
+        self.q_values = array('d')
+        self.expected = array('d')
+        self.observed = array('q')
+        self.mirna_offsets = array('q', [0])
+        self.mirna_ids = array('I')
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Union[Sequence, dict]]) -> 'ResultsTable':
+        """ Build a table from result rows as returned by `API.get_results` in json format
+
+        Rows may be lists in the order of `RESULT_COLUMNS` or dictionaries keyed by column name.
+        """
+        table = cls()
+        for row in rows:
+            table._append(row)
+        return table
+
+    @classmethod
+    def from_results(cls, results: Union[str, list]) -> 'ResultsTable':
+        """ Build a table from json (list) or csv (str) results returned by `API.get_results` """
+        if isinstance(results, str):
+            reader = csv.reader(io.StringIO(results))
+            next(reader, None)
+            return cls.from_rows(reader)
+        return cls.from_rows(results)
+
+    @classmethod
+    def from_file(cls, source: Union[str, IO], results_format: Optional[str]=None) -> 'ResultsTable':
+        """ Build a table from results saved by `API.download_results`, parsing them lazily """
+        return cls.from_rows(iter_results(source, results_format))
+
+    def __len__(self) -> int:
+        return len(self.category_ids)
+
+    def __getitem__(self, index: int) -> list:
+        """ Return a row in the same form as returned by `API.get_results` in json format """
+        if index < 0:
+            index += len(self)
+        return [self.categories[self.category_ids[index]], self.subcategories[self.subcategory_ids[index]],
+                self.enrichments[self.enrichment_ids[index]], self.p_values[index], self.p_adjusted[index],
+                self.q_values[index], self.expected[index], self.observed[index],
+                MIRNA_SEPARATOR.join(self.row_mirnas(index))]
+
+    def __iter__(self) -> Iterator[list]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def __repr__(self):
+        return '{}({} rows, {} categories)'.format(type(self).__name__, len(self), len(self.categories))
+
+    def row_mirnas(self, index: int) -> List[str]:
+        """ miRNAs/precursors of the test set in the subcategory of a row """
+        start, end = self.mirna_offsets[index], self.mirna_offsets[index + 1]
+        return [self.mirnas[mirna_id] for mirna_id in self.mirna_ids[start:end]]
+
+    def to_rows(self) -> List[list]:
+        return list(self)
+
+    def filter(self, p_value: Optional[float]=None, p_adjusted: Optional[float]=None, q_value: Optional[float]=None,
+               categories: Optional[Iterable[str]]=None, subcategories: Optional[Iterable[str]]=None,
+               enrichment: Optional[str]=None, min_size: Optional[int]=None,
+               max_size: Optional[int]=None) -> 'ResultsTable':
+        """ Return the rows matching all given conditions
+
+        Parameters
+        ----------
+        p_value, p_adjusted, q_value : float, optional
+            Keep rows whose value is at most the given threshold
+        categories, subcategories : iterable of str, optional
+            Keep rows in one of the given categories/subcategories
+        enrichment : str, optional
+            Keep rows with the given enrichment, e.g. `over-represented`
+        min_size, max_size : int, optional
+            Keep rows with at least/at most this many observed miRNAs/precursors
+        """
+        conditions = []
+        for column, threshold in ((self.p_values, p_value), (self.p_adjusted, p_adjusted), (self.q_values, q_value)):
+            if threshold is not None:
+                conditions.append((column, '<=', threshold))
+        if min_size is not None:
+            conditions.append((self.observed, '>=', min_size))
+        if max_size is not None:
+            conditions.append((self.observed, '<=', max_size))
+        if categories is not None:
+            conditions.append((self.category_ids, 'in', _pool_ids(self.categories, categories)))
+        if subcategories is not None:
+            conditions.append((self.subcategory_ids, 'in', _pool_ids(self.subcategories, subcategories)))
+        if enrichment is not None:
+            conditions.append((self.enrichment_ids, 'in', _pool_ids(self.enrichments, [enrichment])))
+        return self.take(_select(conditions, len(self)))
+
+    def readjust(self, p_value_adjustment: str='fdr', independent_p_adjust: bool=True,
+                 significance_level: float=0.05, threshold_level: int=2) -> 'ResultsTable':
+        """ Recompute adjusted p-values and q-values from the raw p-values and filter again, without a new job
+
+        Starting from unfiltered results (see the `unfiltered` argument of `API.run_ora` and `API.run_gsea`),
+        this gives the same rows as running the analysis with these parameters. Requires numpy.
+
+        Parameters
+        ----------
+        p_value_adjustment : str, default='fdr'
+            One of none, fdr, bonferroni, BY, hochberg, holm or hommel
+        independent_p_adjust : bool, default=True
+            * *True* - Adjust p-values for each category independently
+            * *False* - Adjust p-values for all categories collectively
+        significance_level : float, default=0.05
+            Filter out adjusted p-values above significance level
+        threshold_level : int, default=2
+            Filter out subcategories that contain less than this many miRNAs
+        """
+        require_numpy('ResultsTable.readjust')
+        p_values = _as_numpy(self.p_values)
+        groups = _as_numpy(self.category_ids)
+        p_adjusted = adjust_p_values_grouped(p_values, groups, p_value_adjustment, independent_p_adjust)
+        q_values = adjust_p_values_grouped(p_values, groups, 'fdr', independent_p_adjust)
+        keep = numpy.flatnonzero((p_adjusted <= significance_level) & (_as_numpy(self.observed) >= threshold_level))
+        table = self.take(keep)
+        table.p_adjusted = array('d', p_adjusted[keep].tobytes())
+        table.q_values = array('d', q_values[keep].tobytes())
+        return table
+
+    def sort(self, by: str='p-adjusted', ascending: bool=True) -> 'ResultsTable':
+        """ Return the table sorted by a numeric column, NaN values last """
+        values = self._numeric_column(by)
+        if numpy is not None:
+            return self.take(numpy.argsort(_numpy_keys(values, ascending), kind='stable'))
+        return self.take(sorted(range(len(values)), key=lambda index: _sort_key(values[index], ascending)))
+
+    def top_k(self, k: int, by: str='p-adjusted', ascending: bool=True) -> 'ResultsTable':
+        """ Return the `k` rows with the smallest (or largest if not `ascending`) values of a numeric column """
+        values = self._numeric_column(by)
+        k = max(0, min(k, len(values)))
+        if numpy is not None and k < len(values):
+            keys = _numpy_keys(values, ascending)
+            candidates = numpy.argpartition(keys, k - 1)[:k] if k else numpy.empty(0, dtype=int)
+            return self.take(candidates[numpy.argsort(keys[candidates], kind='stable')])
+        order = heapq.nsmallest(k, range(len(values)), key=lambda index: _sort_key(values[index], ascending))
+        return self.take(order)
+
+    def take(self, indices: Iterable[int]) -> 'ResultsTable':
+        """ Return a table with the given rows, in the given order """
+        indices = [int(index) for index in indices]
+        table = type(self)({'categories': self.categories, 'subcategories': self.subcategories,
+                            'enrichments': self.enrichments, 'mirnas': self.mirnas})
+        for name in ('category_ids', 'subcategory_ids', 'enrichment_ids', 'p_values', 'p_adjusted', 'q_values',
+                     'expected', 'observed'):
+            column = getattr(self, name)
+            if numpy is not None and indices:
+                getattr(table, name).frombytes(_as_numpy(column)[indices].tobytes())
+            else:
+                getattr(table, name).extend(column[index] for index in indices)
+        for index in indices:
+            table.mirna_ids.extend(self.mirna_ids[self.mirna_offsets[index]:self.mirna_offsets[index + 1]])
+            table.mirna_offsets.append(len(table.mirna_ids))
+        return table
+
+    def to_numpy(self) -> Dict[str, 'numpy.ndarray']:
+        """ Return the columns as NumPy arrays, numeric columns share memory with the table
+
+        Name columns are returned as integer ids together with `<name>_names` arrays, e.g. `categories[category_ids]`.
+        """
+        if numpy is None:
+            raise ImportError('to_numpy requires numpy, install it with `pip install mieaa[numpy]`')
+        return {
+            'category_ids': _as_numpy(self.category_ids),
+            'category_names': numpy.array(self.categories.strings, dtype=object),
+            'subcategory_ids': _as_numpy(self.subcategory_ids),
+            'subcategory_names': numpy.array(self.subcategories.strings, dtype=object),
+            'enrichment_ids': _as_numpy(self.enrichment_ids),
+            'enrichment_names': numpy.array(self.enrichments.strings, dtype=object),
+            'p-value': _as_numpy(self.p_values),
+            'p-adjusted': _as_numpy(self.p_adjusted),
+            'q-value': _as_numpy(self.q_values),
+            'expected': _as_numpy(self.expected),
+            'observed': _as_numpy(self.observed),
+            'mirna_offsets': _as_numpy(self.mirna_offsets),
+            'mirna_ids': _as_numpy(self.mirna_ids),
+            'mirna_names': numpy.array(self.mirnas.strings, dtype=object),
+        }
+
+    def to_pandas(self) -> 'pandas.DataFrame':
+        """ Return a DataFrame with the columns of `RESULT_COLUMNS`, names as categoricals """
+        try:
+            import pandas
+        except ImportError:
+            raise ImportError('to_pandas requires pandas, install it with `pip install mieaa[pandas]`')
+        columns = self.to_numpy()
+        frame = {}
+        for column, name in (('category', 'category'), ('subcategory', 'subcategory'), ('enrichment', 'enrichment')):
+            frame[column] = pandas.Categorical.from_codes(columns[name + '_ids'].astype('int64', copy=False),
+                                                          categories=columns[name + '_names'])
+        for column in NUMERIC_COLUMNS:
+            frame[column] = columns[column]
+        frame['mirnas/precursors'] = [MIRNA_SEPARATOR.join(self.row_mirnas(index)) for index in range(len(self))]
+        return pandas.DataFrame(frame, columns=RESULT_COLUMNS, copy=False)
+
+    def _append(self, row: Union[Sequence, dict]):
+        if isinstance(row, dict):
+            row = [row.get(column) for column in RESULT_COLUMNS]
+        self.category_ids.append(self.categories.intern(row[0]))
+        self.subcategory_ids.append(self.subcategories.intern(row[1]))
+        self.enrichment_ids.append(self.enrichments.intern(row[2]))
+        self.p_values.append(_float(row[3]))
+        self.p_adjusted.append(_float(row[4]))
+        self.q_values.append(_float(row[5]))
+        self.expected.append(_float(row[6]))
+        observed = _float(row[7])
+        self.observed.append(0 if math.isnan(observed) else int(observed))
+        mirnas = row[8] if len(row) > 8 else ''
+        if isinstance(mirnas, str):
+            mirnas = [mirna.strip() for mirna in mirnas.split(';')]
+        self.mirna_ids.extend(self.mirnas.intern(mirna) for mirna in mirnas if mirna)
+        self.mirna_offsets.append(len(self.mirna_ids))
+
+    def _numeric_column(self, name: str) -> array:
+        columns = {'p-value': self.p_values, 'p-adjusted': self.p_adjusted, 'q-value': self.q_values,
+                   'expected': self.expected, 'observed': self.observed}
+        if name not in columns:
+            raise ValueError('Column must be one of {}, got {!r}'.format(NUMERIC_COLUMNS, name))
+        return columns[name]
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _pool_ids(pool: StringPool, names: Iterable[str]) -> set:
+    return {pool.id(name) for name in names} - {None}
+
+
+def _as_numpy(column: array) -> 'numpy.ndarray':
+    """ View an array as a NumPy array without copying """
+    if not len(column):
+        return numpy.empty(0, dtype=column.typecode)
+    return numpy.frombuffer(column, dtype=column.typecode)
+
+
+def _select(conditions: list, length: int) -> Iterable[int]:
+    """ Indices of rows meeting all `(column, operator, value)` conditions """
+    if numpy is not None:
+        mask = numpy.ones(length, dtype=bool)
+        for column, operator, value in conditions:
+            values = _as_numpy(column)
+            if operator == '<=':
+                mask &= values <= value
+            elif operator == '>=':
+                mask &= values >= value
+            else:
+                mask &= numpy.isin(values, numpy.fromiter(value, dtype=values.dtype, count=len(value)))
+        return numpy.flatnonzero(mask)
+
+    indices = range(length)
+    for column, operator, value in conditions:
+        if operator == '<=':
+            indices = [index for index in indices if column[index] <= value]
+        elif operator == '>=':
+            indices = [index for index in indices if column[index] >= value]
+        else:
+            indices = [index for index in indices if column[index] in value]
+    return indices
+
+
+def _sort_key(value: float, ascending: bool) -> tuple:
+    if value != value:  # NaN
+        return 1, 0.
+    return 0, value if ascending else -value
+
+
+def _numpy_keys(column: array, ascending: bool) -> 'numpy.ndarray':
+    """ Sort keys of a numeric column, placing NaN values last """
+    values = _as_numpy(column).astype('float64')
+    return numpy.where(numpy.isnan(values), numpy.inf, values if ascending else -values)
@@ -0,0 +1,273 @@
+import random
+import threading
+from time import monotonic, sleep
+from typing import Optional, Sequence
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError
+
+from mieaa.mieaa_ratelimit import parse_retry_after
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """ Raised without contacting the server while the circuit breaker is open """
+
+
+class RetryPolicy:
+    """ Decides which failed requests are repeated and how long to wait in between
+
+    Idempotent requests are retried after connection errors, timeouts and server errors. Other requests,
+    i.e. job submissions, are only resent when the server cannot have processed them: when the
+    connection could not be established, or the server refused them with one of `resend_statuses`
+    and a Retry-After header.
+
+    Attributes
+    ----------
+    retries : int
+        How many times a request is repeated at most
+    backoff : float
+        Wait before the first retry, doubled for every further retry
+    max_backoff : float
+        Longest wait between retries
+    jitter : float
+        Relative random variation of every wait, e.g. 0.1 for +/- 10%
+    statuses : tuple of int
+        Status codes after which idempotent requests are retried
+    resend_statuses : tuple of int
+        Status codes after which any request is retried if the response has a Retry-After header
+    idempotent_methods : tuple of str
+        HTTP methods that can safely be repeated
+    idempotent_paths : tuple of str
+        URL path endings of POST endpoints that can safely be repeated, i.e. the converters
+    """
+    def __init__(self, retries: int=3, backoff: float=.5, max_backoff: float=30., jitter: float=.1,
+                 statuses: Sequence[int]=(500, 502, 503, 504), resend_statuses: Sequence[int]=(503,),
+                 idempotent_methods: Sequence[str]=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'),
+                 idempotent_paths: Sequence[str]=('mirbase_converter/', 'mirna_precursor_converter/')):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = tuple(statuses)
+        self.resend_statuses = tuple(resend_statuses)
+        self.idempotent_methods = tuple(idempotent_methods)
+        self.idempotent_paths = tuple(idempotent_paths)
+
+    def is_idempotent(self, method: str, url: str) -> bool:
+        return method.upper() in self.idempotent_methods or urlsplit(url).path.endswith(self.idempotent_paths)
+
+    def retry_status(self, method: str, url: str, status: int, retry_after: Optional[str]=None) -> bool:
+        """ Whether a response with `status` and the Retry-After header `retry_after` should be retried """
+        if status in self.resend_statuses and retry_after is not None:
+            return True
+        return status in self.statuses and self.is_idempotent(method, url)
+
+    def retry_error(self, method: str, url: str, error: Exception) -> bool:
+        """ Whether a request that raised `error` should be retried """
+        if isinstance(error, CircuitOpenError):
+            return False
+        return not request_was_sent(error) or self.is_idempotent(method, url)
+
+    def delay(self, retry: int, retry_after: Optional[str]=None) -> float:
+        """ Seconds to wait before the `retry`-th retry, counting from 0, honouring a Retry-After header """
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return min(self.max_backoff, server_delay)
+        delay = min(self.max_backoff, self.backoff * 2 ** retry)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def __repr__(self):
+        return '{}(retries={}, backoff={}, max_backoff={})'.format(
+            type(self).__name__, self.retries, self.backoff, self.max_backoff)
+
+
+class CircuitBreaker:
+    """ Fail fast while the server is unreachable
+
+    After `failure_threshold` consecutive failed requests the circuit opens and requests raise
+    `CircuitOpenError` without contacting the server. Once `reset_timeout` seconds passed, a single
+    trial request is let through: the circuit closes if it succeeds and opens again otherwise.
+    Thread safe, so one breaker can guard all sessions of a process.
+
+    Attributes
+    ----------
+    failure_threshold : int
+        Consecutive failures that open the circuit
+    reset_timeout : float
+        Seconds the circuit stays open before a trial request
+    """
+    def __init__(self, failure_threshold: int=5, reset_timeout: float=30.):
+        if failure_threshold < 1:
+            raise ValueError('failure_threshold must be at least 1')
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def before_request(self):
+        """ Raise `CircuitOpenError` if requests should not be sent right now """
+        with self._lock:
+            state = self._state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            retry_in = max(0., self._opened_at + self.reset_timeout - monotonic())
+            raise CircuitOpenError('Circuit breaker is open after {} consecutive failures, retry in {:.1f}s'.format(
+                self._failures, retry_in))
+
+    def record(self, success: bool):
+        """ Record the outcome of a request: reaching the server counts as success, server errors do not """
+        if success:
+            self.record_success()
+        else:
+            self.record_failure()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = monotonic()
+            self._trial_running = False
+
+    def reset(self):
+        self.record_success()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return CLOSED
+        if monotonic() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return OPEN
+
+    def __repr__(self):
+        return '{}(state={!r}, failures={})'.format(type(self).__name__, self.state, self._failures)
+
+
+class ResilientAdapter(HTTPAdapter):
+    """ Pooled HTTP adapter retrying failed requests behind a circuit breaker
+
+    Mounted by `API_Session`; 429 responses are passed through, as they are retried by the session's rate limiter.
+
+    Attributes
+    ----------
+    retry_policy : RetryPolicy
+        Which requests are retried and how long to wait in between
+    circuit_breaker : CircuitBreaker or None
+        Breaker shared with other adapters talking to the same server
+    shared : bool
+        Whether the adapter is shared by many sessions, see `shared_adapter`, so closing a session keeps it open
+    """
+    def __init__(self, pool_size: int=10, retry_policy: Optional[RetryPolicy]=None,
+                 circuit_breaker: Optional[CircuitBreaker]=None, pool_block: bool=False):
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.circuit_breaker = circuit_breaker
+        self.shared = False
+        super().__init__(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=pool_block)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        """ Send a request, retrying it according to `retry_policy`
+
+        The number of retries is stored in the `transport_retries` attribute of the response.
+        """
+        policy = self.retry_policy
+        for retry in range(policy.retries + 1):
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request()
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record(False)
+                if retry == policy.retries or not policy.retry_error(request.method, request.url, err):
+                    raise
+                sleep(policy.delay(retry))
+                _rewind_body(request)
+                continue
+            except BaseException:
+                # any failure ends a half-open trial, otherwise the breaker would never close again
+                if self.circuit_breaker is not None:
+                    self.circuit_breaker.record(False)
+                raise
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.record(response.status_code < 500)
+            if retry == policy.retries or not policy.retry_status(request.method, request.url, response.status_code,
+                                                                  response.headers.get('Retry-After')):
+                response.transport_retries = retry
+                return response
+            delay = policy.delay(retry, response.headers.get('Retry-After'))
+            response.close()
+            sleep(delay)
+            _rewind_body(request)
+
+
+_shared_adapters = {}
+_shared_adapters_lock = threading.Lock()
+
+
+def shared_adapter(pool_size: int=10, retry_policy: Optional[RetryPolicy]=None,
+                   circuit_breaker: Optional[CircuitBreaker]=None) -> ResilientAdapter:
+    """ Get the process-wide adapter for a pool size, retry policy and circuit breaker
+
+    All sessions configured alike send requests through the same thread-safe connection pool, so new
+    sessions reuse warm keep-alive connections instead of opening new ones.
+
+    Parameters
+    ----------
+    pool_size : int, default=10
+        Number of connections kept open per host
+    retry_policy : RetryPolicy, optional
+        Which failed requests are retried, defaults to a `RetryPolicy` with default settings
+    circuit_breaker : CircuitBreaker, optional
+        Breaker guarding the adapter's requests
+
+    Returns
+    -------
+    ResilientAdapter
+        Adapter shared by all sessions using the same configuration
+    """
+    key = (pool_size, id(retry_policy), id(circuit_breaker))
+    with _shared_adapters_lock:
+        adapter = _shared_adapters.get(key)
+        if adapter is None:
+            # the adapter references the policy and breaker, so their ids are not reused while it is cached
+            adapter = ResilientAdapter(pool_size, retry_policy, circuit_breaker)
+            adapter.shared = True
+            _shared_adapters[key] = adapter
+        return adapter
+
+
+def request_was_sent(error: Exception) -> bool:
+    """ Whether a request failing with `error` may have reached the server """
+    if isinstance(error, (requests.exceptions.ConnectTimeout, CircuitOpenError)):
+        return False
+    reason = error.args[0] if error.args else None
+    reason = getattr(reason, 'reason', reason)
+    return not isinstance(reason, ConnectTimeoutError)
+
+
+def _rewind_body(request: requests.PreparedRequest):
+    """ Seek a file body back to the start so the request can be resent """
+    if hasattr(request.body, 'seek'):
+        request.body.seek(0)
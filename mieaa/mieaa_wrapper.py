@@ -1,13 +1,30 @@
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import copy
 from datetime import datetime
 from io import IOBase
+import json
+import os
 from re import findall
-from time import sleep, time
-from typing import List, IO, Iterable, Union
+import sqlite3
+from time import monotonic, sleep, time
+from typing import TYPE_CHECKING, Callable, Dict, List, IO, Iterable, Iterator, Optional, Union
 import warnings
-import webbrowser
 
 import requests
 
+from mieaa.mieaa_cache import CatalogEntry, CategoryCatalog, request_key, split_ids
+from mieaa.mieaa_jobs import FAILED, FINISHED, RUNNING, JobRecord, SQLiteJobStore
+from mieaa.mieaa_metrics import Instrumentation, get_instrumentation
+from mieaa.mieaa_polling import AdaptiveBackoff, PollingStrategy, resolve_strategy
+from mieaa.mieaa_ratelimit import TokenBucket, parse_retry_after, shared_limiter
+from mieaa.mieaa_results import DEFAULT_CHUNK_SIZE, ResultsSink
+from mieaa.mieaa_table import ResultsTable
+from mieaa.mieaa_transport import CircuitBreaker, CircuitOpenError, RetryPolicy, shared_adapter
+
+if TYPE_CHECKING:  # imports this module
+    from mieaa.mieaa_futures import JobFuture
+
 
 def descriptive_http_error(response):
     try:
@@ -16,22 +33,195 @@ def descriptive_http_error(response):
         raise requests.HTTPError('{}\nResponse: {}'.format(err, response.text))
 
 
+def format_categories(categories: str, mirna_type: str, index: Dict[str, str]) -> List[str]:
+    """ Match user provided category names to the correctly cased, suffixed server names
+
+    Parameters
+    ----------
+    categories : str
+        Delimited category names, with or without suffix
+    mirna_type : str
+        * *precursor* - Precursor to a mature miRNA, e.g. hsa-mir-550b-1
+        * *mirna* - Mature miRNA, e.g. hsa-miR-199a-5p
+    index : dict
+        Maps lowercase suffixed category names to server names, see `CatalogEntry.index`
+    """
+    categories = findall(r'\b\w+\b', categories)
+    suffix = '_precursor' if mirna_type == 'precursor' else '_mature'
+    # add suffix to provided categories
+    categories = [cat if cat.endswith(suffix) else cat + suffix for cat in categories]
+    return [index.get(cat.lower(), cat) for cat in categories]
+
+
+def _iter_ids(mirnas: Union[str, Iterable[str], IO]) -> Iterator[str]:
+    """ Lazily split a delimited string, iterable or file of miRNAs into ids """
+    if isinstance(mirnas, str):
+        yield from split_ids(mirnas)
+        return
+    for line in mirnas:
+        yield from split_ids(line)
+
+
+def _decoded_lines(file: IO) -> Iterator[str]:
+    """ Lines of a file opened in text or binary mode """
+    for line in file:
+        yield line.decode() if isinstance(line, bytes) else line
+
+
+def _chunked(ids: Iterator[str], chunk_size: int) -> Iterator[List[str]]:
+    chunk = []
+    for mirna in ids:
+        chunk.append(mirna)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _emit(lines: List[str], savefile: Optional[IO]) -> Iterator[str]:
+    """ Yield converted lines, writing them to a file if provided """
+    if savefile is not None:
+        savefile.writelines(line + '\n' for line in lines)
+    yield from lines
+
+
+def _text_response(text: str, url: str='') -> requests.Response:
+    """ Wrap locally available content in a response object """
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.encoding = 'utf-8'
+    response._content = text.encode('utf-8')
+    return response
+
+
+def _body_size(body) -> int:
+    if body is None:
+        return 0
+    if isinstance(body, (str, bytes)):
+        return len(body)
+    return 0  # streamed body of unknown size
+
+
+def _response_size(response: requests.Response, streamed: bool) -> int:
+    """ Size of a response body as transferred, without consuming streamed bodies """
+    length = response.headers.get('Content-Length')
+    if length and length.isdigit():
+        return int(length)
+    return 0 if streamed else len(response.content)
+
+
+def _rewind_files(files):
+    """ Seek uploaded files back to the start so a request can be resent """
+    for upload in (files or {}).values():
+        if hasattr(upload, 'seek'):
+            upload.seek(0)
+
+
 class API_Session(requests.Session):
-    """ Extend requests.Session to allow waiting a specified number of sessions between requests """
-    def __init__(self, *args, **kwargs):
+    """ Extend requests.Session to rate limit requests
+
+    Requests draw from a token-bucket limiter shared by all sessions in the process (see
+    `mieaa_ratelimit.shared_limiter`), so concurrent API instances respect the server throttle.
+    Requests rejected with 429 are retried after the server's `Retry-After` delay.
+    Connection errors and server errors are retried by a `ResilientAdapter` according to `retry_policy`,
+    and all sessions share one `circuit_breaker` that fails fast while the server is down.
+    Sessions send requests through a connection pool shared by all sessions in the process (see
+    `mieaa_transport.shared_adapter`), so creating and closing sessions keeps connections warm.
+
+    Attributes
+    ----------
+    limiter : TokenBucket or None
+        Limiter to use instead of the process-wide limiter
+    instrumentation : Instrumentation or None
+        Receives an event for every request, instead of the process-wide instrumentation
+        (see `mieaa_metrics.set_instrumentation`)
+    throttle_retries [class attribute] : int
+        How many times to retry a request rejected with 429
+    pool_size [class attribute] : int
+        Number of connections kept open per host, in the shared pool
+    keep_alive [class attribute] : bool
+        Whether connections are reused between requests
+    retry_policy [class attribute] : RetryPolicy
+        Which failed requests are retried and how long to wait in between
+    circuit_breaker [class attribute] : CircuitBreaker or None
+        Breaker shared by all sessions, None to disable
+    timeout [class attribute] : float or tuple or None
+        Default connect and read timeout of requests in seconds, so a hanging server fails requests and trips
+        the circuit breaker instead of blocking forever. None to wait indefinitely
+    """
+    throttle_retries = 3
+    pool_size = 10
+    keep_alive = True
+    retry_policy = RetryPolicy()
+    circuit_breaker = CircuitBreaker()
+    timeout = (10., 300.)
+
+    def __init__(self, *args, limiter: TokenBucket=None, instrumentation: Instrumentation=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.limiter = limiter
+        self.instrumentation = instrumentation
         self.last_request = time()
-
-    def wait_request(self, *args, **kwargs):
-        """ Wait specified number of seconds between requests """
+        adapter = shared_adapter(self.pool_size, self.retry_policy, self.circuit_breaker)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        if not self.keep_alive:
+            self.headers['Connection'] = 'close'
+
+    def request(self, method, url, *args, **kwargs):
+        """ Send a request, with `timeout` unless one is given """
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(method, url, *args, **kwargs)
+
+    def close(self):
+        """ Close adapters owned by this session, leaving the shared connection pool open """
+        for adapter in self.adapters.values():
+            if not getattr(adapter, 'shared', False):
+                adapter.close()
+
+    def wait_request(self, method, url, *args, **kwargs):
+        """ Send a request once the rate limiter allows it
+
+        The `wait` keyword sets the seconds required between requests and `endpoint` names the
+        endpoint in `API.endpoints` the request is recorded under.
+        """
         wait = kwargs.pop('wait', 1)
-        elapsed = time() - self.last_request
-        wait += .1  # wait just a tad bit longer to allow time to send request
-        if elapsed < wait:
-            sleep(wait - elapsed)
-        request = self.request(*args, **kwargs)
-        self.last_request = time()
-        return request
+        endpoint = kwargs.pop('endpoint', 'other')
+        limiter = self.limiter or shared_limiter(wait)
+        instrumentation = self.instrumentation or get_instrumentation()
+        throttle_wait = latency = 0.
+        bytes_sent = bytes_received = retries = 0
+        response = None
+        try:
+            for attempt in range(self.throttle_retries + 1):
+                started = monotonic()
+                limiter.acquire()
+                sent = monotonic()
+                throttle_wait += sent - started
+                response = None
+                try:
+                    response = self.request(method, url, *args, **kwargs)
+                finally:
+                    latency += monotonic() - sent
+                self.last_request = time()
+                if instrumentation is not None:
+                    retries += getattr(response, 'transport_retries', 0)
+                    bytes_sent += _body_size(response.request.body)
+                    bytes_received += _response_size(response, kwargs.get('stream', False))
+                if response.status_code != 429:
+                    limiter.recovered()
+                    return response
+                limiter.throttled(parse_retry_after(response.headers.get('Retry-After')))
+                if attempt < self.throttle_retries:
+                    response.close()
+                    _rewind_files(kwargs.get('files'))
+            return response
+        finally:
+            if instrumentation is not None:
+                status = None if response is None else response.status_code
+                instrumentation.request_completed(endpoint, method, status, latency, throttle_wait, bytes_sent,
+                                                  bytes_received, attempt + retries)
 
     def wait_post(self, *args, **kwargs):
         return self.wait_request('POST', *args, **kwargs)
@@ -57,10 +247,24 @@ class API:
         How many seconds to wait between API requests (due to throttling)
     default [class attribute] : dict
         Default settings to pass to converter or analysis apis
-    jobs [class attribute] : dict
-        Access jobs run by any API instances, keys are job_id and values are enrichment parameters
+    jobs [class attribute] : JobStore or None
+        Access jobs run by any API instances, persisted in `jobs.sqlite` in `default_cache_dir()` by default.
+        Can be indexed like a dict, keys are job_id and values are enrichment parameters.
+        None if `$MIEAA_NO_JOB_STORE` is set, or set to None, to not record jobs
+    category_catalog [class attribute] : CategoryCatalog
+        Cache of enrichment categories shared by all API instances
+    result_cache [class attribute] : ResultCache or None
+        If set, identical analyses are answered from this cache instead of starting a new job
+    mirbase_index [class attribute] : MirbaseIndex or None
+        If set, miRBase versions contained in the index are converted locally
+    id_cache [class attribute] : IdCache or None
+        If set, converters only send ids that are not already cached to the server
+    polling_strategy [class attribute] : PollingStrategy
+        Decides how long `get_results` waits between progress checks by default
+    poll_scheduler [class attribute] : PollScheduler or None
+        Polls jobs started with `submit_ora` and `submit_gsea`, defaults to a process-wide scheduler
     session [instance attribute] : API_Session
-        Session information necessary to retrieve results
+        Session sending requests, through a connection pool shared by all instances
     job_id [instance attribute] : uuid
         Unique identifier for enrichment analysis job of current session
     """
@@ -89,23 +293,40 @@ class API:
             'independent_p_adjust': True,
             'significance_level': 0.05,
             'threshold_level': 2,
+        },
+        # analysis parameters that return all subcategories with raw p-values
+        'unfiltered': {
+            'p_value_adjustment': 'none',
+            'significance_level': 1,
+            'threshold_level': 0,
         }
     }
 
-    jobs = dict()
+    jobs = None if os.environ.get('MIEAA_NO_JOB_STORE') else SQLiteJobStore()
+    category_catalog = CategoryCatalog()
+    result_cache = None
+    mirbase_index = None
+    id_cache = None
+    polling_strategy = AdaptiveBackoff()
+    poll_scheduler = None
 
     def __init__(self):
         self.session = API_Session()
+        self._reset_job()
+
+    def new_session(self):
+        """ Start a new session, clearing all job results. Pooled connections are kept open for reuse """
+        self._reset_job()
+
+    def _reset_job(self):
         self.job_id = None
         self._enrichment_parameters = None
         self._cached_results_type = None
+        self._request_key = None
+        self._submitted_at = None
+        self._recorded_progress = None
         self.results_response = None
 
-    def new_session(self):
-        """ Start a new session, clearing all job results """
-        self.session.close()
-        self.__init__()
-
     # TODO deprecate in next release
     def invalidate(self):
         """ Invalidate current session. Results will become irretrievable."""
@@ -113,13 +334,20 @@ class API:
         self.new_session()
 
     def load_job(self, job_id):
+        """ Continue working with a previously started job, restoring its parameters from the job store """
         self.new_session()
         self.job_id = job_id
+        record = self._job_store('get_record', job_id)
+        if record is not None:
+            self._enrichment_parameters = record.parameters
+            self._submitted_at = record.created
 
     def convert_mirbase(self, mirnas: Union[str, Iterable[str], IO], from_version: float, to_version: float,
-                        mirna_type: str, to_file: Union[str, IO]='', **kwargs) -> List[str]:
+                        mirna_type: str, to_file: Union[str, IO]='', fallback: bool=True, **kwargs) -> List[str]:
         """ Convert a set of either miRNAs/precursors from one miRbase version to another
 
+        If `mirbase_index` is set and contains both versions, the conversion is done locally.
+
         Parameters
         -----------
         mirnas : str or iterable
@@ -135,6 +363,9 @@ class API:
             Mixed input is not currently supported.
         to_file : str or file-type, optional
             if non-empty, save results to provided file name/path
+        fallback : bool, default=True
+            When converting locally, send ids missing from `mirbase_index` to the server.
+            Otherwise they are output as empty conversions
         **kwargs
             output_format (str, default='oneline')
                 * *oneline* - Text containing only converted ids
@@ -147,6 +378,10 @@ class API:
         """
         if isinstance(mirnas, IOBase):
             mirnas = mirnas.read().splitlines()
+        if self.mirbase_index is not None and self.mirbase_index.has_versions(from_version, to_version, mirna_type):
+            mirnas = split_ids(mirnas if isinstance(mirnas, str) else ';'.join(mirnas))
+            return self._convert_mirbase_offline(mirnas, from_version, to_version, mirna_type, to_file, fallback,
+                                                 kwargs)
         if not isinstance(mirnas, str):
             mirnas = ';'.join(mirnas)
         base_payload = {
@@ -158,6 +393,31 @@ class API:
 
         return self._convert('mirbase_converter', base_payload, to_file, kwargs)
 
+    def _convert_mirbase_offline(self, mirnas: List[str], from_version: float, to_version: float, mirna_type: str,
+                                 to_file: Union[str, IO], fallback: bool, default_overrides: dict) -> List[str]:
+        """ Convert miRBase versions using `mirbase_index`, asking the server only for unknown ids """
+        output_format = self._extend_payload({}, default_overrides, 'converter')['output_format']
+        converted = dict(zip(mirnas, self.mirbase_index.convert(mirnas, from_version, to_version, mirna_type)))
+        missing = [mirna for mirna, result in converted.items() if result is None]
+        if missing and fallback:
+            base_payload = {
+                'mirnas': ';'.join(missing),
+                'input_type': mirna_type.lower(),
+                'mirbase_input_version': 'v{}'.format(from_version),
+                'mirbase_output_version': 'v{}'.format(to_version),
+            }
+            for line in self._convert('mirbase_converter', base_payload, '', {**default_overrides,
+                                                                              'output_format': 'tabsep'}):
+                original, _, result = line.partition('\t')
+                converted[original] = result
+
+        if output_format == 'tabsep':
+            lines = ['{}\t{}'.format(mirna, converted[mirna] or '') for mirna in mirnas]
+        else:
+            lines = [converted[mirna] or '' for mirna in mirnas]
+        self._save_converted('\n'.join(lines), to_file)
+        return lines
+
     def _convert_mirna_type(self, mirnas: Union[str, Iterable[str], IO], conversion: str,
                             to_file: Union[str, IO]='', **kwargs) -> List[str]:
         """ Convert from precursor->mirna or mirna-> precursor
@@ -248,6 +508,58 @@ class API:
         """
         return self._convert_mirna_type(mirnas, 'to_precursor', to_file, **kwargs)
 
+    def iter_convert_mirbase(self, mirnas: Union[str, Iterable[str], IO], from_version: float, to_version: float,
+                             mirna_type: str, to_file: Union[str, IO]='', chunk_size: int=5000,
+                             max_workers: int=4, **kwargs) -> Iterator[str]:
+        """ Lazily convert a large set of miRNAs/precursors from one miRbase version to another
+
+        Input is read lazily and sent in chunks of `chunk_size` ids, with up to `max_workers` chunks converted
+        concurrently within the rate limit. Converted lines are yielded in input order as they arrive,
+        so memory use stays bounded regardless of the input size.
+
+        Parameters
+        -----------
+        mirnas : str, iterable or file-like
+            Iterable, file or delimited string of miRNAs, e.g. 'hsa-miR-199a-5p,hsa-mir-550b-1;'
+        from_version : float
+            MiRbase version to convert 'mirnas' from.
+        to_version : float
+            MiRbase version to update 'mirnas' to.
+        mirna_type : str
+            * *precursor* - Precursor to a mature miRNA, e.g. hsa-mir-550b-1
+            * *mirna* - Mature miRNA, e.g. hsa-miR-199a-5p
+        to_file : str or file-type, optional
+            if non-empty, also write converted lines to provided file name/path as they are yielded
+        chunk_size : int, default=5000
+            Number of ids sent per request
+        max_workers : int, default=4
+            Number of chunks converted concurrently
+        **kwargs
+            Same as `convert_mirbase`
+
+        Yields
+        ------
+        str
+            Converted lines in input order
+        """
+        def convert_chunk(chunk):
+            return self.convert_mirbase(chunk, from_version, to_version, mirna_type, **kwargs)
+        return self._iter_convert(convert_chunk, mirnas, to_file, chunk_size, max_workers)
+
+    def iter_to_mirna(self, mirnas: Union[str, Iterable[str], IO], to_file: Union[str, IO]='', chunk_size: int=5000,
+                      max_workers: int=4, **kwargs) -> Iterator[str]:
+        """ Lazily convert a large set of precursors to miRNAs in chunks, see `iter_convert_mirbase` and `to_mirna` """
+        def convert_chunk(chunk):
+            return self._convert_mirna_type(chunk, 'to_mirna', **kwargs)
+        return self._iter_convert(convert_chunk, mirnas, to_file, chunk_size, max_workers)
+
+    def iter_to_precursor(self, mirnas: Union[str, Iterable[str], IO], to_file: Union[str, IO]='',
+                          chunk_size: int=5000, max_workers: int=4, **kwargs) -> Iterator[str]:
+        """ Lazily convert a large set of miRNAs to precursors in chunks, see `iter_convert_mirbase` and `to_precursor` """
+        def convert_chunk(chunk):
+            return self._convert_mirna_type(chunk, 'to_precursor', **kwargs)
+        return self._iter_convert(convert_chunk, mirnas, to_file, chunk_size, max_workers)
+
     def _start_analysis(self, analysis_type: str, test_set: Union[str, Iterable, IO],
                        categories: Union[str, Iterable, IOBase], mirna_type: str, species: str,
                        reference_set: Union[str, Iterable, IOBase]='', **kwargs) -> requests.Response:
@@ -295,21 +607,16 @@ class API:
                 Filter out p-values above significance level
             threshold_level (int, default=2)
                 Filter out subcategories that contain less than this many miRNAs
+            unfiltered (bool, default=False)
+                Retrieve all subcategories with unadjusted p-values, ignoring the options above, so that
+                they can be adjusted and filtered locally with `ResultsTable.readjust`
 
         Returns
         -------
         requests.Response
-            Response
+            Response. If `result_cache` holds results of an identical request, no job is started and the
+            response only contains the cached job ID
         """
-        def format_categories(categories, mirna_type, species):
-            categories = findall(r'\b\w+\b', categories)
-            suffix = '_precursor' if mirna_type == 'precursor' else '_mature'
-            # map lowercase names to category name
-            cased = {key.lower() + suffix: key + suffix for key in self.get_enrichment_categories(mirna_type, species)}
-            # add suffix to provided categories
-            categories = [cat if cat.endswith(suffix) else cat + suffix for cat in categories]
-            return [cased.get(cat.lower(), cat) for cat in categories]
-
         if self.job_id:
             raise RuntimeError("Please call the `new_session()` method before starting a new analysis.")
 
@@ -320,10 +627,12 @@ class API:
             categories = categories if isinstance(categories, str) else ';'.join(categories)
 
         base_payload = {
-            'categories': format_categories(categories, mirna_type, species)
+            'categories': format_categories(categories, mirna_type, self._category_entry(mirna_type, species).index)
         }
         files = {}
 
+        if kwargs.pop('unfiltered', False):
+            kwargs.update(self.default_params['unfiltered'])
         payload = self._extend_payload(base_payload, kwargs, 'analysis')
 
         # check if test set is file or string
@@ -342,7 +651,26 @@ class API:
         url = self._get_endpoint('enrichment', species=species.lower(),
                                  analysis=analysis_type.upper(), mirna=mirna_type.lower())
 
-        response = self.session.wait_post(url, data=payload, files=files, wait=self.wait_between_requests)
+        if self.result_cache is not None:
+            # hashing requires the complete request, so file contents are sent as delimited sets
+            for file_key, payload_key in (('testset_file', 'testset'), ('reference_set_file', 'reference_set')):
+                if file_key in files:
+                    payload[payload_key] = ';'.join(_iter_ids(_decoded_lines(files.pop(file_key))))
+            params = {key: value for key, value in payload.items()
+                      if key not in ('categories', 'testset', 'reference_set')}
+            self._request_key = request_key(analysis_type, species, mirna_type, payload['testset'],
+                                            payload['reference_set'], payload['categories'], params)
+            cached_job_id = self.result_cache.job_id(self._request_key)
+            if cached_job_id:
+                self.job_id = cached_job_id
+                self._submitted_at = time()
+                self._enrichment_parameters = {'time': str(datetime.now()), 'enrichment_analysis': analysis_type,
+                                               **payload}
+                self._record_job(analysis_type, species, mirna_type)
+                return _text_response(json.dumps({'job_id': cached_job_id}), url)
+
+        response = self.session.wait_post(url, data=payload, files=files, wait=self.wait_between_requests,
+                                          endpoint='enrichment')
         descriptive_http_error(response)
 
         try:
@@ -352,8 +680,10 @@ class API:
             print(response.text)
             return response
 
-        self._enrichment_parameters = {'time': str(datetime.now()), 'enrichment_analysis': analysis_type, **payload, **files}
-        self.jobs[self.job_id] = self._enrichment_parameters
+        self._submitted_at = time()
+        self._enrichment_parameters = {'time': str(datetime.now()), 'enrichment_analysis': analysis_type, **payload,
+                                       **{key: getattr(file, 'name', '') for key, file in files.items()}}
+        self._record_job(analysis_type, species, mirna_type)
         return response
 
     def run_ora(self, test_set: Union[str, Iterable, IO], categories: Iterable, mirna_type: str,
@@ -399,6 +729,9 @@ class API:
                 Filter out p-values above significance level
             threshold_level (int, default=2)
                 Filter out subcategories that contain less than this many miRNAs
+            unfiltered (bool, default=False)
+                Retrieve all subcategories with unadjusted p-values, ignoring the options above, so that
+                they can be adjusted and filtered locally with `ResultsTable.readjust`
 
         Returns
         -------
@@ -448,6 +781,9 @@ class API:
                 Filter out p-values above significance level
             threshold_level (int, default=2)
                 Filter out subcategories that contain less than this many miRNAs
+            unfiltered (bool, default=False)
+                Retrieve all subcategories with unadjusted p-values, ignoring the options above, so that
+                they can be adjusted and filtered locally with `ResultsTable.readjust`
 
         Returns
         -------
@@ -456,19 +792,75 @@ class API:
         """
         return self._start_analysis('GSEA',  test_set, categories, mirna_type, species, '', **kwargs)
 
+    def submit_ora(self, test_set: Union[str, Iterable, IO], categories: Iterable, mirna_type: str, species: str,
+                   reference_set: Union[str, IOBase]='', results_format: str='json', **kwargs) -> 'JobFuture':
+        """ Start Over Enrichment Analysis without waiting for its results
+
+        The analysis is submitted right away and then polled in the background by `poll_scheduler`.
+        Unlike `run_ora`, the instance is not tied to the job, so any number of analyses can be submitted.
+
+        Parameters
+        -----------
+        test_set, categories, mirna_type, species, reference_set, **kwargs
+            See `run_ora`
+        results_format : str, default='json'
+            * *json* - retrieve results in json format
+            * *csv* - retrieve results in csv format
+
+        Returns
+        -------
+        JobFuture
+            `concurrent.futures.Future` resolving to the results, with the job ID in its `job_id` attribute
+
+        Examples
+        --------
+        >>> future = API().submit_ora(test_set, ['HMDD'], 'precursor', 'hsa')
+        >>> future.add_done_callback(lambda done: print(done.job_id, len(done.result())))
+        >>> results = future.result(timeout=600)
+        """
+        return self._submit('ORA', test_set, categories, mirna_type, species, reference_set, results_format, kwargs)
+
+    def submit_gsea(self, test_set: Union[str, Iterable, IO], categories: Iterable, mirna_type: str, species: str,
+                    results_format: str='json', **kwargs) -> 'JobFuture':
+        """ Start miRNA Set Enrichment Analysis without waiting for its results, see `submit_ora` and `run_gsea` """
+        return self._submit('GSEA', test_set, categories, mirna_type, species, '', results_format, kwargs)
+
+    def _submit(self, analysis_type: str, test_set, categories, mirna_type: str, species: str, reference_set,
+                results_format: str, kwargs: dict) -> 'JobFuture':
+        # imported here, as the scheduler polls jobs with instances of this class
+        from mieaa.mieaa_futures import JobFuture, default_scheduler
+
+        # a copy keeps the caller's settings and session, while the caller's own job is left untouched
+        job = copy.copy(self)
+        job._reset_job()
+        job._start_analysis(analysis_type, test_set, categories, mirna_type, species, reference_set, **kwargs)
+        if not job.job_id:
+            raise RuntimeError('Job submission failed')
+        if job._request_key and job.result_cache is not None and \
+                job.result_cache.get(job._request_key, results_format) is not None:
+            future = JobFuture(job.job_id, results_format)
+            future.set_running_or_notify_cancel()
+            future.set_result(job.get_results(results_format))
+            return future
+        scheduler = job.poll_scheduler or default_scheduler()
+        return scheduler.submit(job, results_format, strategy=job.polling_strategy)
+
     def _get_progress_response(self):
         if not self.job_id:
             raise RuntimeError('No enrichment analysis has been initiated.')
         url = self._get_endpoint('status', job_id=self.job_id)
-        response = self.session.wait_get(url, wait=self.wait_between_requests)
+        response = self.session.wait_get(url, wait=self.wait_between_requests, endpoint='status')
         descriptive_http_error(response)
         return response
 
     def get_progress(self):
         """ Retrieve enrichment analysis progress """
-        return self._get_progress_response().json()['status']
+        progress = self._get_progress_response().json()['status']
+        self._record_progress(progress)
+        return progress
 
-    def get_results(self, results_format: str='json', check_progress_interval: float=5., retries=5) -> Union[str, list]:
+    def get_results(self, results_format: str='json', check_progress_interval: Union[float, PollingStrategy]=None,
+                    retries=5, as_table: bool=False) -> Union[str, list, ResultsTable]:
         """ Return results in json or csv format
 
         Parameters
@@ -476,44 +868,172 @@ class API:
         results_format: str, default='json'
             * *json* - retrieve results in json format
             * *csv* - retrieve results in csv format
-        check_progress_interval: float
-            How many seconds to wait between checking if results have been computed
+        check_progress_interval: float or PollingStrategy, optional
+            How many seconds to wait between checking if results have been computed,
+            or a strategy deciding the wait. Defaults to `polling_strategy`
+        as_table: bool, default=False
+            Return a columnar `ResultsTable` instead, ignoring `results_format`
 
         Returns
         -------
         requests.Response
             Response
+
+        Raises
+        ------
+        requests.ConnectionError
+            If progress could not be retrieved `retries` times, or the circuit breaker is open
         """
         if not self.job_id:
             raise RuntimeError('No enrichment analysis has been initiaited.')
 
+        if as_table:
+            return ResultsTable.from_results(self.get_results('json', check_progress_interval, retries))
+
         if self._cached_results_type == results_format and self.results_response is not None:
             if results_format == 'json':
                 return self.results_response.json()
             return self.results_response.text
 
-        self._cached_results_type = results_format
-        progress = 0
-
-        for _ in range(retries):
-            try:
-                while progress < 100:
-                    sleep(check_progress_interval)
-                    progress = self.get_progress()
-                    if progress == 'FAILED':
-                        return [] if results_format == 'json' else ''
-
-                url = self._get_endpoint('results', job_id=self.job_id)
-                response = self.session.wait_get(url, params={'format': results_format}, wait=self.wait_between_requests)
-                descriptive_http_error(response)
-                self.results_response = response
+        if self._request_key and self.result_cache is not None:
+            cached = self.result_cache.get(self._request_key, results_format)
+            if cached is not None:
+                self._cached_results_type = results_format
+                self.results_response = _text_response(cached)
+                self._record_results(self.result_cache.path(self._request_key, results_format))
                 if results_format == 'json':
                     return self.results_response.json()
                 return self.results_response.text
-            except requests.exceptions.ConnectionError as e:
-                pass
 
-    def get_enrichment_categories(self, mirna_type: str, species: str, mode='all', with_suffix=False) -> dict:
+        finished = self._wait_for_results(resolve_strategy(check_progress_interval, self.polling_strategy), retries)
+        if not finished:
+            return [] if results_format == 'json' else ''
+
+        # connection errors are retried by the session's transport
+        return self._download_results(results_format)
+
+    def download_results(self, destination: Union[str, IO], results_format: str='csv', compress: Optional[bool]=None,
+                         check_progress_interval: Union[float, PollingStrategy]=None,
+                         chunk_size: int=DEFAULT_CHUNK_SIZE) -> Union[str, IO]:
+        """ Stream results to a file once they have been computed, using constant memory
+
+        Results are requested gzip compressed and written in chunks, so even very large results are never
+        held in memory. Use `iter_results` to parse the written file lazily.
+
+        Parameters
+        ----------
+        destination : str or file-like
+            Path or file object to write results to. Paths are only replaced once the download completed
+        results_format : str, default='csv'
+            * *json* - retrieve results in json format
+            * *csv* - retrieve results in csv format
+        compress : bool, optional
+            Write gzip compressed results, by default only if `destination` is a path ending in `.gz`
+        check_progress_interval : float or PollingStrategy, optional
+            How many seconds to wait between checking if results have been computed,
+            or a strategy deciding the wait. Defaults to `polling_strategy`
+        chunk_size : int
+            Number of bytes to read at a time
+
+        Returns
+        -------
+        str or file-like
+            `destination`
+
+        Raises
+        ------
+        RuntimeError
+            If the job failed
+        requests.ConnectionError
+            If its progress could not be retrieved
+        """
+        if not self.job_id:
+            raise RuntimeError('No enrichment analysis has been initiated.')
+        if compress is None:
+            compress = isinstance(destination, str) and destination.endswith('.gz')
+
+        cached = None
+        if self._cached_results_type == results_format and self.results_response is not None:
+            cached = self.results_response.content
+        elif self._request_key and self.result_cache is not None:
+            text = self.result_cache.get(self._request_key, results_format)
+            cached = text.encode() if text is not None else None
+        if cached is not None:
+            with ResultsSink(destination, compress) as sink:
+                sink.write(cached)
+            return destination
+
+        finished = self._wait_for_results(resolve_strategy(check_progress_interval, self.polling_strategy))
+        if not finished:
+            raise RuntimeError('Enrichment analysis {} failed'.format(self.job_id))
+
+        url = self._get_endpoint('results', job_id=self.job_id)
+        with self.session.wait_get(url, params={'format': results_format}, wait=self.wait_between_requests,
+                                   headers={'Accept-Encoding': 'gzip'}, stream=True, endpoint='results') as response:
+            descriptive_http_error(response)
+            # gzip encoded responses are copied as is if compressed output is requested
+            passthrough = compress and response.headers.get('Content-Encoding', '').lower() == 'gzip'
+            with ResultsSink(destination, compress and not passthrough) as sink:
+                for chunk in response.raw.stream(chunk_size, decode_content=not passthrough):
+                    sink.write(chunk)
+            location = response.url
+        if isinstance(destination, str):
+            location = os.path.abspath(destination)
+        self._record_results(location)
+        return destination
+
+    def _wait_for_results(self, strategy: PollingStrategy, retries: int=5) -> bool:
+        """ Poll progress until the job stopped
+
+        Returns
+        -------
+        bool
+            True if the job finished, False if it failed
+
+        Raises
+        ------
+        requests.ConnectionError
+            If progress could not be retrieved `retries` times, or the circuit breaker is open
+        """
+        started = self._submitted_at or time()
+        attempt = 0
+        status = None
+        for retry in range(max(retries, 1)):
+            try:
+                while True:
+                    sleep(strategy.next_delay(attempt, status, time() - started))
+                    attempt += 1
+                    status = self._get_progress_response().json()
+                    progress = status['status']
+                    self._record_progress(progress)
+                    if progress == 'FAILED':
+                        return False
+                    if progress >= 100:
+                        return True
+            except CircuitOpenError:
+                raise
+            except requests.exceptions.ConnectionError:
+                # each request was already retried by the session's transport
+                if retry + 1 >= retries:
+                    raise
+
+    def _download_results(self, results_format: str) -> Union[str, list]:
+        """ Download results of a finished job """
+        url = self._get_endpoint('results', job_id=self.job_id)
+        response = self.session.wait_get(url, params={'format': results_format}, wait=self.wait_between_requests,
+                                         endpoint='results')
+        descriptive_http_error(response)
+        self._cached_results_type = results_format
+        self.results_response = response
+        self._record_results(response.url)
+        if self._request_key and self.result_cache is not None:
+            self.result_cache.put(self._request_key, results_format, self.job_id, response.text)
+        if results_format == 'json':
+            return self.results_response.json()
+        return self.results_response.text
+
+    def get_enrichment_categories(self, mirna_type: str, species: str, mode='all', with_suffix=False,
+                                  refresh=False) -> dict:
         """ Get possible enrichment categories
 
         Parameters
@@ -538,16 +1058,15 @@ class API:
             * *expert* - only show expert categories
         with_suffix : bool, default=False
             whether to include '_precursor' or '_mature' at end of category name
+        refresh : bool, default=False
+            whether to fetch categories from the server even if they are cached in `category_catalog`
 
         Returns
         -------
         dict
             Keys are categories and values are their descriptions
         """
-        url = self._get_endpoint('categories', species=species.lower(), mirna=mirna_type.lower(), mode=mode.lower())
-        response = self.session.wait_get(url, wait=self.wait_between_requests)
-        descriptive_http_error(response)
-        categories = response.json()['categories']
+        categories = self._category_entry(mirna_type, species, mode, refresh).categories
 
         if with_suffix:
             return {cat: desc for cat, desc in categories}
@@ -555,8 +1074,19 @@ class API:
         cat_suffix = '_precursor' if mirna_type == 'precursor' else '_mature'
         return {cat.replace(cat_suffix, ''): desc for cat, desc in categories}
 
+    def _category_entry(self, mirna_type: str, species: str, mode='all', refresh=False) -> CatalogEntry:
+        """ Get categories from the catalog, fetching them from the server if they are not cached """
+        entry = None if refresh else self.category_catalog.lookup(species, mirna_type, mode)
+        if entry is None:
+            url = self._get_endpoint('categories', species=species.lower(), mirna=mirna_type.lower(),
+                                     mode=mode.lower())
+            response = self.session.wait_get(url, wait=self.wait_between_requests, endpoint='categories')
+            descriptive_http_error(response)
+            entry = self.category_catalog.store(species, mirna_type, mode, response.json()['categories'])
+        return entry
+
     def save_enrichment_results(self, save_file: Union[str, IO], file_type: str='csv',
-                                check_progress_interval: float=5.) -> str:
+                                check_progress_interval: Union[float, PollingStrategy]=None) -> str:
         """ Save results in specified format
 
         Parameters
@@ -565,8 +1095,13 @@ class API:
             File to save results in
         file_type : str, default='csv'
             Type of file to write results to. Options are `json` or `csv`
-        check_progress_interval : float, default=5
-            How many seconds to wait between checking if results have been computed
+        check_progress_interval : float or PollingStrategy, optional
+            How many seconds to wait between checking if results have been computed,
+            or a strategy deciding the wait. Defaults to `polling_strategy`
+
+        See Also
+        --------
+        download_results : Save large results without holding them in memory
         """
         results = str(self.get_results(file_type, check_progress_interval))
         if isinstance(save_file, IOBase):
@@ -574,6 +1109,7 @@ class API:
         else:
             with open(save_file, 'w+') as outfile:
                 outfile.write(results)
+            self._record_results(os.path.abspath(save_file))
         return results
 
     def get_enrichment_parameters(self):
@@ -593,6 +1129,7 @@ class API:
         * *results* - job results
         """
         url = self.get_gui_url(page, job_id)
+        import webbrowser
         webbrowser.open(url)
         return url
 
@@ -611,7 +1148,7 @@ class API:
         """
         use_job_id = job_id or self.job_id or ''
         url = self._get_endpoint('gui_urls', job_id=use_job_id)
-        response = self.session.wait_get(url, wait=self.wait_between_requests)
+        response = self.session.wait_get(url, wait=self.wait_between_requests, endpoint='gui_urls')
         descriptive_http_error(response)
         return response.json()
 
@@ -638,18 +1175,127 @@ class API:
         """ Fill in defaults and return converted mirnas """
         url = self._get_endpoint(converter_type)
         payload = self._extend_payload(base_payload, default_overrides, 'converter')
+        if self.id_cache is not None:
+            return self._convert_cached(converter_type, url, payload, to_file)
 
-        response = self.session.wait_post(url, data=payload, wait=self.wait_between_requests)
+        response = self.session.wait_post(url, data=payload, wait=self.wait_between_requests, endpoint=converter_type)
         descriptive_http_error(response)
 
+        self._save_converted(response.text, to_file)
+        return response.text.splitlines()
+
+    def _convert_cached(self, converter_type, url, payload, to_file):
+        """ Convert mirnas using `id_cache`, only sending ids missing from the cache to the server """
+        namespace = '{}|{}'.format(converter_type, self.id_cache.namespace(payload))
+        mirnas = split_ids(payload['mirnas'])
+        converted = self.id_cache.get_many(namespace, set(mirnas))
+        missing = [mirna for mirna in OrderedDict.fromkeys(mirnas) if mirna not in converted]
+        if missing:
+            # tab-separated output maps every input id to its conversion, other formats are rendered locally
+            missing_payload = {**payload, 'mirnas': ';'.join(missing), 'output_format': 'tabsep'}
+            response = self.session.wait_post(url, data=missing_payload, wait=self.wait_between_requests,
+                                              endpoint=converter_type)
+            descriptive_http_error(response)
+            answers = {}
+            for line in response.text.splitlines():
+                original, separator, result = line.partition('\t')
+                if separator:
+                    answers[original] = result
+            self.id_cache.put_many(namespace, answers)
+            converted.update(answers)
+
+        output_format = payload['output_format']
+        if output_format == 'tabsep':
+            lines = ['{}\t{}'.format(mirna, converted.get(mirna, '')) for mirna in mirnas]
+        elif output_format == 'newline':
+            lines = [result for mirna in mirnas for result in converted.get(mirna, '').split(';')]
+        else:
+            lines = [converted.get(mirna, '') for mirna in mirnas]
+        self._save_converted('\n'.join(lines), to_file)
+        return lines
+
+    @staticmethod
+    def _iter_convert(convert_chunk: Callable[[List[str]], List[str]], mirnas: Union[str, Iterable[str], IO],
+                      to_file: Union[str, IO], chunk_size: int, max_workers: int) -> Iterator[str]:
+        """ Convert mirnas in concurrently sent chunks, yielding converted lines in input order """
+        # validated here rather than in the generator, so invalid arguments fail when the converter is called
+        if chunk_size < 1 or max_workers < 1:
+            raise ValueError('chunk_size and max_workers must be at least 1')
+        return API._convert_chunks(convert_chunk, mirnas, to_file, chunk_size, max_workers)
+
+    @staticmethod
+    def _convert_chunks(convert_chunk: Callable[[List[str]], List[str]], mirnas: Union[str, Iterable[str], IO],
+                        to_file: Union[str, IO], chunk_size: int, max_workers: int) -> Iterator[str]:
+        savefile = open(to_file, 'w+') if isinstance(to_file, str) and to_file else to_file or None
+        pending = deque()
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            for chunk in _chunked(_iter_ids(mirnas), chunk_size):
+                pending.append(pool.submit(convert_chunk, chunk))
+                # keep a bounded number of chunks in flight, emitting finished ones in order
+                while len(pending) > max_workers or (pending and pending[0].done()):
+                    yield from _emit(pending.popleft().result(), savefile)
+            while pending:
+                yield from _emit(pending.popleft().result(), savefile)
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+            if savefile is not None:
+                savefile.close()
+
+    @staticmethod
+    def _save_converted(text: str, to_file: Union[str, IO]):
+        """ Write converted mirnas to a file, if provided """
         if isinstance(to_file, IOBase):
-            to_file.write(response.text)
+            to_file.write(text)
             to_file.close()
         elif to_file:
             with open(to_file, 'w+') as savefile:
-                savefile.write(response.text)
+                savefile.write(text)
 
-        return response.text.splitlines()
+    def _job_store(self, method: str, *args, **kwargs):
+        """ Call a job store method, warning instead of failing the analysis when the store is unusable """
+        if self.jobs is None:
+            return None
+        try:
+            return getattr(self.jobs, method)(*args, **kwargs)
+        except sqlite3.Error as err:
+            warnings.warn('Job store {} failed for job {}: {}'.format(method, self.job_id, err))
+            return None
+
+    def _record_job(self, analysis_type: str, species: str, mirna_type: str):
+        """ Add the current job to the job store """
+        self._job_store('add', JobRecord(self.job_id, analysis_type.upper(), species.lower(), mirna_type.lower(),
+                                         self._enrichment_parameters))
+
+    def _record_progress(self, progress):
+        """ Update the job store with progress reported by the server, if it changed since the last poll """
+        if progress == self._recorded_progress:
+            return
+        self._recorded_progress = progress
+        instrumentation = self._instrumentation
+        if instrumentation is not None and (progress == 'FAILED' or progress >= 100):
+            self._record_completion(instrumentation, FAILED if progress == 'FAILED' else FINISHED)
+        if progress == 'FAILED':
+            self._job_store('update', self.job_id, status=FAILED)
+        else:
+            self._job_store('update', self.job_id, status=RUNNING, progress=progress)
+
+    def _record_completion(self, instrumentation: Instrumentation, status: str):
+        """ Report the job duration the first time the job is seen completed """
+        record = self._job_store('get_record', self.job_id)
+        if record is None or record.status in (FINISHED, FAILED) or (record.progress or 0) >= 100:
+            return
+        instrumentation.job_completed(self.job_id, record.analysis_type, status, time() - record.created)
+
+    @property
+    def _instrumentation(self) -> Optional[Instrumentation]:
+        return self.session.instrumentation or get_instrumentation()
+
+    def _record_results(self, location: str):
+        """ Mark the current job as finished in the job store """
+        self._job_store('update', self.job_id, status=FINISHED, progress=100, result_location=location)
 
     def _extend_payload(self, payload: dict, default_overrides: dict, default_name: str=''):
         """ Fill in default payload, overriding as provided """
@@ -36,6 +36,11 @@ setup(
     ],
     packages=['mieaa'],
     install_requires=['requests>=2.19.*'],
+    extras_require={
+        'async': ['aiohttp>=3.6'],
+        'numpy': ['numpy>=1.13'],
+        'pandas': ['numpy>=1.13', 'pandas>=0.23'],
+    },
     python_requires='>=3.5.*, <4',
     keywords='mirna bioinformatics',
     entry_points={
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from mock_server import MockConfig, MockServer  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """ Keep on-disk caches, the job store and the daemon socket out of the user's home """
+    monkeypatch.setenv('MIEAA_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('MIEAA_NO_DAEMON', '1')
+    return str(tmp_path / 'cache')
+
+
+@pytest.fixture
+def server():
+    with MockServer(MockConfig(job_duration=.1, result_rows=20)) as mock:
+        yield mock
+
+
+@pytest.fixture
+def api(server, monkeypatch):
+    """ API instance sending its requests to the mock server, with fast polling and in-memory state """
+    from mieaa import API, CategoryCatalog, FixedInterval, MemoryJobStore
+    monkeypatch.setattr(API, 'jobs', MemoryJobStore())
+    monkeypatch.setattr(API, 'category_catalog', CategoryCatalog())
+    monkeypatch.setattr(API, 'polling_strategy', FixedInterval(.02))
+    monkeypatch.setattr(API, 'wait_between_requests', 0)
+    instance = API()
+    instance.root_url = server.url
+    yield instance
+    instance.session.close()
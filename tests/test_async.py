@@ -0,0 +1,58 @@
+import asyncio
+import gc
+import warnings
+
+import pytest
+
+pytest.importorskip('aiohttp')
+
+
+@pytest.fixture
+def async_api(api, server, monkeypatch):
+    """ AsyncAPI sending its requests to the mock server through `API.root_url`, set after import """
+    from mieaa import API, AsyncAPI
+    from mieaa.mieaa_async import AsyncTransport
+    monkeypatch.setattr(API, 'root_url', server.url)
+    return AsyncAPI(AsyncTransport(limiter=api.session.limiter))
+
+
+async def _run_ora(async_api, test_set):
+    async_api.new_session()
+    await async_api.run_ora(test_set, ['mirwalk'], 'mirna', 'hsa')
+    return await async_api.get_results()
+
+
+def test_settings_are_read_from_api_at_request_time(async_api, server):
+    from mieaa import API
+    assert async_api.root_url == server.url
+    assert len(asyncio.run(_run_ora(async_api, 'hsa-miR-1;hsa-miR-2'))) == 20
+    assert server.stats()['requests']['enrichment'] == 1
+    async_api.root_url = 'http://localhost:1/'
+    assert async_api.root_url != API.root_url
+
+
+def test_jobs_are_recorded(async_api):
+    from mieaa import API
+    asyncio.run(_run_ora(async_api, 'hsa-miR-1;hsa-miR-2'))
+    record = API.jobs.get_record(async_api.job_id)
+    assert record.status == 'finished'
+    assert record.result_location
+
+
+def test_session_is_closed_with_its_loop(async_api):
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', ResourceWarning)
+        for index in range(2):
+            asyncio.run(_run_ora(async_api, 'hsa-miR-1;hsa-miR-{}'.format(index)))
+            assert async_api.transport._session.closed
+        gc.collect()
+    assert not [warning for warning in caught if issubclass(warning.category, ResourceWarning)]
+
+
+def test_shared_transport_is_created_once():
+    from concurrent.futures import ThreadPoolExecutor
+    from mieaa import mieaa_async
+    mieaa_async._shared_transport = None
+    with ThreadPoolExecutor(8) as executor:
+        transports = list(executor.map(lambda _: mieaa_async.shared_transport(), range(32)))
+    assert all(transport is transports[0] for transport in transports)
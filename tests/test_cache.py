@@ -0,0 +1,17 @@
+from mieaa import ResultCache
+
+
+def test_result_cache_hit_sends_no_request(api, server, tmp_path):
+    api.result_cache = ResultCache(str(tmp_path / 'results'))
+    api.run_ora('hsa-miR-1;hsa-miR-2', ['mirwalk'], 'mirna', 'hsa')
+    results = api.get_results()
+    job_id = api.job_id
+
+    server.reset_stats()
+    api.new_session()
+    api.run_ora('hsa-miR-2;hsa-miR-1', ['mirwalk'], 'mirna', 'hsa')
+    assert api.get_results() == results
+    assert api.job_id == job_id
+    assert not server.stats()['requests']
+    record = api.jobs.get_record(job_id)
+    assert record.result_location == api.result_cache.path(api._request_key, 'json')
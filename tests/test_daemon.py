@@ -0,0 +1,45 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from mieaa import mieaa_daemon
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='the daemon listens on a Unix socket')
+
+
+@pytest.fixture
+def dying_daemon(tmp_path, monkeypatch):
+    """ Socket path of a daemon that reads a request and exits without answering """
+    monkeypatch.delenv('MIEAA_NO_DAEMON')
+    path = str(tmp_path / 'daemon.sock')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(path)
+    listener.listen(1)
+    received = []
+
+    def accept():
+        connection, _ = listener.accept()
+        with connection, connection.makefile('rb') as stream:
+            received.append(stream.readline())
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    yield path, received
+    thread.join(5)
+    listener.close()
+
+
+def test_command_is_not_rerun_after_the_daemon_died(dying_daemon, capsys):
+    path, received = dying_daemon
+    assert mieaa_daemon.forward(['to_precursor', 'hsa-miR-1'], path) == 1
+    assert received
+    assert 'daemon exited' in capsys.readouterr().err
+
+
+def test_command_runs_locally_without_a_daemon(tmp_path, monkeypatch):
+    monkeypatch.delenv('MIEAA_NO_DAEMON')
+    path = str(tmp_path / 'daemon.sock')
+    assert not os.path.exists(path)
+    assert mieaa_daemon.forward(['to_precursor', 'hsa-miR-1'], path) is None
@@ -0,0 +1,30 @@
+from concurrent.futures import wait
+
+from mieaa import PollScheduler
+
+
+def test_submit_polls_with_the_instance_settings(api, server):
+    scheduler = PollScheduler()
+    api.poll_scheduler = scheduler
+    futures = [api.submit_ora('hsa-miR-1;hsa-miR-2;hsa-miR-{}'.format(index), ['mirwalk'], 'mirna', 'hsa')
+               for index in range(3)]
+    done, not_done = wait(futures, timeout=20)
+    assert not not_done
+    assert all(len(future.result()) == 20 for future in futures)
+    # submitted and polled on the instance's server
+    requests = server.stats()['requests']
+    assert requests['enrichment'] == 3
+    assert requests['status'] >= 3
+    assert requests['results'] == 3
+    assert api.job_id is None
+    assert not scheduler.pending
+
+
+def test_submit_stores_results_in_the_instance_cache(api, server, tmp_path):
+    from mieaa import ResultCache
+    api.result_cache = ResultCache(str(tmp_path / 'results'))
+    api.poll_scheduler = PollScheduler()
+    results = api.submit_ora('hsa-miR-1;hsa-miR-2', ['mirwalk'], 'mirna', 'hsa').result(timeout=20)
+    server.reset_stats()
+    assert api.submit_ora('hsa-miR-2;hsa-miR-1', ['mirwalk'], 'mirna', 'hsa').result(timeout=20) == results
+    assert 'enrichment' not in server.stats()['requests']
@@ -0,0 +1,23 @@
+from mieaa import IdCache
+
+
+def test_cached_and_new_ids_are_merged_in_input_order(api, server, tmp_path):
+    api.id_cache = IdCache(path=str(tmp_path / 'ids.sqlite'))
+    assert api.to_precursor('hsa-miR-1;hsa-miR-3') == ['hsa-miR-1-conv', 'hsa-miR-3-conv']
+
+    server.reset_stats()
+    mirnas = ['hsa-miR-2', 'hsa-miR-1', 'hsa-miR-4', 'hsa-miR-3', 'hsa-miR-1']
+    assert api.to_precursor(mirnas, output_format='tabsep') == ['{0}\t{0}-conv'.format(mirna) for mirna in mirnas]
+    assert server.stats()['requests'] == {'mirna_type_converter': 1}
+    assert api.id_cache.stats()['hits'] == 2
+    assert api.id_cache.stats()['misses'] == 4
+
+
+def test_conversions_are_persisted(api, server, tmp_path):
+    path = str(tmp_path / 'ids.sqlite')
+    api.id_cache = IdCache(path=path)
+    api.convert_mirbase('hsa-miR-1;hsa-miR-2', 21, 22, 'mirna')
+    api.id_cache = IdCache(path=path)
+    server.reset_stats()
+    assert api.convert_mirbase('hsa-miR-2;hsa-miR-1', 21, 22, 'mirna') == ['hsa-miR-2-conv', 'hsa-miR-1-conv']
+    assert not server.stats()['requests']
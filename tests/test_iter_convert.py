@@ -0,0 +1,36 @@
+import io
+import random
+from time import sleep
+
+import pytest
+
+from mieaa import TokenBucket
+
+MIRNAS = ['hsa-miR-{}'.format(index) for index in range(1000)]
+
+
+@pytest.fixture(autouse=True)
+def fast_limiter(api):
+    api.session.limiter = TokenBucket(1000)
+
+
+def test_chunks_are_yielded_in_input_order(api, server, monkeypatch, tmp_path):
+    convert_mirbase = api.convert_mirbase
+
+    def slow_convert_mirbase(*args, **kwargs):
+        sleep(random.random() / 50)  # chunks finish out of order
+        return convert_mirbase(*args, **kwargs)
+
+    monkeypatch.setattr(api, 'convert_mirbase', slow_convert_mirbase)
+    output = tmp_path / 'converted.txt'
+    converted = list(api.iter_convert_mirbase(MIRNAS, 21, 22, 'mirna', to_file=str(output), chunk_size=30,
+                                              max_workers=4))
+    assert converted == [mirna + '-conv' for mirna in MIRNAS]
+    assert output.read_text().split() == converted
+    assert server.stats()['requests']['mirbase_converter'] == 34
+
+
+def test_file_input_is_converted_in_chunks(api, server):
+    converted = list(api.iter_to_precursor(io.StringIO('\n'.join(MIRNAS[:95])), chunk_size=10))
+    assert converted == [mirna + '-conv' for mirna in MIRNAS[:95]]
+    assert server.stats()['requests']['mirna_type_converter'] == 10
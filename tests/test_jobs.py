@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from mieaa import API, JobRecord, MemoryJobStore, SQLiteJobStore
+from mieaa.mieaa_jobs import FINISHED, UNFINISHED
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / 'jobs.sqlite'))
+
+
+def test_records_by_status(store):
+    store.add(JobRecord('a', 'ORA', 'hsa', 'mirna'))
+    store.add(JobRecord('b', 'GSEA', 'hsa', 'mirna'))
+    store.update('b', status=FINISHED, progress=100)
+    assert [record.job_id for record in store.records(UNFINISHED)] == ['a']
+    assert [record.job_id for record in store.records([FINISHED])] == ['b']
+    assert len(store.records()) == 2
+    assert store.records(()) == []
+
+
+def test_jobs_are_recorded(api):
+    api.run_ora('hsa-miR-1;hsa-miR-2', ['mirwalk'], 'mirna', 'hsa')
+    assert API.jobs.get_record(api.job_id).status in UNFINISHED
+    api.get_results()
+    record = API.jobs.get_record(api.job_id)
+    assert record.status == FINISHED
+    assert record.analysis_type == 'ORA'
+
+
+def test_job_store_can_be_disabled(api, monkeypatch):
+    monkeypatch.setattr(API, 'jobs', None)
+    api.run_ora('hsa-miR-1;hsa-miR-2', ['mirwalk'], 'mirna', 'hsa')
+    assert len(api.get_results()) == 20
+    api.load_job(api.job_id)
+
+
+def test_job_store_disabled_by_environment(cache_dir):
+    code = 'from mieaa import API; print(API.jobs)'
+    env = dict(os.environ, MIEAA_NO_JOB_STORE='1',
+               PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, '-c', code], env=env, stdout=subprocess.PIPE, check=True).stdout
+    assert output.decode().strip() == 'None'
+    assert not os.path.exists(cache_dir)
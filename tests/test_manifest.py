@@ -0,0 +1,40 @@
+import os
+
+from mieaa import API, ManifestRunner, read_manifest
+
+MANIFEST = ('name\tcommand\tmirnas\tmirna_type\tspecies\tcategories\n'
+            ' r1\tora\thsa-miR-1;hsa-miR-2 \tmirna\thsa\tmirwalk\n'
+            'r2 \tora\thsa-miR-3;hsa-miR-4\tmirna\t hsa\tmirwalk\n')
+
+
+def _runner(api, outdir):
+    def api_factory():
+        instance = API()
+        instance.root_url = api.root_url
+        return instance
+    return ManifestRunner(str(outdir), max_workers=2, api_factory=api_factory)
+
+
+def test_read_manifest_strips_values(tmp_path):
+    path = tmp_path / 'manifest.tsv'
+    path.write_text(MANIFEST)
+    rows = read_manifest(str(path))
+    assert [row.name for row in rows] == ['r1', 'r2']
+    assert rows[0].fields['mirnas'] == 'hsa-miR-1;hsa-miR-2'
+    assert rows[1].fields['species'] == 'hsa'
+    assert rows[0].output_path('out') == os.path.join('out', 'r1.csv')
+
+
+def test_resume_skips_finished_rows(api, server, tmp_path):
+    path = tmp_path / 'manifest.tsv'
+    path.write_text(MANIFEST)
+    outdir = tmp_path / 'out'
+    results = list(_runner(api, outdir).run(read_manifest(str(path))))
+    assert sorted(result.status for result in results) == ['completed', 'completed']
+    assert server.stats()['requests']['enrichment'] == 2
+
+    os.remove(str(outdir / 'r2.csv'))
+    server.reset_stats()
+    results = {result.row.name: result.status for result in _runner(api, outdir).run(read_manifest(str(path)))}
+    assert results == {'r1': 'skipped', 'r2': 'completed'}
+    assert server.stats()['requests']['enrichment'] == 1
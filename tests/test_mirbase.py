@@ -0,0 +1,44 @@
+import io
+
+import pytest
+
+from mieaa import MirbaseIndex
+
+MATURE_21 = '''>hsa-let-7a-5p MIMAT0000062 Homo sapiens let-7a-5p
+UGAGGUAGUAGGUUGUAUAGUU
+>hsa-miR-199a-5p MIMAT0000231 Homo sapiens miR-199a-5p
+CCCAGUGUUCAGACUACCUGUUC
+>hsa-miR-old MIMAT0000999 Homo sapiens miR-old
+ACGU
+'''
+MATURE_22 = 'MIMAT0000062\thsa-let-7a-5p\nMIMAT0000231\thsa-miR-199a-5p-renamed\n'
+ALIASES = 'MIMAT0000231\thsa-miR-199a;hsa-miR-199a-5p;\n'
+
+
+@pytest.fixture
+def index(tmp_path):
+    tables = {21: {'mirna': io.StringIO(MATURE_21)}, '22.0': {'mirna': io.StringIO(MATURE_22)}}
+    with MirbaseIndex.build(str(tmp_path / 'mirbase.idx'), tables, aliases=io.StringIO(ALIASES)) as built:
+        yield built
+
+
+def test_build_indexes_versions(index):
+    assert index.versions == {'21': ['mirna'], '22': ['mirna']}
+    assert index.has_versions('v21', 22, 'miRNA')
+    assert not index.has_versions(21, 22, 'precursor')
+    assert index.accession('hsa-miR-199a', 22, 'mirna') == 'MIMAT0000231'  # from the aliases
+
+
+def test_convert(index):
+    converted = index.convert(['hsa-let-7a-5p', 'hsa-miR-199a-5p', 'hsa-miR-old', 'hsa-miR-unknown', 'hsa-miR-199a'],
+                              21, 22, 'mirna')
+    assert converted == ['hsa-let-7a-5p', 'hsa-miR-199a-5p-renamed', None, None, 'hsa-miR-199a-5p-renamed']
+    with pytest.raises(KeyError):
+        index.convert(['hsa-let-7a-5p'], 21, 23, 'mirna')
+
+
+def test_api_converts_offline_and_sends_only_unknown_ids(api, server, index):
+    api.mirbase_index = index
+    converted = api.convert_mirbase(['hsa-let-7a-5p', 'hsa-miR-unknown'], 21, 22, 'mirna', output_format='tabsep')
+    assert converted == ['hsa-let-7a-5p\thsa-let-7a-5p', 'hsa-miR-unknown\thsa-miR-unknown-conv']
+    assert server.stats()['requests'] == {'mirbase_converter': 1}
@@ -0,0 +1,51 @@
+from time import perf_counter, sleep
+
+import pytest
+
+from mieaa import mieaa_ratelimit
+from mieaa.mieaa_ratelimit import TokenBucket
+from mock_server import MockConfig, MockServer
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """ Fake monotonic clock of the rate limiter, advanced by assigning to `clock[0]` """
+    now = [1000.]
+    monkeypatch.setattr(mieaa_ratelimit, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_bucket_allows_burst_then_paces_at_rate(clock):
+    bucket = TokenBucket(10, burst=3)
+    assert [bucket.reserve() for _ in range(3)] == [0., 0., 0.]
+    assert bucket.reserve() == pytest.approx(.1)
+    assert bucket.reserve() == pytest.approx(.2)
+    clock[0] += 1.
+    # refilled to at most `burst` tokens
+    assert [bucket.reserve() for _ in range(3)] == [0., 0., 0.]
+    assert bucket.reserve() == pytest.approx(.1)
+
+
+def test_throttled_bucket_halves_rate_and_recovers(clock):
+    bucket = TokenBucket(10, burst=1)
+    bucket.throttled(retry_after=.5)
+    assert bucket.rate == 5
+    assert bucket.reserve() == pytest.approx(.5 + 1 / 5)
+    for _ in range(5):
+        bucket.recovered()
+    assert bucket.rate == 10
+
+
+def test_limiter_keeps_requests_under_the_server_throttle(api):
+    with MockServer(MockConfig(throttle_rate=20, throttle_burst=2)) as server:
+        sleep(.2)  # let the server fill its burst
+        api.root_url = server.url
+        api.session.limiter = TokenBucket(16, burst=2)
+        started = perf_counter()
+        for _ in range(10):
+            api.get_gui_urls('job')
+        elapsed = perf_counter() - started
+        stats = server.stats()
+    assert stats['requests']['gui_urls'] == 10
+    assert stats['throttled'] == 0
+    assert elapsed >= 8 / 16 * .9
@@ -0,0 +1,49 @@
+import csv
+import gzip
+import io
+import os
+
+import pytest
+
+from mieaa import iter_results
+from mieaa.mieaa_results import ResultsSink
+
+
+@pytest.mark.parametrize('results_format', ['csv', 'json'])
+def test_download_gzip_and_iterate(api, tmp_path, results_format):
+    api.run_ora('hsa-miR-1;hsa-miR-2', ['mirwalk'], 'mirna', 'hsa')
+    expected = api.get_results(results_format)
+    path = str(tmp_path / 'results.{}.gz'.format(results_format))
+    assert api.download_results(path, results_format, chunk_size=64) == path
+    with open(path, 'rb') as results_file:
+        assert results_file.read(2) == b'\x1f\x8b'
+    rows = list(iter_results(path, chunk_size=64))
+    if results_format == 'json':
+        assert rows == expected
+    else:
+        assert rows == list(csv.reader(io.StringIO(expected)))[1:]
+    assert len(rows) == 20
+    assert os.listdir(str(tmp_path)) == ['results.{}.gz'.format(results_format)]  # no partial file left
+
+
+def test_sink_compresses_to_binary_files_and_rejects_text_only_files():
+    buffer = io.BytesIO()
+    with ResultsSink(buffer, compress=True) as sink:
+        sink.write(b'name,value\n')
+        sink.write(b'a,1\n')
+    assert gzip.decompress(buffer.getvalue()) == b'name,value\na,1\n'
+    buffer.seek(0)
+    assert list(iter_results(buffer, 'csv')) == [['a', '1']]
+    with pytest.raises(ValueError):
+        ResultsSink(io.StringIO(), compress=True).__enter__()
+
+
+def test_failed_download_keeps_previous_file(tmp_path):
+    path = tmp_path / 'results.csv'
+    path.write_text('previous')
+    with pytest.raises(RuntimeError):
+        with ResultsSink(str(path)) as sink:
+            sink.write(b'partial')
+            raise RuntimeError
+    assert path.read_text() == 'previous'
+    assert os.listdir(str(tmp_path)) == ['results.csv']
@@ -0,0 +1,13 @@
+from bench_startup import DEFERRED_MODULES, check, measure, parse_args
+
+
+def test_deferred_modules_cover_optional_dependencies_and_submodules():
+    for module in ('aiohttp', 'numpy', 'sqlite3', 'mieaa.mieaa_wrapper', 'mieaa.mieaa_async', 'mieaa.mieaa_stats'):
+        assert module in DEFERRED_MODULES
+    assert 'mieaa.mieaa_cli' not in DEFERRED_MODULES
+
+
+def test_startup_is_fast_and_lazy():
+    report = measure(repeat=3)
+    assert {'package', 'help'} <= set(report['scenarios'])
+    assert check(report, parse_args([]).max_overhead) == []
@@ -0,0 +1,68 @@
+from itertools import combinations
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from mieaa.mieaa_stats import adjust_p_values, fisher_exact, running_sum, running_sum_p_values
+
+
+# p.adjust(c(0.01, 0.04, 0.03, 0.005, 0.2, 0.5, 0.02, 0.045), method) in R
+P_VALUES = [0.01, 0.04, 0.03, 0.005, 0.2, 0.5, 0.02, 0.045]
+P_ADJUST = {
+    'fdr': [0.04, 0.06, 0.06, 0.04, 0.2285714286, 0.5, 0.0533333333, 0.06],
+    'BY': [0.1087142857, 0.1630714286, 0.1630714286, 0.1087142857, 0.6212244898, 1., 0.144952381, 0.1630714286],
+    'bonferroni': [0.08, 0.32, 0.24, 0.04, 1., 1., 0.16, 0.36],
+    'holm': [0.07, 0.16, 0.15, 0.04, 0.4, 0.5, 0.12, 0.16],
+    'hochberg': [0.07, 0.135, 0.135, 0.04, 0.4, 0.5, 0.12, 0.135],
+    'hommel': [0.063, 0.12, 0.09, 0.04, 0.4, 0.5, 0.08, 0.135],
+    'none': P_VALUES,
+}
+
+# scipy.stats.fisher_exact([[k, K - k], [n - k, N - K - n + k]], alternative) for N=40, n=12
+FISHER_OBSERVED = [0, 3, 6, 9, 2]
+FISHER_CATEGORY_SIZES = [10, 10, 10, 15, 3]
+FISHER_P_VALUES = {
+    'two-sided': [0.0187705307425, 1., 0.0410894890696, 0.00315871537766, 0.209311740891],
+    'greater': [1., 0.644738866501, 0.0256079259125, 0.00222790521437, 0.209311740891],
+    'less': [0.0154815631571, 0.662564342031, 0.996711032415, 0.999832556912, 0.977732793522],
+}
+
+
+@pytest.mark.parametrize('method', sorted(P_ADJUST))
+def test_adjust_p_values_matches_r(method):
+    numpy.testing.assert_allclose(adjust_p_values(P_VALUES, method), P_ADJUST[method], rtol=1e-8)
+
+
+def test_adjust_p_values_keeps_nan():
+    adjusted = adjust_p_values([0.01, float('nan'), 0.02], 'bonferroni')
+    numpy.testing.assert_allclose(adjusted, [0.02, numpy.nan, 0.04])
+
+
+@pytest.mark.parametrize('alternative', sorted(FISHER_P_VALUES))
+def test_fisher_exact_matches_scipy(alternative):
+    p_values = fisher_exact(FISHER_OBSERVED, FISHER_CATEGORY_SIZES, 12, 40, alternative)
+    numpy.testing.assert_allclose(p_values, FISHER_P_VALUES[alternative], rtol=1e-10)
+
+
+def _max_deviation(positions, list_size):
+    """ Largest absolute deviation of the scaled running sum, walking the list entry by entry """
+    m = len(positions)
+    deviation = highest = 0
+    for position in range(list_size):
+        deviation += list_size - m if position in positions else -m
+        highest = max(highest, abs(deviation))
+    return highest
+
+
+@pytest.mark.parametrize('positions', [(0,), (4,), (0, 1), (2, 7), (0, 1, 2), (1, 4, 6), (3, 4, 5, 8), (0, 2, 5, 7)])
+def test_running_sum_p_values_match_enumeration(positions):
+    list_size = 9
+    m = len(positions)
+    _, _, deviations = running_sum([numpy.array(positions)], list_size)
+    observed = _max_deviation(positions, list_size)
+    assert abs(deviations[0]) == observed
+
+    orderings = list(combinations(range(list_size), m))
+    expected = sum(_max_deviation(ordering, list_size) >= observed for ordering in orderings) / len(orderings)
+    numpy.testing.assert_allclose(running_sum_p_values([m], deviations, list_size), [expected], rtol=1e-12)
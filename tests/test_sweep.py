@@ -0,0 +1,43 @@
+import pytest
+
+from mieaa import API, BatchExecutor, ParameterSweep
+
+GRID = {'p_value_adjustment': ['fdr', 'holm'], 'significance_level': [.01, .05], 'species': ['hsa', 'mmu']}
+
+
+def _sweep(local_adjust):
+    return ParameterSweep('ORA', 'hsa-miR-1;hsa-miR-2', ['mirwalk'], 'mirna', 'hsa', grid=GRID,
+                          local_adjust=local_adjust)
+
+
+@pytest.mark.parametrize('local_adjust, jobs', [(True, 2), (False, 4)])
+def test_plan_job_count(local_adjust, jobs):
+    sweep = _sweep(local_adjust)
+    assert len(sweep.cells()) == 8
+    plan = sweep.plan()
+    assert len(plan) == jobs
+    assert sum(len(job.cells) for job in plan) == 8
+    if not local_adjust:
+        # one job per adjustment, with the most permissive filter of its cells
+        assert {job.spec.params['significance_level'] for job in plan} == {.05}
+
+
+@pytest.mark.parametrize('local_adjust', [True, False])
+def test_run_submits_planned_jobs(api, server, local_adjust):
+    if local_adjust:
+        pytest.importorskip('numpy')
+
+    def api_factory():
+        instance = API()
+        instance.root_url = api.root_url
+        return instance
+
+    sweep = _sweep(local_adjust)
+    results = sweep.run(executor=BatchExecutor(4, api_factory=api_factory))
+    assert server.stats()['requests']['enrichment'] == len(sweep.plan())
+    assert len(results) == 8
+    assert not results.errors
+    assert all(table is not None for _, table in results)
+    strict = results.get(p_value_adjustment='fdr', significance_level=.01, species='hsa')
+    permissive = results.get(p_value_adjustment='fdr', significance_level=.05, species='hsa')
+    assert len(strict) <= len(permissive)
@@ -0,0 +1,33 @@
+import pytest
+
+from mieaa import mieaa_table
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def table(request, api, monkeypatch):
+    """ Table of the mock server's results, filtered with numpy or with the pure Python fallback """
+    if request.param == 'python':
+        monkeypatch.setattr(mieaa_table, 'numpy', None)
+    elif mieaa_table.numpy is None:
+        pytest.skip('numpy is not installed')
+    api.run_ora('hsa-miR-1;hsa-miR-2', ['mirwalk'], 'mirna', 'hsa')
+    return api.get_results(as_table=True)
+
+
+def test_filter(table):
+    rows = table.to_rows()
+    assert len(rows) == 20
+    selected = table.filter(p_adjusted=1e-3, categories=['Category 1', 'Category 2', 'Category 9'])
+    assert selected.to_rows() == [row for row in rows if row[4] <= 1e-3 and row[0] in ('Category 1', 'Category 2')]
+    assert len(table.filter(enrichment='under-represented')) == 0
+    assert len(table.filter(min_size=10, max_size=10)) == 20
+
+
+def test_top_k(table):
+    rows = table.to_rows()
+    assert table.top_k(3).to_rows() == rows[:3]
+    assert table.top_k(3, by='p-value', ascending=False).to_rows() == rows[:-4:-1]
+    assert len(table.top_k(50)) == 20
+    assert len(table.top_k(0)) == 0
+    with pytest.raises(ValueError):
+        table.top_k(3, by='category')
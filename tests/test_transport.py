@@ -0,0 +1,72 @@
+import socket
+import threading
+
+import pytest
+import requests
+
+from mieaa import CircuitBreaker, ResilientAdapter, RetryPolicy
+from mieaa.mieaa_wrapper import API_Session
+
+
+@pytest.fixture
+def hanging_server():
+    """ Accepts connections and never answers """
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(8)
+    connections = []
+    stop = threading.Event()
+
+    def accept():
+        listener.settimeout(.1)
+        while not stop.is_set():
+            try:
+                connections.append(listener.accept()[0])
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=accept, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/'.format(listener.getsockname()[1])
+    stop.set()
+    thread.join()
+    for connection in connections:
+        connection.close()
+    listener.close()
+
+
+def _session(breaker, policy=None):
+    session = requests.Session()
+    adapter = ResilientAdapter(retry_policy=policy or RetryPolicy(retries=0), circuit_breaker=breaker)
+    session.mount('http://', adapter)
+    return session
+
+
+def test_read_timeout_ends_half_open_trial(hanging_server):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.)
+    breaker.record_failure()
+    assert breaker.state == 'half-open'
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        _session(breaker).get(hanging_server, timeout=(1., .2))
+    # the trial is over, so the next request is let through as a new trial
+    breaker.before_request()
+
+
+def test_session_has_default_timeout(hanging_server, monkeypatch):
+    monkeypatch.setattr(API_Session, 'timeout', (1., .2))
+    monkeypatch.setattr(API_Session, 'retry_policy', RetryPolicy(retries=0))
+    monkeypatch.setattr(API_Session, 'circuit_breaker', None)
+    session = API_Session()
+    with pytest.raises(requests.exceptions.Timeout):
+        session.get(hanging_server)
+
+
+@pytest.mark.parametrize('method, status, retry_after, expected', [
+    ('POST', 502, None, False),
+    ('POST', 503, None, False),
+    ('POST', 503, '1', True),
+    ('GET', 502, None, True),
+])
+def test_non_idempotent_requests_are_only_resent_when_refused(method, status, retry_after, expected):
+    policy = RetryPolicy()
+    assert policy.retry_status(method, 'http://server/api/v1/enrichment_analysis/', status, retry_after) is expected